@@ -0,0 +1,120 @@
+"""Compare response encoding paths on representative payloads from each service.
+
+Run from ai-services:
+
+    python -m benchmarks.bench_serialization [--incidents 2000] [--hosts 500] [--repeat 20]
+
+For every payload it reports the median encode time and the peak traced
+allocation of one encode for:
+
+    fastapi   jsonable_encoder + stdlib json, what a plain dict return costs
+    stdlib    FastJSONResponse rendering with the stdlib encoder
+    orjson    FastJSONResponse rendering with orjson (when installed)
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services import fast_json
+from services.incident_analyzer import IncidentAnalyzer
+from services.knowledge_base import KnowledgeBaseService
+from services.multi_agent_system import MultiAgentSystem
+from services.patch_intelligence import PatchIntelligence
+from services.problem_analyzer import ProblemAnalyzer
+
+from . import generators
+
+
+def _encoders() -> Dict[str, Callable[[Any], bytes]]:
+    encoders = {
+        'fastapi': lambda payload: JSONResponse(jsonable_encoder(payload)).body,
+        'stdlib': fast_json.resolve_encoder('stdlib'),
+    }
+    if fast_json.orjson is not None:
+        encoders['orjson'] = fast_json.resolve_encoder('orjson')
+    return encoders
+
+
+async def build_payloads(incident_count: int, host_count: int) -> Dict[str, Any]:
+    """One response per service, produced by the services themselves"""
+    incidents = generators.incidents(incident_count)
+    problem_analyzer = ProblemAnalyzer()
+    incident_analyzer = IncidentAnalyzer()
+    patch_intelligence = PatchIntelligence()
+    knowledge_base = KnowledgeBaseService()
+    agents = MultiAgentSystem()
+
+    systems = generators.hosts(host_count)
+    fleet = [result for chunk in patch_intelligence.fleet_analyzer.analyze(systems, True) for result in chunk]
+    classified = await incident_analyzer.classify_incidents(incidents[:1000])
+
+    return {
+        'problems.analyze': await problem_analyzer.analyze_recurring_problems(incidents, 30),
+        'problems.root_cause': await problem_analyzer.find_root_cause(incidents[:500]),
+        'incidents.classify_batch': {'results': classified, 'total': len(classified)},
+        'patches.analyze': await patch_intelligence.analyze_patch_requirements(
+            'SYS000001', ['KB5001200'], 'windows', 'high'
+        ),
+        'patches.fleet': {'results': fleet},
+        'knowledge.search': await knowledge_base.search('vpn password email'),
+        'chat.message': await agents.route_message('create ticket for email not working', {'user_id': 'bench'}),
+    }
+
+
+def measure(encode: Callable[[Any], bytes], payload: Any, repeat: int) -> Dict[str, float]:
+    encode(payload)  # warm up
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(payload)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    encode(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'peak_alloc_kb': round(peak / 1024, 1),
+        'bytes': len(body)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--incidents', type=int, default=2000)
+    parser.add_argument('--hosts', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    payloads = asyncio.run(build_payloads(args.incidents, args.hosts))
+    encoders = _encoders()
+    results = {
+        name: {encoder: measure(encode, payload, args.repeat) for encoder, encode in encoders.items()}
+        for name, payload in payloads.items()
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'payload':<26}{'encoder':<10}{'median ms':>12}{'peak KiB':>12}{'bytes':>12}{'speedup':>10}")
+    for name, by_encoder in results.items():
+        baseline = by_encoder['fastapi']['median_ms']
+        for encoder, result in by_encoder.items():
+            speedup = baseline / result['median_ms'] if result['median_ms'] else float('inf')
+            print(f"{name:<26}{encoder:<10}{result['median_ms']:>12.3f}{result['peak_alloc_kb']:>12.1f}"
+                  f"{result['bytes']:>12}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Deterministic synthetic data shaped like the payloads the services receive"""
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from services.patch_catalog import DEFAULT_PATCHES
+
+COMPONENTS = ['database', 'vpn', 'dns', 'disk', 'memory', 'cpu', 'api', 'login', 'email', 'printer',
+              'backup', 'cache', 'queue', 'ldap', 'proxy', 'storage', 'network', 'certificate', 'firewall']
+FAILURES = ['timeout', 'failure', 'slow', 'unreachable', 'crash', 'error', 'degraded', 'down', 'latency', 'refused']
+SEVERITIES = ['critical', 'high', 'medium', 'low']
+KB_CATEGORIES = ['Authentication', 'Network', 'Applications', 'Email', 'Hardware', 'Security', 'General']
+KB_ACTIONS = ['reset', 'configure', 'troubleshoot', 'install', 'update', 'recover', 'migrate', 'monitor']
+SYSTEM_TYPES = ['windows', 'linux', 'database', 'web']
+CRITICALITY_LEVELS = ['critical', 'high', 'medium', 'low']
+PATCH_SEVERITIES = ['critical', 'important', 'moderate', 'low']
+PATCH_CATEGORIES = ['security', 'update', 'feature', 'driver']
+CHAT_TEMPLATES = [
+    "create ticket for {component} {failure}",
+    "{component} is {failure} again, urgent",
+    "need access to the {component} portal",
+    "please install {component} client software",
+    "recurring {component} {failure} pattern since last week",
+    "schedule a change to update {component}",
+    "provision new vm for {component}",
+    "security patch for {component} vulnerability",
+    "onboard new user with {component} account",
+    "hello, can you help?",
+]
+
+
+def incidents(count: int, seed: int = 1, days: int = 29) -> List[Dict[str, Any]]:
+    """Incidents drawn from a few hundred recurring templates, spread over the last `days` days"""
+    rng = random.Random(seed)
+    templates = [(rng.choice(COMPONENTS), rng.choice(FAILURES), rng.choice(COMPONENTS)) for _ in range(300)]
+    now = datetime.now()
+    result = []
+    for i in range(count):
+        component, failure, impacted = rng.choice(templates)
+        host = f"host{rng.randint(1, 2000)}"
+        noise = ' '.join(f"word{rng.randint(0, 2999)}" for _ in range(rng.randint(0, 4)))
+        result.append({
+            'id': f"INC{i}",
+            'title': f"{component} {failure} on {host}",
+            'description': f"{component} {failure} affecting {impacted} {noise}".strip(),
+            'severity': rng.choice(SEVERITIES),
+            'affected_systems': [host],
+            'symptoms': [failure, component],
+            'created_date': (now - timedelta(minutes=rng.randint(0, 60 * 24 * days))).isoformat()
+        })
+    return result
+
+
+def kb_articles(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Article payloads for KnowledgeBaseService.add_article"""
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        component, action = rng.choice(COMPONENTS), rng.choice(KB_ACTIONS)
+        related = rng.sample(COMPONENTS, 3)
+        result.append({
+            'title': f"How to {action} {component} {i}",
+            'category': rng.choice(KB_CATEGORIES),
+            'content': f"Steps to {action} {component} when {rng.choice(FAILURES)} affects "
+                       f"{' and '.join(related)}. " + ' '.join(f"term{rng.randint(0, 9999)}" for _ in range(20)),
+            'tags': [component, action] + related[:1],
+            'status': 'published'
+        })
+    return result
+
+
+def kb_queries(count: int, seed: int = 2) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        ' '.join(rng.sample(COMPONENTS, rng.randint(1, 2)) + rng.sample(KB_ACTIONS + FAILURES, 1))
+        for _ in range(count)
+    ]
+
+
+def patch_catalog(count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """Patches with supersedence chains, system type targeting and CVEs"""
+    rng = random.Random(seed)
+    released = datetime(2024, 1, 1)
+    result = []
+    for i in range(count):
+        supersedes = [f"KB{j:07d}" for j in rng.sample(range(i), min(i, rng.randint(0, 2)))]
+        severity = rng.choice(PATCH_SEVERITIES)
+        result.append({
+            'patch_id': f"KB{i:07d}",
+            'title': f"{rng.choice(PATCH_CATEGORIES).title()} update {i}",
+            'severity': severity,
+            'category': rng.choice(PATCH_CATEGORIES),
+            'release_date': (released + timedelta(days=rng.randint(0, 600))).strftime('%Y-%m-%d'),
+            'size_mb': rng.randint(1, 500),
+            'reboot_required': rng.random() < 0.5,
+            'supersedes': supersedes,
+            'system_types': rng.sample(SYSTEM_TYPES, rng.randint(0, 2)),
+            'cve_list': [f"CVE-2024-{rng.randint(1, 99999):05d}"] if severity in ('critical', 'important') else []
+        })
+    return result
+
+
+def hosts(count: int, seed: int = 1, patches: List[Dict[str, Any]] = None,
+          max_installed: int = 50) -> List[Dict[str, Any]]:
+    """Systems with a random subset of the catalog installed"""
+    rng = random.Random(seed)
+    patch_ids = [patch['patch_id'] for patch in (patches or DEFAULT_PATCHES)]
+    return [
+        {
+            'system_id': f"SYS{i:06d}",
+            'current_patches': rng.sample(patch_ids, rng.randint(0, min(len(patch_ids), max_installed))),
+            'system_type': rng.choice(SYSTEM_TYPES),
+            'criticality_level': rng.choice(CRITICALITY_LEVELS)
+        }
+        for i in range(count)
+    ]
+
+
+def chat_messages(count: int, seed: int = 1) -> List[str]:
+    """Chat message stream; texts repeat at realistic rates"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(CHAT_TEMPLATES).format(component=rng.choice(COMPONENTS), failure=rng.choice(FAILURES))
+        for _ in range(count)
+    ]
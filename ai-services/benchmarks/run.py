@@ -0,0 +1,274 @@
+"""Benchmark the ai-services engines on synthetic data at increasing scale.
+
+Run from ai-services:
+
+    python -m benchmarks.run                                  # every engine, sizes 100..10000
+    python -m benchmarks.run --engines kb_search,agent_route --sizes 100,1000,1000000
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+For every engine and size the harness builds the data set, runs the operation
+until it has done --ops operations or spent --max-seconds, and records
+throughput, latency percentiles and memory:
+
+    setup_retained_mb   memory still held once the data set is loaded
+    op_peak_mb          peak extra memory of one traced operation
+
+"size" is the corpus for KB search, the incidents per call for problem
+analysis, the catalog for patch analysis, the history for incident analysis
+and the message stream length for agent routing. Results are written as JSON,
+tagged with the git commit, so runs can be compared between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from services.incident_analyzer import IncidentAnalyzer
+from services.knowledge_base import KnowledgeBaseService
+from services.multi_agent_system import MultiAgentSystem
+from services.patch_catalog import PatchCatalog
+from services.patch_intelligence import PatchIntelligence
+from services.problem_analyzer import ProblemAnalyzer
+
+from . import generators
+
+DEFAULT_SIZES = (100, 1000, 10000)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class Case:
+    """One prepared benchmark: an operation over a loaded data set"""
+
+    def __init__(self, operation: Callable[[int], Awaitable[Any]], operations: int, items_per_op: int = 1):
+        self.operation = operation
+        self.operations = operations
+        self.items_per_op = items_per_op
+
+
+async def kb_search(size: int, ops: int) -> Case:
+    knowledge_base = KnowledgeBaseService()
+    for article in generators.kb_articles(size):
+        await knowledge_base.add_article(article)
+    queries = generators.kb_queries(max(ops, 1))
+    return Case(lambda i: knowledge_base.search(queries[i % len(queries)]), ops)
+
+
+async def problems_analyze(size: int, ops: int) -> Case:
+    analyzer = ProblemAnalyzer()
+    incidents = generators.incidents(size)
+    return Case(lambda i: analyzer.analyze_recurring_problems(incidents, 30), ops, items_per_op=size)
+
+
+async def problems_root_cause(size: int, ops: int) -> Case:
+    analyzer = ProblemAnalyzer()
+    incidents = generators.incidents(size)
+    return Case(lambda i: analyzer.find_root_cause(incidents), ops, items_per_op=size)
+
+
+async def patch_analyze(size: int, ops: int) -> Case:
+    patches = generators.patch_catalog(size)
+    patch_intelligence = PatchIntelligence(catalog=PatchCatalog(patches=patches))
+    systems = generators.hosts(max(ops, 1), patches=patches)
+
+    def operation(i: int):
+        system = systems[i % len(systems)]
+        return patch_intelligence.analyze_patch_requirements(
+            system['system_id'], system['current_patches'], system['system_type'], system['criticality_level']
+        )
+    return Case(operation, ops)
+
+
+async def agent_route(size: int, ops: int) -> Case:
+    agents = MultiAgentSystem()
+    messages = generators.chat_messages(size)
+    context = {'user_id': 'bench', 'session_id': 'bench'}
+    # The whole stream is the workload at this size
+    return Case(lambda i: agents.route_message(messages[i], context), size)
+
+
+async def incident_analyze(size: int, ops: int) -> Case:
+    # A fresh analyzer per size over a frozen resolved history, so every timed call
+    # searches the same index and sizes do not leak into each other
+    analyzer = IncidentAnalyzer()
+    history = [
+        {**incident, 'resolution': f"Restarted {incident['symptoms'][1]} on {incident['affected_systems'][0]}"}
+        for incident in generators.incidents(size)
+    ]
+    await analyzer.add_historical_incidents(history)
+    indexed = len(analyzer.similarity_index)
+    new_incidents = generators.incidents(max(ops, 1), seed=7)
+
+    async def operation(i: int):
+        incident = new_incidents[i % len(new_incidents)]
+        result = await analyzer.analyze_incident(
+            incident['title'], incident['description'], incident['severity'],
+            incident['affected_systems'], incident['symptoms']
+        )
+        if len(analyzer.similarity_index) != indexed:
+            raise RuntimeError("incident analysis added to the history being benchmarked")
+        return result
+    return Case(operation, ops)
+
+
+ENGINES: Dict[str, Callable[[int, int], Awaitable[Case]]] = {
+    'kb_search': kb_search,
+    'problems_analyze': problems_analyze,
+    'problems_root_cause': problems_root_cause,
+    'patch_analyze': patch_analyze,
+    'agent_route': agent_route,
+    'incident_analyze': incident_analyze,
+}
+
+# Operations per size for engines where one operation is a single request
+DEFAULT_OPS = {'kb_search': 500, 'patch_analyze': 200, 'incident_analyze': 200,
+               'problems_analyze': 5, 'problems_root_cause': 5}
+
+
+async def run_case(engine: str, size: int, ops: int, max_seconds: float, memory: bool) -> Dict[str, Any]:
+    if memory:
+        tracemalloc.start()
+    setup_started = time.perf_counter()
+    case = await ENGINES[engine](size, ops)
+    setup_seconds = time.perf_counter() - setup_started
+    retained = tracemalloc.get_traced_memory()[0] if memory else None
+    if memory:
+        tracemalloc.stop()
+
+    # Untraced pass for timings
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for i in range(case.operations):
+        op_started = time.perf_counter()
+        await case.operation(i)
+        latencies.append(time.perf_counter() - op_started)
+        if time.perf_counter() - started > max_seconds:
+            break
+    elapsed = time.perf_counter() - started
+
+    op_peak = None
+    if memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await case.operation(0)
+        op_peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'engine': engine,
+        'size': size,
+        'operations': len(latencies),
+        'setup_seconds': round(setup_seconds, 4),
+        'total_seconds': round(elapsed, 4),
+        'ops_per_second': round(len(latencies) / elapsed, 3) if elapsed else None,
+        'items_per_second': round(len(latencies) * case.items_per_op / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(float(latencies_ms.mean()), 4),
+            'p50': round(float(np.percentile(latencies_ms, 50)), 4),
+            'p90': round(float(np.percentile(latencies_ms, 90)), 4),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 4),
+            'max': round(float(latencies_ms.max()), 4)
+        },
+        'setup_retained_mb': round(retained / 2 ** 20, 2) if retained is not None else None,
+        'op_peak_mb': round(op_peak / 2 ** 20, 3) if op_peak is not None else None,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print the p50 latency change of every case in both runs; return the regressions"""
+    before = {(result['engine'], result['size']): result for result in previous['results']}
+    regressions = []
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('timestamp')})")
+    print(f"{'engine':<22}{'size':>10}{'p50 before':>14}{'p50 now':>12}{'change':>10}")
+    for result in current['results']:
+        old = before.get((result['engine'], result['size']))
+        if old is None:
+            continue
+        old_p50, new_p50 = old['latency_ms']['p50'], result['latency_ms']['p50']
+        change = (new_p50 - old_p50) / old_p50 if old_p50 else 0.0
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"{result['engine']:<22}{result['size']:>10}{old_p50:>14.3f}{new_p50:>12.3f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(f"{result['engine']}@{result['size']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', default=','.join(ENGINES), help='comma-separated engine names')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated data set sizes, e.g. 100,1000,1000000')
+    parser.add_argument('--ops', type=int, default=None, help='operations per case (default per engine)')
+    parser.add_argument('--max-seconds', type=float, default=30.0, help='time budget per case')
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc measurements')
+    parser.add_argument('--output', help='result file (default benchmarks/results/<timestamp>-<commit>.json)')
+    parser.add_argument('--compare', help='earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='p50 slowdown reported as a regression')
+    args = parser.parse_args()
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+    sizes = [int(float(size)) for size in args.sizes.split(',') if size.strip()]
+
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': []
+    }
+    for engine in engines:
+        for size in sizes:
+            ops = args.ops or DEFAULT_OPS.get(engine, size)
+            result = asyncio.run(run_case(engine, size, ops, args.max_seconds, not args.no_memory))
+            report['results'].append(result)
+            latency = result['latency_ms']
+            print(
+                f"{engine:<22}{size:>10}  {result['ops_per_second']:>10.1f} ops/s  "
+                f"p50 {latency['p50']:.3f} ms  p99 {latency['p99']:.3f} ms  "
+                f"setup {result['setup_retained_mb']} MB  op peak {result['op_peak_mb']} MB",
+                flush=True
+            )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(json.load(handle), report, args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,58 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
 import uvicorn
+import json
+import os
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 import asyncio
 
-# Import service modules
-from services.chatbot import ChatbotService
-from services.incident_analyzer import IncidentAnalyzer
-from services.problem_analyzer import ProblemAnalyzer
-from services.patch_intelligence import PatchIntelligence
-from services.automation_engine import AutomationEngine
-from services.knowledge_base import KnowledgeBaseService
-from services.multi_agent_system import MultiAgentSystem
+# Import service modules; the services themselves are built on first use
+from services.registry import service_registry
+from services import metrics
+from services.profiling import ProfilingMiddleware, profiler
+from services.executor import AnalysisExecutor
+from services.task_queue import QueueFullError
+from services.incident_records import IncidentStreamParser
+from services.kb_import import KnowledgeBaseImport
+from services import fast_json
+from services.fast_json import FastJSONResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await analysis_executor.start()
+    await automation_engine.start()
+    preload = [name.strip() for name in os.getenv('SERVICE_PRELOAD', '').split(',') if name.strip()]
+    service_registry.preload(preload)
+    service_registry.record_phase('lifespan_startup', time.perf_counter() - started)
+    logger.info(f"Startup report: {json.dumps(service_registry.report())}")
+    yield
+    await automation_engine.stop()
+    await analysis_executor.shutdown()
+    # Persist state that would otherwise be lost on restart
+    if service_registry.is_created('incident_analyzer') and incident_analyzer.similarity_index.storage_path:
+        incident_analyzer.similarity_index.save(incident_analyzer.similarity_index.storage_path)
+    if service_registry.is_created('knowledge_base'):
+        knowledge_base.search_index.close()
+
 app = FastAPI(
     title="IT Automation AI Services",
     description="AI-powered services for IT automation platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -35,14 +64,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-chatbot_service = ChatbotService()
-incident_analyzer = IncidentAnalyzer()
-problem_analyzer = ProblemAnalyzer()
-patch_intelligence = PatchIntelligence()
-automation_engine = AutomationEngine()
-knowledge_base = KnowledgeBaseService()
-multi_agent_system = MultiAgentSystem()
+# Opt-in sampling profiler, enabled through PROFILE_SAMPLE_RATE or the admin endpoint
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so latency covers every other middleware
+app.add_middleware(metrics.PrometheusMiddleware)
+
+# Services are shared singletons from the registry, created on first use
+chatbot_service = service_registry.proxy('chatbot')
+incident_analyzer = service_registry.proxy('incident_analyzer')
+problem_analyzer = service_registry.proxy('problem_analyzer')
+patch_intelligence = service_registry.proxy('patch_intelligence')
+automation_engine = service_registry.proxy('automation_engine')
+knowledge_base = service_registry.proxy('knowledge_base')
+multi_agent_system = service_registry.proxy('multi_agent_system')
+problem_detector = service_registry.proxy('problem_detector')
+
+# CPU-heavy analysis runs inline, on threads or on worker processes per endpoint policy
+analysis_executor = AnalysisExecutor.from_env({
+    'problem_analyzer': problem_analyzer,
+    'patch_intelligence': patch_intelligence
+})
+metrics.register_service_collector(service_registry)
+service_registry.record_phase('main_import', time.perf_counter() - _IMPORT_STARTED)
 
 # Pydantic models
 class ChatMessage(BaseModel):
@@ -60,16 +104,41 @@ class IncidentData(BaseModel):
     symptoms: List[str]
     timestamp: datetime
 
+class HistoricalIncident(BaseModel):
+    incident_id: str
+    title: str
+    description: str = ''
+    resolution: str
+    resolution_time: Optional[float] = None
+
+class IncidentHistoryRequest(BaseModel):
+    incidents: List[HistoricalIncident]
+
+class IncidentBatchRequest(BaseModel):
+    # Items are validated one by one so a malformed incident fails alone
+    incidents: List[Dict[str, Any]]
+
 class ProblemAnalysisRequest(BaseModel):
     incidents: List[Dict[str, Any]]
     timeframe_days: int = 30
 
+class ProblemIncidentsRequest(BaseModel):
+    incidents: List[Dict[str, Any]]
+
 class PatchAnalysisRequest(BaseModel):
     system_id: str
     current_patches: List[str]
     system_type: str
     criticality_level: str
 
+class FleetPatchAnalysisRequest(BaseModel):
+    systems: List[PatchAnalysisRequest]
+    include_patches: bool = False
+
+class ProfileSettings(BaseModel):
+    sample_rate: Optional[float] = None
+    reset: bool = False
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -86,6 +155,32 @@ async def health_check():
         }
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+@app.get("/api/admin/profile")
+async def get_profile():
+    """Aggregated span timings of sampled requests as collapsed stacks (microseconds)"""
+    return PlainTextResponse(profiler.collapsed())
+
+@app.post("/api/admin/profile")
+async def configure_profile(settings: ProfileSettings):
+    """Change the sampled fraction of requests and/or clear the aggregated profile"""
+    if settings.sample_rate is not None:
+        if not 0 <= settings.sample_rate <= 1:
+            raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+        profiler.sample_rate = settings.sample_rate
+    if settings.reset:
+        profiler.reset()
+    return profiler.stats()
+
+@app.get("/api/admin/startup")
+async def get_startup_report():
+    """Import and init cost per component; services not used yet are reported as lazy"""
+    return service_registry.report()
+
 # Multi-Agent Chat endpoints
 @app.post("/api/chat/message")
 async def process_chat_message(message: ChatMessage):
@@ -97,12 +192,13 @@ async def process_chat_message(message: ChatMessage):
             **(message.context or {})
         }
         
-        response = await multi_agent_system.route_message(
+        # Identical replies are served from prebuilt, already encoded templates
+        body = await multi_agent_system.route_message_json(
             message.message,
             user_context,
             message.preferred_agent
         )
-        return response
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Multi-agent chat processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -136,7 +232,7 @@ async def analyze_incident(incident: IncidentData):
             incident.affected_systems,
             incident.symptoms
         )
-        return analysis
+        return FastJSONResponse(analysis)
     except Exception as e:
         logger.error(f"Incident analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -159,24 +255,139 @@ async def predict_resolution_time(incident: IncidentData):
         logger.error(f"Resolution prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/incidents/history")
+async def add_incident_history(request: IncidentHistoryRequest):
+    """Record resolved incidents so similar-incident lookups can return them with their resolution"""
+    try:
+        added = await incident_analyzer.add_historical_incidents([incident.dict() for incident in request.incidents])
+        return {'added': added, 'indexed_incidents': len(incident_analyzer.similarity_index)}
+    except Exception as e:
+        logger.error(f"Incident history error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+MAX_INCIDENT_BATCH = int(os.getenv('MAX_INCIDENT_BATCH', '10000'))
+
+async def _run_incident_batch(request: IncidentBatchRequest, batch_method) -> Dict[str, Any]:
+    """Validate each incident, run the batch method on the valid ones and merge results in order"""
+    if len(request.incidents) > MAX_INCIDENT_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_INCIDENT_BATCH} incidents")
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(request.incidents)
+    valid_positions, valid_incidents = [], []
+    for position, item in enumerate(request.incidents):
+        try:
+            valid_incidents.append(IncidentData(**item).dict())
+            valid_positions.append(position)
+        except ValidationError as e:
+            results[position] = {'index': position, 'status': 'error', 'error': str(e)}
+    
+    for position, outcome in zip(valid_positions, await batch_method(valid_incidents)):
+        results[position] = {**outcome, 'index': position}
+    
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return {
+        'results': results,
+        'total': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed
+    }
+
+@app.post("/api/incidents/analyze/batch")
+async def analyze_incidents_batch(request: IncidentBatchRequest):
+    try:
+        return FastJSONResponse(await _run_incident_batch(request, incident_analyzer.analyze_incidents))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch incident analysis error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/incidents/classify/batch")
+async def classify_incidents_batch(request: IncidentBatchRequest):
+    try:
+        return FastJSONResponse(await _run_incident_batch(request, incident_analyzer.classify_incidents))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch incident classification error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/incidents/predict-resolution/batch")
+async def predict_resolution_times_batch(request: IncidentBatchRequest):
+    try:
+        return FastJSONResponse(await _run_incident_batch(request, incident_analyzer.predict_resolution_times))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch resolution prediction error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Problem analysis endpoints
 @app.post("/api/problems/analyze")
 async def analyze_problems(request: ProblemAnalysisRequest):
     try:
-        analysis = await problem_analyzer.analyze_recurring_problems(
+        analysis = await analysis_executor.run(
+            'problems.analyze',
+            'problem_analyzer',
+            'analyze_recurring_problems',
             request.incidents,
             request.timeframe_days
         )
-        return analysis
+        return FastJSONResponse(analysis)
     except Exception as e:
         logger.error(f"Problem analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/problems/analyze/stream")
+async def analyze_problems_stream(request: Request, timeframe_days: int = 30):
+    """Analyze recurring problems from an NDJSON body, one incident per line, parsed as it uploads"""
+    try:
+        parser = IncidentStreamParser(timeframe_days)
+        async for chunk in request.stream():
+            parser.feed(chunk)
+        records = parser.close()
+        
+        analysis = await analysis_executor.run(
+            'problems.analyze_stream',
+            'problem_analyzer',
+            'analyze_incident_records',
+            records,
+            timeframe_days,
+            parser.stats()
+        )
+        return FastJSONResponse(analysis)
+    except Exception as e:
+        logger.error(f"Streaming problem analysis error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/problems/online/incidents")
+async def push_problem_incidents(request: ProblemIncidentsRequest):
+    """Add incidents to the sliding-window problem detector"""
+    try:
+        return problem_detector.push(request.incidents)
+    except Exception as e:
+        logger.error(f"Online problem detection error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/problems/online/snapshot")
+async def get_problem_snapshot(include_incidents: bool = False):
+    """Current problem groups of the sliding window, maintained incrementally"""
+    try:
+        return FastJSONResponse(await problem_detector.snapshot(include_incidents))
+    except Exception as e:
+        logger.error(f"Problem snapshot error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/problems/root-cause")
 async def find_root_cause(request: ProblemAnalysisRequest):
     try:
-        root_cause = await problem_analyzer.find_root_cause(request.incidents)
-        return root_cause
+        root_cause = await analysis_executor.run(
+            'problems.root_cause',
+            'problem_analyzer',
+            'find_root_cause',
+            request.incidents
+        )
+        return FastJSONResponse(root_cause)
     except Exception as e:
         logger.error(f"Root cause analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -185,32 +396,82 @@ async def find_root_cause(request: ProblemAnalysisRequest):
 @app.post("/api/patches/analyze")
 async def analyze_patches(request: PatchAnalysisRequest):
     try:
-        analysis = await patch_intelligence.analyze_patch_requirements(
+        analysis = await analysis_executor.run(
+            'patches.analyze',
+            'patch_intelligence',
+            'analyze_patch_requirements',
             request.system_id,
             request.current_patches,
             request.system_type,
             request.criticality_level
         )
-        return analysis
+        return FastJSONResponse(analysis)
     except Exception as e:
         logger.error(f"Patch analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/patches/fleet-analyze")
+async def analyze_patch_fleet(request: FleetPatchAnalysisRequest):
+    """Analyze many systems at once, streaming one NDJSON line per host and a final summary"""
+    systems = [system.dict() for system in request.systems]
+    chunks = patch_intelligence.fleet_analyzer.analyze(systems, request.include_patches)
+    
+    async def result_stream():
+        started = datetime.now()
+        hosts = non_compliant = 0
+        try:
+            while True:
+                # Each chunk is a few matrix products; run it off the event loop
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                hosts += len(chunk)
+                non_compliant += sum(1 for result in chunk if not result['compliance_status']['compliant'])
+                yield b''.join(fast_json.dumps(result) + b'\n' for result in chunk)
+        except Exception as e:
+            logger.error(f"Fleet patch analysis error: {str(e)}")
+            yield fast_json.dumps({'error': str(e)}) + b'\n'
+            return
+        yield fast_json.dumps({'summary': {
+            'hosts': hosts,
+            'non_compliant_hosts': non_compliant,
+            'duration_seconds': round((datetime.now() - started).total_seconds(), 3)
+        }}) + b'\n'
+    
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@app.get("/api/patches/catalog")
+async def get_patch_catalog():
+    """Version and size of the patch catalog loaded in this process"""
+    patch_intelligence.catalog.refresh()
+    return {
+        **patch_intelligence.catalog.stats(),
+        'recommendation_cache': patch_intelligence.recommendation_cache.stats()
+    }
+
 @app.get("/api/patches/recommendations/{system_id}")
 async def get_patch_recommendations(system_id: str):
     try:
         recommendations = await patch_intelligence.get_patch_recommendations(system_id)
-        return recommendations
+        return FastJSONResponse(recommendations)
     except Exception as e:
         logger.error(f"Patch recommendations error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/patches/systems/{system_id}/invalidate")
+async def invalidate_patch_system(system_id: str):
+    """Hook for CMDB change notifications: drop the system's cached recommendations"""
+    return {"system_id": system_id, "invalidated": patch_intelligence.invalidate_system(system_id)}
+
 # Automation endpoints
 @app.post("/api/automation/execute")
-async def execute_automation(background_tasks: BackgroundTasks, task_data: Dict[str, Any]):
+async def execute_automation(task_data: Dict[str, Any]):
     try:
-        task_id = await automation_engine.execute_task(task_data, background_tasks)
+        task_id = await automation_engine.execute_task(task_data)
         return {"task_id": task_id, "status": "initiated"}
+    except QueueFullError as e:
+        logger.warning(f"Automation queue full: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Automation execution error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -224,16 +485,45 @@ async def get_automation_status(task_id: str):
         logger.error(f"Automation status error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/automation/events")
+async def stream_automation_events(request: Request, task_id: Optional[List[str]] = Query(None),
+                                   task_type: Optional[str] = None):
+    """Server-Sent Events stream of task status transitions"""
+    async def event_stream():
+        async for event in automation_engine.watch_tasks(task_id, task_type):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            event_id = event.get('sequence')
+            prefix = f"id: {event_id}\n" if event_id else ""
+            yield f"{prefix}event: task_status\ndata: {json.dumps(event, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Knowledge base endpoints
 @app.get("/api/knowledge/search")
-async def search_knowledge_base(query: str, category: Optional[str] = None):
+async def search_knowledge_base(query: str, category: Optional[str] = None, fuzzy: bool = True):
     try:
-        results = await knowledge_base.search(query, category)
-        return results
+        results = await knowledge_base.search(query, category, fuzzy)
+        return FastJSONResponse(results)
     except Exception as e:
         logger.error(f"Knowledge search error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/knowledge/autocomplete")
+async def autocomplete_knowledge_base(q: str, limit: int = Query(10, ge=1, le=50), category: Optional[str] = None):
+    try:
+        return await knowledge_base.autocomplete(q, limit, category)
+    except Exception as e:
+        logger.error(f"Knowledge autocomplete error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/knowledge/add")
 async def add_knowledge_article(article_data: Dict[str, Any]):
     try:
@@ -243,6 +533,55 @@ async def add_knowledge_article(article_data: Dict[str, Any]):
         logger.error(f"Knowledge addition error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/knowledge/import")
+async def import_knowledge_articles(request: Request, replace: bool = False):
+    """Bulk import articles from an NDJSON body, one article per line, indexed in parallel as it uploads"""
+    importer = None
+    try:
+        importer = KnowledgeBaseImport(knowledge_base, replace=replace)
+        async for chunk in request.stream():
+            await importer.feed(chunk)
+        return await importer.finish()
+    except Exception as e:
+        logger.error(f"Knowledge import error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Frees the workers, reserved names and built segments of an import that did not finish
+        if importer is not None:
+            await importer.abort()
+
+@app.get("/api/knowledge/index")
+async def get_knowledge_index_status():
+    try:
+        return await knowledge_base.get_index_status()
+    except Exception as e:
+        logger.error(f"Knowledge index status error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/knowledge/popular")
+async def get_popular_knowledge_articles(limit: int = Query(5, ge=0, le=1000)):
+    try:
+        return {"articles": await knowledge_base.get_popular_articles(limit)}
+    except Exception as e:
+        logger.error(f"Popular articles error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/knowledge/recent")
+async def get_recent_knowledge_articles(limit: int = Query(5, ge=0, le=1000)):
+    try:
+        return {"articles": await knowledge_base.get_recent_articles(limit)}
+    except Exception as e:
+        logger.error(f"Recent articles error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/knowledge/statistics")
+async def get_knowledge_statistics():
+    try:
+        return await knowledge_base.get_statistics()
+    except Exception as e:
+        logger.error(f"Knowledge statistics error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
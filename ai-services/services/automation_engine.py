@@ -1,43 +1,93 @@
 import asyncio
+import os
+import time
 import uuid
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime
 import logging
+from .task_queue import TaskQueue, TaskStore, TERMINAL_STATUSES
+from .task_events import TaskEventBus
+from .metrics import AUTOMATION_TASK_SECONDS, AUTOMATION_TASKS
 
 logger = logging.getLogger(__name__)
 
+def _parse_type_limits(spec: str) -> Dict[str, int]:
+    """Parse 'task_type=limit,task_type=limit'"""
+    limits = {}
+    for entry in spec.split(','):
+        if '=' in entry:
+            task_type, _, limit = entry.partition('=')
+            limits[task_type.strip()] = int(limit)
+    return limits
+
 class AutomationEngine:
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None):
+        # Lower value runs first
+        self.priority_levels = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+        self.default_priorities = {'incident_response': 1}
+        
+        # Queued and running tasks only; finished tasks live in the task store until retention expires
         self.task_registry = {}
-        self.running_tasks = {}
         
-    async def execute_task(self, task_data: Dict[str, Any], background_tasks) -> str:
+        # Tasks survive a restart only when AUTOMATION_DB_PATH names a database file
+        self.task_store = TaskStore(db_path or os.getenv('AUTOMATION_DB_PATH', ':memory:'))
+        # Status writes run off the event loop on one thread, so they land in the order they were made
+        self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='automation-store')
+        self.task_queue = TaskQueue(
+            self.task_store,
+            self._run_task,
+            max_workers=int(os.getenv('AUTOMATION_WORKERS', '8')),
+            type_limits=_parse_type_limits(os.getenv(
+                'AUTOMATION_TYPE_LIMITS',
+                'vm_provisioning=4,patch_deployment=4,user_onboarding=4'
+            )),
+            max_queued=int(os.getenv('AUTOMATION_MAX_QUEUED', '10000')),
+            retention_seconds=float(os.getenv('AUTOMATION_RETENTION_HOURS', '24')) * 3600
+        )
+        
+        # Status transitions pushed to streaming subscribers
+        self.events = TaskEventBus(max_pending=int(os.getenv('AUTOMATION_EVENT_BUFFER', '100')))
+        
+    async def start(self):
+        """Start the worker pool and resume tasks interrupted by a restart"""
+        if self.task_store.path == ':memory:':
+            logger.info("AUTOMATION_DB_PATH is not set; automation tasks will not survive a restart")
+        recovered = await self.task_queue.start()
+        for record in recovered:
+            self.task_registry[record['id']] = record
+            if record['status'] == 'running':
+                await self._update_task_status(record['id'], 'queued', 'Re-queued after service restart')
+
+    async def stop(self):
+        """Stop the worker pool; interrupted tasks resume on the next start"""
+        for task_id in await self.task_queue.stop():
+            await self._update_task_status(task_id, 'queued', 'Interrupted by service shutdown')
+
+    async def execute_task(self, task_data: Dict[str, Any]) -> str:
         """Execute automation task"""
         try:
+            if not self.task_queue.started:
+                await self.start()
+            
             task_id = str(uuid.uuid4())
+            task_type = task_data.get('type')
+            priority = self._resolve_priority(task_type, task_data.get('priority'))
             
             # Register task
-            self.task_registry[task_id] = {
+            record = {
                 'id': task_id,
-                'type': task_data.get('type'),
-                'status': 'initiated',
-                'created_at': datetime.now().isoformat(),
-                'data': task_data
+                'type': task_type,
+                'status': 'queued',
+                'priority': priority,
+                'created_at': datetime.now().isoformat()
             }
-            
-            # Execute based on task type
-            task_type = task_data.get('type')
-            
-            if task_type == 'vm_provisioning':
-                background_tasks.add_task(self._execute_vm_provisioning, task_id, task_data)
-            elif task_type == 'patch_deployment':
-                background_tasks.add_task(self._execute_patch_deployment, task_id, task_data)
-            elif task_type == 'user_onboarding':
-                background_tasks.add_task(self._execute_user_onboarding, task_id, task_data)
-            elif task_type == 'incident_response':
-                background_tasks.add_task(self._execute_incident_response, task_id, task_data)
-            else:
-                background_tasks.add_task(self._execute_generic_task, task_id, task_data)
+            # A rejected task must not reach the store, or a restart would run it anyway
+            self.task_queue.check_capacity()
+            self.task_store.insert(record, task_data)
+            self.task_queue.submit(task_id, task_type, priority)
+            self.task_registry[task_id] = record
+            self.events.publish({'task_id': task_id, **record, 'message': 'Task queued'})
             
             return task_id
             
@@ -47,12 +97,73 @@ class AutomationEngine:
 
     async def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """Get status of automation task"""
-        return self.task_registry.get(task_id, {'error': 'Task not found'})
+        record = self.task_registry.get(task_id) or await self._in_store(self.task_store.get, task_id)
+        return record or {'error': 'Task not found'}
+
+    async def watch_tasks(self, task_ids: Optional[List[str]] = None, task_type: Optional[str] = None,
+                          heartbeat_seconds: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield status events for the given tasks, a task type, or all tasks.
+        
+        When specific task IDs are watched, their current status is yielded first and
+        the stream ends once they have all finished. None is yielded when no event
+        arrived within heartbeat_seconds so callers can keep the connection alive.
+        """
+        subscription = self.events.subscribe(task_ids, task_type)
+        try:
+            pending = set(task_ids or ())
+            for task_id in list(pending):
+                snapshot = await self.get_task_status(task_id)
+                yield {'task_id': task_id, **snapshot}
+                if snapshot.get('status') in TERMINAL_STATUSES or 'error' in snapshot:
+                    pending.discard(task_id)
+            
+            if task_ids and not pending and not task_type:
+                return
+            
+            while True:
+                event = await subscription.get(timeout=heartbeat_seconds)
+                if event is not None and subscription.dropped:
+                    event = {**event, 'dropped_events': subscription.dropped}
+                    subscription.dropped = 0
+                yield event
+                
+                if event is not None and event.get('status') in TERMINAL_STATUSES:
+                    pending.discard(event['task_id'])
+                    if task_ids and not pending and not task_type:
+                        return
+        finally:
+            self.events.unsubscribe(subscription)
+
+    def _resolve_priority(self, task_type: Optional[str], priority: Any) -> int:
+        if isinstance(priority, int):
+            return priority
+        if isinstance(priority, str) and priority.lower() in self.priority_levels:
+            return self.priority_levels[priority.lower()]
+        return self.default_priorities.get(task_type, self.priority_levels['medium'])
+
+    async def _run_task(self, task_id: str, task_type: str, task_data: Dict[str, Any]):
+        """Execute based on task type"""
+        started = time.monotonic()
+        await self._dispatch_task(task_id, task_type, task_data)
+        # Interrupted tasks raise CancelledError above and are timed when they rerun
+        AUTOMATION_TASK_SECONDS.labels(task_type or 'unknown').observe(time.monotonic() - started)
+
+    async def _dispatch_task(self, task_id: str, task_type: str, task_data: Dict[str, Any]):
+        if task_type == 'vm_provisioning':
+            await self._execute_vm_provisioning(task_id, task_data)
+        elif task_type == 'patch_deployment':
+            await self._execute_patch_deployment(task_id, task_data)
+        elif task_type == 'user_onboarding':
+            await self._execute_user_onboarding(task_id, task_data)
+        elif task_type == 'incident_response':
+            await self._execute_incident_response(task_id, task_data)
+        else:
+            await self._execute_generic_task(task_id, task_data)
 
     async def _execute_vm_provisioning(self, task_id: str, task_data: Dict[str, Any]):
         """Execute VM provisioning automation"""
         try:
-            self._update_task_status(task_id, 'running', 'Starting VM provisioning')
+            await self._update_task_status(task_id, 'running', 'Starting VM provisioning')
             
             # Simulate VM provisioning steps
             steps = [
@@ -64,7 +175,7 @@ class AutomationEngine:
             ]
             
             for step, duration in steps:
-                self._update_task_status(task_id, 'running', step)
+                await self._update_task_status(task_id, 'running', step)
                 await asyncio.sleep(duration)  # Simulate work
             
             # Complete task
@@ -75,15 +186,15 @@ class AutomationEngine:
                 'provisioned_at': datetime.now().isoformat()
             }
             
-            self._update_task_status(task_id, 'completed', 'VM provisioning completed', result)
+            await self._update_task_status(task_id, 'completed', 'VM provisioning completed', result)
             
         except Exception as e:
-            self._update_task_status(task_id, 'failed', f'VM provisioning failed: {str(e)}')
+            await self._update_task_status(task_id, 'failed', f'VM provisioning failed: {str(e)}')
 
     async def _execute_patch_deployment(self, task_id: str, task_data: Dict[str, Any]):
         """Execute patch deployment automation"""
         try:
-            self._update_task_status(task_id, 'running', 'Starting patch deployment')
+            await self._update_task_status(task_id, 'running', 'Starting patch deployment')
             
             steps = [
                 ('Creating system backup', 20),
@@ -94,7 +205,7 @@ class AutomationEngine:
             ]
             
             for step, duration in steps:
-                self._update_task_status(task_id, 'running', step)
+                await self._update_task_status(task_id, 'running', step)
                 await asyncio.sleep(duration)
             
             result = {
@@ -104,15 +215,15 @@ class AutomationEngine:
                 'status': 'success'
             }
             
-            self._update_task_status(task_id, 'completed', 'Patch deployment completed', result)
+            await self._update_task_status(task_id, 'completed', 'Patch deployment completed', result)
             
         except Exception as e:
-            self._update_task_status(task_id, 'failed', f'Patch deployment failed: {str(e)}')
+            await self._update_task_status(task_id, 'failed', f'Patch deployment failed: {str(e)}')
 
     async def _execute_user_onboarding(self, task_id: str, task_data: Dict[str, Any]):
         """Execute user onboarding automation"""
         try:
-            self._update_task_status(task_id, 'running', 'Starting user onboarding')
+            await self._update_task_status(task_id, 'running', 'Starting user onboarding')
             
             steps = [
                 ('Creating user account', 10),
@@ -123,7 +234,7 @@ class AutomationEngine:
             ]
             
             for step, duration in steps:
-                self._update_task_status(task_id, 'running', step)
+                await self._update_task_status(task_id, 'running', step)
                 await asyncio.sleep(duration)
             
             result = {
@@ -134,15 +245,15 @@ class AutomationEngine:
                 'status': 'active'
             }
             
-            self._update_task_status(task_id, 'completed', 'User onboarding completed', result)
+            await self._update_task_status(task_id, 'completed', 'User onboarding completed', result)
             
         except Exception as e:
-            self._update_task_status(task_id, 'failed', f'User onboarding failed: {str(e)}')
+            await self._update_task_status(task_id, 'failed', f'User onboarding failed: {str(e)}')
 
     async def _execute_incident_response(self, task_id: str, task_data: Dict[str, Any]):
         """Execute incident response automation"""
         try:
-            self._update_task_status(task_id, 'running', 'Starting incident response')
+            await self._update_task_status(task_id, 'running', 'Starting incident response')
             
             incident_type = task_data.get('incident_type', 'general')
             
@@ -171,7 +282,7 @@ class AutomationEngine:
                 ]
             
             for step, duration in steps:
-                self._update_task_status(task_id, 'running', step)
+                await self._update_task_status(task_id, 'running', step)
                 await asyncio.sleep(duration)
             
             result = {
@@ -182,15 +293,15 @@ class AutomationEngine:
                 'status': 'resolved'
             }
             
-            self._update_task_status(task_id, 'completed', 'Incident response completed', result)
+            await self._update_task_status(task_id, 'completed', 'Incident response completed', result)
             
         except Exception as e:
-            self._update_task_status(task_id, 'failed', f'Incident response failed: {str(e)}')
+            await self._update_task_status(task_id, 'failed', f'Incident response failed: {str(e)}')
 
     async def _execute_generic_task(self, task_id: str, task_data: Dict[str, Any]):
         """Execute generic automation task"""
         try:
-            self._update_task_status(task_id, 'running', 'Executing automation task')
+            await self._update_task_status(task_id, 'running', 'Executing automation task')
             
             # Simulate generic task execution
             await asyncio.sleep(30)
@@ -201,21 +312,47 @@ class AutomationEngine:
                 'status': 'completed'
             }
             
-            self._update_task_status(task_id, 'completed', 'Task completed successfully', result)
+            await self._update_task_status(task_id, 'completed', 'Task completed successfully', result)
             
         except Exception as e:
-            self._update_task_status(task_id, 'failed', f'Task execution failed: {str(e)}')
+            await self._update_task_status(task_id, 'failed', f'Task execution failed: {str(e)}')
+
+    async def _in_store(self, method, *args):
+        """Run a blocking task store call on the store thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._store_executor, method, *args)
 
-    def _update_task_status(self, task_id: str, status: str, message: str, result: Dict[str, Any] = None):
+    async def _update_task_status(self, task_id: str, status: str, message: str, result: Dict[str, Any] = None):
         """Update task status"""
+        updated_at = datetime.now().isoformat()
+        await self._in_store(self.task_store.update, task_id, status, message, updated_at, result)
+        
+        record = self.task_registry.get(task_id)
+        if record is None:
+            record = await self._in_store(self.task_store.get, task_id) or {}
+        if status in TERMINAL_STATUSES:
+            AUTOMATION_TASKS.labels(record.get('type') or 'unknown', status).inc()
+        event = {
+            'task_id': task_id,
+            'type': record.get('type'),
+            'status': status,
+            'message': message,
+            'updated_at': updated_at
+        }
+        if result:
+            event['result'] = result
+        self.events.publish(event)
+        
         if task_id in self.task_registry:
             self.task_registry[task_id].update({
                 'status': status,
                 'message': message,
-                'updated_at': datetime.now().isoformat()
+                'updated_at': updated_at
             })
             
             if result:
                 self.task_registry[task_id]['result'] = result
             
-            logger.info(f"Task {task_id}: {status} - {message}")
\ No newline at end of file
+            if status in TERMINAL_STATUSES:
+                del self.task_registry[task_id]
+        
+        logger.info(f"Task {task_id}: {status} - {message}")
@@ -3,12 +3,14 @@ import json
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import logging
+from .keyword_matcher import keyword_matcher
+from .session_store import SessionStore, create_session_store, make_turn
 
 logger = logging.getLogger(__name__)
 
 class ChatbotService:
-    def __init__(self):
-        self.conversation_history = {}
+    def __init__(self, session_store: Optional[SessionStore] = None):
+        self.conversation_history = session_store if session_store is not None else create_session_store()
         self.intent_patterns = {
             "password_reset": ["password", "reset", "forgot", "login", "access"],
             "software_install": ["install", "software", "application", "program"],
@@ -18,6 +20,7 @@ class ChatbotService:
             "ticket_status": ["ticket", "status", "update", "progress"],
             "general_help": ["help", "support", "assistance", "guide"]
         }
+        keyword_matcher.register('intent', self.intent_patterns)
         
         self.responses = {
             "password_reset": {
@@ -67,28 +70,26 @@ class ChatbotService:
     async def process_message(self, message: str, user_id: str, session_id: str, context: Optional[Dict] = None) -> Dict[str, Any]:
         """Process incoming chat message and generate appropriate response"""
         try:
-            # Store conversation history
-            if session_id not in self.conversation_history:
-                self.conversation_history[session_id] = []
-            
-            self.conversation_history[session_id].append({
-                "timestamp": datetime.now().isoformat(),
-                "user_message": message,
-                "user_id": user_id
-            })
-            
-            # Analyze intent
-            intent = await self._analyze_intent(message)
+            user_turn = make_turn("user", message, user_id)
             
-            # Generate response
-            response = await self._generate_response(intent, message, context)
+            try:
+                # Analyze intent
+                intent = await self._analyze_intent(message)
+                
+                # Generate response
+                response = await self._generate_response(intent, message, context)
+            except Exception:
+                # The user's message is kept even when no response could be generated
+                await self.conversation_history.append(session_id, user_turn)
+                raise
             
-            # Store bot response
-            self.conversation_history[session_id].append({
-                "timestamp": datetime.now().isoformat(),
-                "bot_response": response,
-                "intent": intent
-            })
+            # Store conversation history
+            details = {key: value for key, value in response.items() if key != "message"}
+            await self.conversation_history.append(
+                session_id,
+                user_turn,
+                make_turn("bot", response["message"], intent, details)
+            )
             
             return response
             
@@ -105,13 +106,12 @@ class ChatbotService:
 
     async def _analyze_intent(self, message: str) -> str:
         """Analyze user message to determine intent"""
-        message_lower = message.lower()
-        intent_scores = {}
-        
-        for intent, keywords in self.intent_patterns.items():
-            score = sum(1 for keyword in keywords if keyword in message_lower)
-            if score > 0:
-                intent_scores[intent] = score / len(keywords)
+        hits = keyword_matcher.scan(message).counts('intent')
+        intent_scores = {
+            intent: hits[intent] / len(keywords)
+            for intent, keywords in self.intent_patterns.items()
+            if intent in hits
+        }
         
         if intent_scores:
             return max(intent_scores, key=intent_scores.get)
@@ -173,11 +173,16 @@ class ChatbotService:
 
     async def get_conversation_history(self, session_id: str) -> List[Dict]:
         """Retrieve conversation history for a session"""
-        return self.conversation_history.get(session_id, [])
+        history = []
+        for timestamp, role, text, meta, details in await self.conversation_history.get(session_id):
+            entry = {"timestamp": datetime.fromtimestamp(timestamp).isoformat()}
+            if role == "user":
+                entry.update({"user_message": text, "user_id": meta})
+            else:
+                entry.update({"bot_response": {"message": text, **(details or {})}, "intent": meta})
+            history.append(entry)
+        return history
 
     async def clear_conversation_history(self, session_id: str) -> bool:
         """Clear conversation history for a session"""
-        if session_id in self.conversation_history:
-            del self.conversation_history[session_id]
-            return True
-        return False
\ No newline at end of file
+        return await self.conversation_history.delete(session_id)
\ No newline at end of file
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import importlib
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Set, Tuple
+import logging
+
+from .profiling import close_profile, is_sampled, merge_profile, open_profile
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = ('inline', 'thread', 'process')
+
+# Endpoints whose handlers are pure-Python CPU loops; everything else runs inline
+DEFAULT_POLICY = {
+    'problems.analyze': 'process',
+    'problems.analyze_stream': 'process',
+    'problems.root_cause': 'process',
+    'patches.analyze': 'process'
+}
+
+# Services a worker process can run, as (module, class) so they can be built after spawn
+WORKER_SERVICES = {
+    'problem_analyzer': ('services.problem_analyzer', 'ProblemAnalyzer'),
+    'patch_intelligence': ('services.patch_intelligence', 'PatchIntelligence')
+}
+
+
+@dataclass(frozen=True)
+class AnalysisJob:
+    """Picklable description of a service call shipped to a worker"""
+    service: str
+    method: str
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    # Whether the calling request is sampled by the profiler; the worker then records its spans
+    profile: bool = False
+
+
+# Per-process service instances, built once by the pool initializer
+_worker_services: Dict[str, Any] = {}
+
+
+def _init_worker(service_specs: Dict[str, Tuple[str, str]], ready=None):
+    for name, (module_name, class_name) in service_specs.items():
+        module = importlib.import_module(module_name)
+        _worker_services[name] = getattr(module, class_name)()
+    if ready is not None:
+        # Reported only once every service is built, so the parent knows this process can take jobs
+        ready.put(os.getpid())
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _run_job(job: AnalysisJob) -> Tuple[Any, Optional[Dict[Tuple[str, ...], float]]]:
+    """Run the job in this worker; returns the result and, for sampled requests, its profile"""
+    service = _worker_services[job.service]
+    if not job.profile:
+        return asyncio.run(getattr(service, job.method)(*job.args, **job.kwargs)), None
+    frame, token = open_profile()
+    try:
+        result = asyncio.run(getattr(service, job.method)(*job.args, **job.kwargs))
+    finally:
+        profile = close_profile(frame, token)
+    return result, profile
+
+
+def parse_policy(spec: Optional[str]) -> Dict[str, str]:
+    """Parse 'endpoint=mode,endpoint=mode' into a policy mapping"""
+    policy = {}
+    for entry in (spec or '').split(','):
+        if not entry.strip():
+            continue
+        endpoint, _, mode = entry.partition('=')
+        mode = mode.strip().lower()
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode '{mode}' for endpoint '{endpoint.strip()}'")
+        policy[endpoint.strip()] = mode
+    return policy
+
+
+class AnalysisExecutor:
+    """Runs service calls inline, on a thread pool or on a warm process pool per endpoint policy"""
+
+    def __init__(self, services: Dict[str, Any], policy: Optional[Dict[str, str]] = None,
+                 process_workers: Optional[int] = None, thread_workers: Optional[int] = None,
+                 start_method: Optional[str] = None):
+        self.services = services
+        self.policy = {**DEFAULT_POLICY, **(policy or {})}
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.thread_workers = thread_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.start_method = start_method or 'spawn'
+
+        self.warm_up_timeout = 120.0
+
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._ready = None
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+
+    @classmethod
+    def from_env(cls, services: Dict[str, Any]) -> 'AnalysisExecutor':
+        """Build an executor configured through AI_EXECUTION_POLICY and friends"""
+        process_workers = os.getenv('AI_PROCESS_WORKERS')
+        thread_workers = os.getenv('AI_THREAD_WORKERS')
+        return cls(
+            services,
+            policy=parse_policy(os.getenv('AI_EXECUTION_POLICY')),
+            process_workers=int(process_workers) if process_workers else None,
+            thread_workers=int(thread_workers) if thread_workers else None,
+            start_method=os.getenv('AI_PROCESS_START_METHOD')
+        )
+
+    def mode_for(self, endpoint: str) -> str:
+        return self.policy.get(endpoint, 'inline')
+
+    async def start(self):
+        """Create the pools and bring every process worker up before traffic arrives"""
+        self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix='analysis')
+        if 'process' in self.policy.values():
+            self._process_pool = self._create_process_pool()
+            await self._warm_process_pool()
+
+    async def shutdown(self):
+        if self._process_pool:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+            self._ready = None
+        if self._thread_pool:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+
+    def _create_process_pool(self) -> ProcessPoolExecutor:
+        specs = {name: spec for name, spec in WORKER_SERVICES.items() if name in self.services}
+        context = multiprocessing.get_context(self.start_method)
+        self._ready = context.Queue()
+        return ProcessPoolExecutor(
+            max_workers=self.process_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(specs, self._ready)
+        )
+
+    async def _warm_process_pool(self) -> Set[int]:
+        """Start every worker process and wait until each has built its services; returns their PIDs"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Each job submitted while no worker is idle starts another process, up to process_workers
+        await asyncio.gather(*(
+            loop.run_in_executor(self._process_pool, _warm_up)
+            for _ in range(self.process_workers)
+        ))
+
+        # The no-ops may all have run on the first workers up; wait for the rest to report in
+        pids: Set[int] = set()
+        deadline = started + self.warm_up_timeout
+        while len(pids) < self.process_workers:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                pids.add(await loop.run_in_executor(self._thread_pool, self._ready.get, True, remaining))
+            except queue.Empty:
+                break
+
+        if len(pids) < self.process_workers:
+            logger.warning(
+                f"Only {len(pids)} of {self.process_workers} analysis worker processes were ready "
+                f"after {self.warm_up_timeout:.0f}s"
+            )
+        logger.info(
+            f"Warmed {len(pids)} analysis worker processes in "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+        return pids
+
+    async def run(self, endpoint: str, service: str, method: str, *args, **kwargs) -> Any:
+        """Execute service.method(*args, **kwargs) according to the endpoint's policy"""
+        mode = self.mode_for(endpoint)
+
+        if mode == 'process' and service in WORKER_SERVICES:
+            if self._process_pool is None:
+                self._process_pool = self._create_process_pool()
+            job = AnalysisJob(service, method, args, kwargs, profile=is_sampled())
+            try:
+                result, profile = await asyncio.get_running_loop().run_in_executor(self._process_pool, _run_job, job)
+            except BrokenProcessPool:
+                logger.error(f"Analysis worker pool broke while running {endpoint}; recreating it")
+                self._process_pool = self._create_process_pool()
+                raise
+            if profile:
+                merge_profile(profile)
+            return result
+
+        # Services without a worker spec fall back to the thread pool
+        coroutine_function = getattr(self.services[service], method)
+        if mode == 'inline' or self._thread_pool is None:
+            return await coroutine_function(*args, **kwargs)
+
+        # Carry the request's context (e.g. an active profile) into the worker thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._thread_pool,
+            lambda: context.run(asyncio.run, coroutine_function(*args, **kwargs))
+        )
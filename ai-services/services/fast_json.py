@@ -0,0 +1,85 @@
+import json
+import os
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable
+import logging
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is used without it
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+ENCODERS = ('auto', 'orjson', 'stdlib')
+
+
+def _default(value: Any) -> Any:
+    """Fallback for types neither encoder handles natively, as jsonable_encoder converts them"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    # numpy scalars and arrays
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    # Same options as FastAPI's JSONResponse
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"), default=_default
+    ).encode("utf-8")
+
+
+def _orjson_dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+def resolve_encoder(name: str) -> Callable[[Any], bytes]:
+    """Encoder for a JSON_RESPONSE_ENCODER setting; orjson falls back to stdlib when missing"""
+    name = (name or 'auto').lower()
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown JSON encoder '{name}', expected one of {', '.join(ENCODERS)}")
+    if name == 'stdlib':
+        return _stdlib_dumps
+    if orjson is None:
+        if name == 'orjson':
+            logger.warning("JSON_RESPONSE_ENCODER=orjson but orjson is not installed; using stdlib json")
+        return _stdlib_dumps
+    return _orjson_dumps
+
+
+dumps = resolve_encoder(os.getenv('JSON_RESPONSE_ENCODER', 'auto'))
+
+
+def encoder_name() -> str:
+    return 'orjson' if dumps is _orjson_dumps else 'stdlib'
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured encoder.
+
+    Endpoints that return this directly also skip FastAPI's jsonable_encoder pass,
+    which walks and copies the whole payload before it is encoded; the fallback
+    converter covers the types that pass would otherwise translate.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
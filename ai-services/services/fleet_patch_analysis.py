@@ -0,0 +1,259 @@
+import itertools
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from .patch_catalog import CatalogSnapshot, PatchCatalog
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_LEVELS = ('critical', 'important', 'moderate', 'low')
+
+# Columns of the per-patch weight matrix; the missing matrix times it gives every per-host sum
+_WEIGHTS = (
+    'missing', 'critical', 'important', 'moderate', 'low', 'security', 'base_score',
+    'security_risk', 'stability_risk', 'compliance_risk', 'security_overdue', 'critical_overdue'
+)
+_COLUMN = {name: position for position, name in enumerate(_WEIGHTS)}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(value: str) -> float:
+    released = datetime.fromisoformat(value)
+    if released.tzinfo is not None:
+        released = released.astimezone().replace(tzinfo=None)
+    return (released - _EPOCH).total_seconds()
+
+
+class CatalogColumns:
+    """Column-oriented view of one catalog version: per-patch attributes as arrays"""
+
+    def __init__(self, snapshot: CatalogSnapshot, criticality_scores: Dict[str, int]):
+        patches = snapshot.patches
+        self.version = snapshot.version
+        self.patch_ids = [patch['patch_id'] for patch in patches]
+        self.position = {patch_id: position for position, patch_id in enumerate(self.patch_ids)}
+        if len(self.position) != len(self.patch_ids):
+            raise ValueError("Patch catalog contains duplicate patch_id values")
+
+        self.release_seconds = np.array([_epoch_seconds(patch['release_date']) for patch in patches], dtype=np.float64)
+        severity = [patch.get('severity', 'moderate').lower() for patch in patches]
+        self.severity_level = np.array(
+            [SEVERITY_LEVELS.index(level) if level in SEVERITY_LEVELS[:3] else 3 for level in severity],
+            dtype=np.int8
+        )
+        self.base_score = np.array([criticality_scores.get(level, 4) for level in severity], dtype=np.float64)
+        # Risk scoring looks severities up without lowercasing, as the per-host analysis does
+        self.risk_severity_score = np.array(
+            [criticality_scores.get(patch.get('severity', 'moderate'), 4) for patch in patches], dtype=np.float64
+        )
+        self.stability_relevant = np.array(
+            [patch.get('severity') in ('critical', 'important') for patch in patches], dtype=bool
+        )
+        self.security_category = np.array([patch.get('category') == 'security' for patch in patches], dtype=bool)
+        self.security = self.security_category | np.array([bool(patch.get('cve_list')) for patch in patches], dtype=bool)
+        self.critical = np.array([patch.get('severity') == 'critical' for patch in patches], dtype=bool)
+
+        self.applicable = {
+            system_type: self._mask(type_patches)
+            for system_type, type_patches in snapshot.by_system_type.items()
+        }
+        self.generic = self._mask(snapshot.generic)
+        self.closure = self._closure_matrix(snapshot)
+
+    def _mask(self, patches: Sequence[Dict[str, Any]]) -> np.ndarray:
+        mask = np.zeros(len(self.patch_ids), dtype=bool)
+        mask[self.positions(patch['patch_id'] for patch in patches)] = True
+        return mask
+
+    def positions(self, patch_ids: Iterable[str]) -> np.ndarray:
+        """Catalog positions of patch_ids, -1 for patches not in the catalog"""
+        get = self.position.get
+        return np.array([get(patch_id, -1) for patch_id in patch_ids], dtype=np.int64)
+
+    def mask_key(self, system_type: Optional[str]) -> Optional[str]:
+        """Key of the applicability mask for a system type: the type, '' for generic patches only, None for all"""
+        if not system_type:
+            return None
+        system_type = system_type.lower()
+        return system_type if system_type in self.applicable else ''
+
+    def applicable_mask(self, key: Optional[str]) -> np.ndarray:
+        if key is None:
+            return np.ones(len(self.patch_ids), dtype=bool)
+        return self.applicable.get(key, self.generic)
+
+    def _closure_matrix(self, snapshot: CatalogSnapshot) -> sparse.csr_matrix:
+        """Patch x patch matrix marking each patch and everything it supersedes"""
+        size = len(self.patch_ids)
+        # Mask bits follow catalog order, so a set bit below size is that catalog position
+        closures = [self._mask_positions(snapshot.superseded.get(patch_id, 0)) for patch_id in self.patch_ids]
+        rows = np.repeat(np.arange(size), [len(closure) for closure in closures])
+        cols = np.concatenate(closures) if closures else np.zeros(0, dtype=np.int64)
+        known = cols < size
+        rows = np.concatenate([np.arange(size), rows[known]])
+        cols = np.concatenate([np.arange(size), cols[known]])
+        return sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(size, size))
+
+    @staticmethod
+    def _mask_positions(mask: int) -> np.ndarray:
+        if not mask:
+            return np.zeros(0, dtype=np.int64)
+        packed = np.frombuffer(mask.to_bytes((mask.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(packed, bitorder='little'))
+
+    def present_matrix(self, installed_lists: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+        """Hosts x patches matrix of installed patches and everything they supersede"""
+        rows = np.repeat(np.arange(len(installed_lists)), [len(installed) for installed in installed_lists])
+        cols = self.positions(itertools.chain.from_iterable(installed_lists))
+        known = cols >= 0
+        installed = sparse.csr_matrix(
+            (np.ones(int(known.sum()), dtype=np.float32), (rows[known], cols[known])),
+            shape=(len(installed_lists), len(self.patch_ids))
+        )
+        return installed.dot(self.closure)
+
+    def weights(self, now_seconds: float) -> np.ndarray:
+        """Per-patch weight matrix for the scores of one fleet pass"""
+        days_old = np.floor((now_seconds - self.release_seconds) / 86400.0)
+
+        weights = np.zeros((len(self.patch_ids), len(_WEIGHTS)), dtype=np.float64)
+        weights[:, _COLUMN['missing']] = 1.0
+        for level_code, level in enumerate(SEVERITY_LEVELS):
+            weights[:, _COLUMN[level]] = self.severity_level == level_code
+        weights[:, _COLUMN['security']] = self.security
+        weights[:, _COLUMN['base_score']] = self.base_score
+        weights[:, _COLUMN['security_risk']] = np.where(
+            self.security, self.risk_severity_score * np.minimum(days_old / 30, 3), 0.0
+        )
+        weights[:, _COLUMN['stability_risk']] = np.where(self.stability_relevant, days_old / 7, 0.0)
+        security_overdue = self.security_category & (days_old > 30)
+        weights[:, _COLUMN['compliance_risk']] = security_overdue * 10.0
+        weights[:, _COLUMN['security_overdue']] = security_overdue
+        weights[:, _COLUMN['critical_overdue']] = self.critical & (days_old > 7)
+        return weights
+
+
+class FleetPatchAnalyzer:
+    """Patch analysis for many systems at once over a host x patch missing matrix.
+
+    Hosts are processed in chunks. A host's missing row is its system type's
+    applicability mask minus the sparse row of installed and superseded patches,
+    so every per-host count, score and risk sum is the type's precomputed totals
+    (mask x per-patch weight matrix) minus one sparse matrix product for the whole
+    chunk. The dense boolean missing matrix is only materialized when the patch
+    lists are requested. Scores follow the same formulas as
+    PatchIntelligence.analyze_patch_requirements.
+    """
+
+    def __init__(self, catalog: PatchCatalog, criticality_scores: Dict[str, int],
+                 system_priorities: Dict[str, float], chunk_size: int = 256):
+        self.catalog = catalog
+        self.criticality_scores = criticality_scores
+        self.system_priorities = system_priorities
+        self.chunk_size = chunk_size
+        self._columns: Optional[CatalogColumns] = None
+        self._lock = threading.Lock()
+
+    def columns(self) -> CatalogColumns:
+        """Columnar catalog view, rebuilt when the catalog version changes"""
+        self.catalog.refresh()
+        snapshot = self.catalog.snapshot
+        columns = self._columns
+        if columns is None or columns.version != snapshot.version:
+            with self._lock:
+                columns = self._columns
+                if columns is None or columns.version != snapshot.version:
+                    columns = CatalogColumns(snapshot, self.criticality_scores)
+                    self._columns = columns
+        return columns
+
+    def analyze(self, systems: Sequence[Dict[str, Any]], include_patches: bool = False) -> Iterator[List[Dict[str, Any]]]:
+        """Yield per-host analyses chunk by chunk, in input order"""
+        columns = self.columns()
+        now = datetime.now()
+        weights = columns.weights((now - _EPOCH).total_seconds())
+        analysis_timestamp = now.isoformat()
+        # Per mask key: (patches applicable, weight totals over all of them)
+        type_totals: Dict[Optional[str], Any] = {}
+
+        for start in range(0, len(systems), self.chunk_size):
+            chunk = systems[start:start + self.chunk_size]
+            yield self._analyze_chunk(columns, weights, type_totals, chunk, include_patches, analysis_timestamp)
+
+    def _analyze_chunk(self, columns: CatalogColumns, weights: np.ndarray, type_totals: Dict[Optional[str], Any],
+                       chunk: Sequence[Dict[str, Any]], include_patches: bool,
+                       analysis_timestamp: str) -> List[Dict[str, Any]]:
+        keys = [columns.mask_key(system.get('system_type')) for system in chunk]
+        for key in set(keys) - type_totals.keys():
+            mask = columns.applicable_mask(key)
+            type_totals[key] = (int(mask.sum()), mask.astype(np.float64) @ weights)
+        applicable = np.stack([columns.applicable_mask(key) for key in keys])
+
+        # Installed and superseded patches, restricted to those applicable to the host
+        present = columns.present_matrix([system.get('current_patches') or () for system in chunk])
+        rows, cols = present.nonzero()
+        keep = applicable[rows, cols]
+        rows, cols = rows[keep], cols[keep]
+        present_applicable = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=applicable.shape
+        )
+
+        sums = np.stack([type_totals[key][1] for key in keys]) - present_applicable.dot(weights)
+        available = [type_totals[key][0] for key in keys]
+        if include_patches:
+            missing = applicable.copy()
+            missing[rows, cols] = False
+
+        results = []
+        for row, system in enumerate(chunk):
+            totals = sums[row]
+            multiplier = self.system_priorities.get((system.get('criticality_level') or '').lower(), 1.0)
+            missing_count = int(round(totals[_COLUMN['missing']]))
+
+            normalizer = missing_count * 10
+            if normalizer > 0:
+                security_risk = min(totals[_COLUMN['security_risk']] / normalizer * 100, 100)
+                stability_risk = min(totals[_COLUMN['stability_risk']] / normalizer * 100, 100)
+                compliance_risk = min(totals[_COLUMN['compliance_risk']] / normalizer * 100, 100)
+            else:
+                security_risk = stability_risk = compliance_risk = 0
+            overall_risk = security_risk * 0.5 + stability_risk * 0.3 + compliance_risk * 0.2
+
+            security_overdue = int(round(totals[_COLUMN['security_overdue']]))
+            critical_overdue = int(round(totals[_COLUMN['critical_overdue']]))
+
+            result = {
+                'system_id': system.get('system_id'),
+                'analysis_timestamp': analysis_timestamp,
+                'catalog_version': columns.version,
+                'current_patch_count': len(system.get('current_patches') or ()),
+                'available_patch_count': available[row],
+                'missing_patch_count': missing_count,
+                'severity_counts': {level: int(round(totals[_COLUMN[level]])) for level in SEVERITY_LEVELS},
+                'security_patch_count': int(round(totals[_COLUMN['security']])),
+                'total_score': round(float(totals[_COLUMN['base_score']]) * multiplier, 2),
+                'risk_analysis': {
+                    'security_risk': round(float(security_risk), 1),
+                    'stability_risk': round(float(stability_risk), 1),
+                    'compliance_risk': round(float(compliance_risk), 1),
+                    'overall_risk': round(float(overall_risk), 1),
+                    'risk_level': 'High' if overall_risk > 70 else 'Medium' if overall_risk > 40 else 'Low'
+                },
+                'compliance_status': {
+                    'compliant': security_overdue == 0 and critical_overdue == 0,
+                    'security_patches_overdue': security_overdue,
+                    'critical_patches_overdue': critical_overdue,
+                    'compliance_score': max(0, 100 - (security_overdue * 10 + critical_overdue * 20))
+                }
+            }
+            if include_patches:
+                result['missing_patches'] = [columns.patch_ids[position] for position in np.flatnonzero(missing[row])]
+            results.append(result)
+
+        return results
@@ -1,7 +1,12 @@
 import asyncio
-from typing import Dict, List, Any
+import os
+import uuid
+from typing import Dict, List, Any, Optional
 from datetime import datetime
 import logging
+from .similarity_index import IncidentSimilarityIndex
+from .keyword_matcher import KeywordHits, keyword_matcher
+from .profiling import span
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +25,14 @@ class IncidentAnalyzer:
             'hardware': ['hardware', 'server', 'disk', 'memory', 'cpu', 'storage'],
             'security': ['security', 'breach', 'unauthorized', 'malware', 'virus']
         }
+        keyword_matcher.register('category', self.category_keywords)
+        keyword_matcher.register('severity', self.severity_keywords)
+        
+        self.similar_incident_limit = 5
+        self.min_similarity_score = 0.2
+        self.similarity_index = IncidentSimilarityIndex.open(os.getenv('INCIDENT_INDEX_PATH'))
 
+    @span
     async def analyze_incident(self, title: str, description: str, severity: str, 
                              affected_systems: List[str], symptoms: List[str]) -> Dict[str, Any]:
         """Analyze incident and provide recommendations"""
@@ -38,7 +50,7 @@ class IncidentAnalyzer:
             similar_incidents = await self._find_similar_incidents(title, description)
             
             return {
-                'incident_id': f"INC-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                'incident_id': self._new_incident_id(),
                 'category': category,
                 'predicted_resolution_time': resolution_time,
                 'recommendations': recommendations,
@@ -52,15 +64,96 @@ class IncidentAnalyzer:
             logger.error(f"Error analyzing incident: {str(e)}")
             raise
 
+    @span
+    async def analyze_incidents(self, incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Analyze a batch of incidents in order, reporting failures per item.
+        
+        Similar incidents are looked up for the whole batch with one index query.
+        """
+        results: List[Dict[str, Any]] = [None] * len(incidents)
+        analyses: Dict[int, Dict[str, Any]] = {}
+        texts = [f"{inc.get('title', '')} {inc.get('description', '')}" for inc in incidents]
+        keyword_hits = keyword_matcher.scan_many(texts)
+        
+        for position, incident in enumerate(incidents):
+            try:
+                severity = incident.get('severity', 'medium')
+                affected_systems = incident.get('affected_systems') or []
+                symptoms = incident.get('symptoms') or []
+                
+                category = self._category_from_hits(keyword_hits[position])
+                analyses[position] = {
+                    'incident_id': self._new_incident_id(),
+                    'category': category,
+                    'predicted_resolution_time': await self._predict_resolution_time(severity, category),
+                    'recommendations': await self._generate_recommendations(category, severity, symptoms),
+                    'similar_incidents': [],
+                    'priority_score': await self._calculate_priority_score(severity, affected_systems),
+                    'escalation_required': await self._check_escalation_needed(severity, affected_systems),
+                    'automated_actions': await self._suggest_automated_actions(category, symptoms)
+                }
+            except Exception as e:
+                logger.error(f"Error analyzing incident {position} of batch: {str(e)}")
+                results[position] = self._batch_error(position, e)
+        
+        if analyses:
+            positions = list(analyses)
+            similar = self.similarity_index.query(
+                [texts[position] for position in positions],
+                top_k=self.similar_incident_limit,
+                min_score=self.min_similarity_score
+            )
+            
+            timestamp = datetime.now().isoformat()
+            for position, matches in zip(positions, similar):
+                analysis = analyses[position]
+                analysis['similar_incidents'] = matches
+                analysis['analysis_timestamp'] = timestamp
+                results[position] = {'index': position, 'status': 'ok', 'result': analysis}
+        
+        return results
+
+    @span
+    async def classify_incidents(self, incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Classify a batch of incidents in order, reporting failures per item"""
+        keyword_hits = keyword_matcher.scan_many([
+            f"{inc.get('title', '')} {inc.get('description', '')}" for inc in incidents
+        ])
+        return [
+            {'index': position, 'status': 'ok', 'result': self._classification_from_hits(hits)}
+            for position, hits in enumerate(keyword_hits)
+        ]
+
+    @span
+    async def predict_resolution_times(self, incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Predict resolution times for a batch of incidents in order, reporting failures per item"""
+        results = []
+        for position, incident in enumerate(incidents):
+            try:
+                prediction = await self.predict_resolution_time(incident)
+                results.append({'index': position, 'status': 'ok', 'result': prediction})
+            except Exception as e:
+                logger.error(f"Error predicting resolution for incident {position} of batch: {str(e)}")
+                results.append(self._batch_error(position, e))
+        return results
+
+    @staticmethod
+    def _batch_error(position: int, error: Exception) -> Dict[str, Any]:
+        return {'index': position, 'status': 'error', 'error': str(error)}
+
+    @span
     async def classify_incident(self, incident_data: Dict[str, Any]) -> Dict[str, Any]:
         """Classify incident based on content analysis"""
         text = f"{incident_data.get('title', '')} {incident_data.get('description', '')}"
-        
-        category_scores = {}
-        for category, keywords in self.category_keywords.items():
-            score = sum(1 for keyword in keywords if keyword.lower() in text.lower())
-            if score > 0:
-                category_scores[category] = score / len(keywords)
+        return self._classification_from_hits(keyword_matcher.scan(text))
+
+    def _classification_from_hits(self, keyword_hits: KeywordHits) -> Dict[str, Any]:
+        hits = keyword_hits.counts('category')
+        category_scores = {
+            category: hits[category] / len(keywords)
+            for category, keywords in self.category_keywords.items()
+            if category in hits
+        }
         
         primary_category = max(category_scores, key=category_scores.get) if category_scores else 'general'
         
@@ -70,6 +163,7 @@ class IncidentAnalyzer:
             'confidence': max(category_scores.values()) if category_scores else 0.0
         }
 
+    @span
     async def predict_resolution_time(self, incident_data: Dict[str, Any]) -> Dict[str, Any]:
         """Predict incident resolution time based on historical data"""
         severity = incident_data.get('severity', 'medium').lower()
@@ -109,13 +203,15 @@ class IncidentAnalyzer:
 
     async def _classify_category(self, text: str) -> str:
         """Classify incident category based on text analysis"""
-        text_lower = text.lower()
-        category_scores = {}
-        
-        for category, keywords in self.category_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            if score > 0:
-                category_scores[category] = score
+        return self._category_from_hits(keyword_matcher.scan(text))
+
+    def _category_from_hits(self, keyword_hits: KeywordHits) -> str:
+        hits = keyword_hits.counts('category')
+        category_scores = {
+            category: hits[category]
+            for category in self.category_keywords
+            if category in hits
+        }
         
         return max(category_scores, key=category_scores.get) if category_scores else 'general'
 
@@ -168,18 +264,40 @@ class IncidentAnalyzer:
         
         return recommendations
 
+    @span
     async def _find_similar_incidents(self, title: str, description: str) -> List[Dict[str, Any]]:
         """Find similar historical incidents"""
-        # Mock similar incidents for demonstration
-        return [
+        results = self.similarity_index.query(
+            [f"{title} {description}"],
+            top_k=self.similar_incident_limit,
+            min_score=self.min_similarity_score
+        )
+        return results[0]
+
+    @staticmethod
+    def _new_incident_id() -> str:
+        # The random suffix keeps IDs unique for incidents analyzed in the same second
+        return f"INC-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8].upper()}"
+
+    @span
+    async def add_historical_incidents(self, incidents: List[Dict[str, Any]]) -> int:
+        """Append resolved incidents to the similarity index; returns how many were added.
+
+        Analyzed incidents are not indexed: only incidents recorded with their
+        resolution become history that lookups can return.
+        """
+        texts = [f"{inc.get('title', '')} {inc.get('description', '')}" for inc in incidents]
+        records = [
             {
-                'incident_id': 'INC-20240101001',
-                'title': 'Similar network connectivity issue',
-                'resolution': 'Restarted network services',
-                'resolution_time': 4,
-                'similarity_score': 0.85
+                'incident_id': inc.get('incident_id') or inc.get('id'),
+                'title': inc.get('title', ''),
+                'resolution': inc.get('resolution'),
+                'resolution_time': inc.get('resolution_time')
             }
+            for inc in incidents
         ]
+        self.similarity_index.add(texts, records)
+        return len(records)
 
     async def _calculate_priority_score(self, severity: str, affected_systems: List[str]) -> int:
         """Calculate priority score based on severity and impact"""
@@ -0,0 +1,166 @@
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Severity names are stored as small codes; well-known ones get fixed codes and
+# anything else is assigned the next free code the first time it is seen
+SEVERITY_NAMES: List[str] = ['critical', 'high', 'medium', 'low']
+SEVERITY_CODES: Dict[str, int] = {name: code for code, name in enumerate(SEVERITY_NAMES)}
+_severity_lock = threading.Lock()
+
+
+def severity_code(severity: str) -> int:
+    code = SEVERITY_CODES.get(severity)
+    if code is None:
+        with _severity_lock:
+            code = SEVERITY_CODES.get(severity)
+            if code is None:
+                code = len(SEVERITY_NAMES)
+                SEVERITY_NAMES.append(severity)
+                SEVERITY_CODES[severity] = code
+    return code
+
+
+def _intern_all(values) -> Tuple[str, ...]:
+    return tuple(sys.intern(value) for value in values if isinstance(value, str))
+
+
+class IncidentRecord:
+    """Normalized incident features, parsed once at ingestion.
+
+    created_at is epoch seconds, severity is a code into SEVERITY_NAMES and all
+    strings (tokens, symptoms, system IDs) are interned, so repeated values across
+    incidents share one object.
+    """
+
+    __slots__ = ('incident_id', 'created_at', 'severity_code', 'tokens', 'symptoms', 'affected_systems')
+
+    def __init__(self, incident_id: Optional[str], created_at: float, severity: str,
+                 tokens: frozenset, symptoms: Tuple[str, ...], affected_systems: Tuple[str, ...]):
+        self.incident_id = incident_id
+        self.created_at = created_at
+        self.severity_code = severity_code(severity)
+        self.tokens = tokens
+        self.symptoms = symptoms
+        self.affected_systems = affected_systems
+
+    @property
+    def severity(self) -> str:
+        return SEVERITY_NAMES[self.severity_code]
+
+    def __getstate__(self):
+        # Codes beyond the fixed ones are per-process, so records travel with the name
+        return (self.incident_id, self.created_at, self.severity, self.tokens, self.symptoms, self.affected_systems)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @classmethod
+    def from_incident(cls, incident: Dict[str, Any], now: Optional[float] = None) -> 'IncidentRecord':
+        created_date = incident.get('created_date')
+        created_at = datetime.fromisoformat(created_date).timestamp() if created_date else (now or time.time())
+
+        description = incident.get('description', '')
+        text = f"{incident.get('title', '')} {description}".lower()
+
+        # Same fallbacks as the dict-based analysis: description words stand in for missing symptoms
+        symptoms = incident.get('symptoms', [])
+        symptoms = _intern_all(symptoms if isinstance(symptoms, list) else description.split())
+        affected = incident.get('affected_systems', [])
+
+        incident_id = incident.get('incident_id') or incident.get('id')
+        return cls(
+            str(incident_id) if incident_id is not None else None,
+            created_at,
+            str(incident.get('severity', 'medium')),
+            frozenset(_intern_all(text.split())),
+            symptoms,
+            _intern_all(affected) if isinstance(affected, list) else ()
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Small dict that stands in for the full incident in analysis results"""
+        return {
+            'incident_id': self.incident_id,
+            'created_date': datetime.fromtimestamp(self.created_at).isoformat(),
+            'severity': self.severity
+        }
+
+
+class IncidentStreamParser:
+    """Incremental NDJSON parser that keeps only in-window incidents, as IncidentRecords.
+
+    Bytes are fed as they arrive; only the trailing partial line is buffered, so
+    memory is bounded by the retained features rather than by the payload size.
+    """
+
+    def __init__(self, timeframe_days: int = 30, now: Optional[float] = None, max_line_bytes: int = 1 << 20):
+        self.now = now or time.time()
+        self.cutoff = self.now - timeframe_days * 86400
+        self.max_line_bytes = max_line_bytes
+        self.records: List[IncidentRecord] = []
+        self.received = 0
+        self.outside_timeframe = 0
+        self.invalid = 0
+        self._buffer = b''
+        self._discarding = False
+
+    def feed(self, chunk: bytes):
+        if self._discarding:
+            # Skip the rest of an oversized line
+            newline = chunk.find(b'\n')
+            if newline == -1:
+                return
+            chunk = chunk[newline + 1:]
+            self._discarding = False
+
+        lines = (self._buffer + chunk).split(b'\n')
+        self._buffer = lines.pop()
+        if len(self._buffer) > self.max_line_bytes:
+            logger.warning(f"Dropping NDJSON line longer than {self.max_line_bytes} bytes")
+            self._buffer = b''
+            self._discarding = True
+            self.received += 1
+            self.invalid += 1
+        for line in lines:
+            self._parse_line(line)
+
+    def close(self) -> List[IncidentRecord]:
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = b''
+        return self.records
+
+    def _parse_line(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        self.received += 1
+        try:
+            incident = json.loads(line)
+            if not isinstance(incident, dict):
+                raise ValueError("incident must be a JSON object")
+            record = IncidentRecord.from_incident(incident, self.now)
+        except (ValueError, TypeError) as e:
+            self.invalid += 1
+            logger.debug(f"Skipping invalid incident line: {str(e)}")
+            return
+        if record.created_at > self.cutoff:
+            self.records.append(record)
+        else:
+            self.outside_timeframe += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'received': self.received,
+            'retained': len(self.records),
+            'outside_timeframe': self.outside_timeframe,
+            'invalid': self.invalid
+        }
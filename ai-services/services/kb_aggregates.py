@@ -0,0 +1,219 @@
+import bisect
+import heapq
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (sort value, -insertion order, article_id): higher values first, ties to the older article
+RankKey = Tuple[Any, int, str]
+
+
+class TopK:
+    """The highest-ranked `capacity` items, kept in order as their keys change.
+
+    Every item outside the kept set ranks no higher than the lowest kept item, so
+    a key that rises only has to be compared with that item. When a kept item
+    drops or is removed, an outside item may now outrank it; the set is then
+    marked stale and rebuilt from the owner's data on the next read, in
+    O(N log K). Views and update times only ever rise, so for popularity and
+    recency that rebuild is rare.
+    """
+
+    def __init__(self, capacity: int, source: Callable[[], Iterable[RankKey]]):
+        self.capacity = capacity
+        self._source = source
+        self._ranked: List[RankKey] = []  # ascending; the best item is last
+        self._keys: Dict[str, RankKey] = {}
+        self._total = 0
+        self._stale = False
+        self.rebuilds = 0
+
+    def _truncated(self) -> bool:
+        return self._total > len(self._ranked)
+
+    def _insert(self, key: RankKey):
+        bisect.insort(self._ranked, key)
+        self._keys[key[2]] = key
+        if len(self._ranked) > self.capacity:
+            evicted = self._ranked.pop(0)
+            del self._keys[evicted[2]]
+
+    def _remove(self, key: RankKey):
+        index = bisect.bisect_left(self._ranked, key)
+        del self._ranked[index]
+        del self._keys[key[2]]
+
+    def add(self, key: RankKey):
+        self._total += 1
+        self._offer(key)
+
+    def update(self, key: RankKey):
+        old = self._keys.get(key[2])
+        if old is None:
+            self._offer(key)
+            return
+        if old == key:
+            return
+        self._remove(old)
+        if key < old and self._truncated():
+            self._stale = True
+        self._insert(key)
+
+    def discard(self, item_id: str):
+        self._total -= 1
+        old = self._keys.get(item_id)
+        if old is not None:
+            self._remove(old)
+            if self._truncated():
+                self._stale = True
+
+    def invalidate(self, added: int = 0):
+        """Account for items added without offering them; the set is rebuilt on the next read"""
+        self._total += added
+        self._stale = True
+
+    def _offer(self, key: RankKey):
+        if len(self._ranked) < self.capacity or key > self._ranked[0]:
+            self._insert(key)
+
+    def _rebuild(self):
+        self._ranked = heapq.nlargest(self.capacity, self._source())
+        self._ranked.reverse()
+        self._keys = {key[2]: key for key in self._ranked}
+        self._stale = False
+        self.rebuilds += 1
+
+    def top(self, limit: int) -> Optional[List[str]]:
+        """IDs of the `limit` best items, best first; None when limit exceeds the capacity"""
+        if limit > self.capacity:
+            return None
+        if self._stale:
+            self._rebuild()
+        if limit <= 0:
+            return []
+        return [key[2] for key in reversed(self._ranked[-limit:])]
+
+
+class KnowledgeBaseAggregates:
+    """Running totals and rankings over the knowledge base, updated per article change.
+
+    refresh() is called whenever an article is added or any of its views,
+    rating, category or update time may have changed; it applies the difference
+    from the values seen last time. Reads are O(K) for rankings and O(categories)
+    for the statistics.
+    """
+
+    def __init__(self, articles_by_id: Dict[str, Dict[str, Any]], capacity: int = 100):
+        self._articles_by_id = articles_by_id
+        # article_id -> (insertion order, views, rating, category, updated_at)
+        self._seen: Dict[str, Tuple[int, int, float, str, str]] = {}
+        self._next_order = 0
+        self.total_views = 0
+        self.rating_sum = 0.0
+        self.category_counts: Dict[str, int] = {}
+
+        self.popular = TopK(capacity, lambda: self._keys(1))
+        self.recent = TopK(capacity, lambda: self._keys(4))
+        self.highest_rated = TopK(capacity, lambda: self._keys(2))
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _keys(self, field: int) -> Iterable[RankKey]:
+        for article_id, seen in self._seen.items():
+            yield (seen[field], -seen[0], article_id)
+
+    def refresh(self, article: Dict[str, Any]):
+        article_id = article['id']
+        views = article.get('views', 0)
+        rating = article.get('rating', 0.0)
+        category = article.get('category')
+        updated_at = article.get('updated_at') or ''
+
+        previous = self._seen.get(article_id)
+        if previous is None:
+            order = self._next_order
+            self._next_order += 1
+        else:
+            order, old_views, old_rating, old_category, _ = previous
+            self.total_views -= old_views
+            self.rating_sum -= old_rating
+            self._count_category(old_category, -1)
+
+        self._seen[article_id] = (order, views, rating, category, updated_at)
+        self.total_views += views
+        self.rating_sum += rating
+        self._count_category(category, 1)
+
+        rank = -order
+        if previous is None:
+            self.popular.add((views, rank, article_id))
+            self.recent.add((updated_at, rank, article_id))
+            self.highest_rated.add((rating, rank, article_id))
+        else:
+            self.popular.update((views, rank, article_id))
+            self.recent.update((updated_at, rank, article_id))
+            self.highest_rated.update((rating, rank, article_id))
+
+    def extend(self, articles: Iterable[Dict[str, Any]]):
+        """Track many articles at once, e.g. when loading a stored knowledge base.
+
+        Totals are updated per article; the rankings are rebuilt once, on their
+        next read, instead of taking every article through insertion.
+        """
+        added = 0
+        for article in articles:
+            article_id = article['id']
+            if article_id in self._seen:
+                self.refresh(article)
+                continue
+            views = article.get('views', 0)
+            rating = article.get('rating', 0.0)
+            category = article.get('category')
+            self._seen[article_id] = (self._next_order, views, rating, category, article.get('updated_at') or '')
+            self._next_order += 1
+            self.total_views += views
+            self.rating_sum += rating
+            self._count_category(category, 1)
+            added += 1
+        for ranking in (self.popular, self.recent, self.highest_rated):
+            ranking.invalidate(added)
+
+    def remove(self, article_id: str):
+        previous = self._seen.pop(article_id, None)
+        if previous is None:
+            return
+        _, views, rating, category, _ = previous
+        self.total_views -= views
+        self.rating_sum -= rating
+        self._count_category(category, -1)
+        self.popular.discard(article_id)
+        self.recent.discard(article_id)
+        self.highest_rated.discard(article_id)
+
+    def _count_category(self, category: str, delta: int):
+        count = self.category_counts.get(category, 0) + delta
+        if count:
+            self.category_counts[category] = count
+        else:
+            self.category_counts.pop(category, None)
+
+    def ranked(self, ranking: TopK, field: str, limit: int) -> List[Dict[str, Any]]:
+        """Top articles of a ranking; limits beyond its capacity fall back to a full scan"""
+        article_ids = ranking.top(limit)
+        if article_ids is None:
+            index = {'views': 1, 'rating': 2, 'updated_at': 4}[field]
+            article_ids = [key[2] for key in heapq.nlargest(limit, self._keys(index))]
+        return [self._articles_by_id[article_id] for article_id in article_ids]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tracked_articles': len(self._seen),
+            'topk_capacity': self.popular.capacity,
+            'topk_rebuilds': {
+                'popular': self.popular.rebuilds,
+                'recent': self.recent.rebuilds,
+                'highest_rated': self.highest_rated.rebuilds
+            }
+        }
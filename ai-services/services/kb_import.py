@@ -0,0 +1,237 @@
+"""Bulk import of knowledge base articles from NDJSON, one article object per line.
+
+Articles are parsed as they stream in and cut into chunks; each chunk is
+indexed into an immutable segment on a process pool, so a large import uses
+every core, and the segments are registered with the index in one step at the
+end. Articles without an ID get the next free KB ID; an article whose ID
+already exists replaces it.
+
+From the command line (from ai-services, with the service stopped, since the
+running service owns the index directory):
+
+    python -m services.kb_import --index-path /var/lib/kb articles.jsonl
+    python -m services.kb_import --index-path /var/lib/kb --replace --workers 8 - < articles.jsonl
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+import logging
+
+from .kb_segments import Segment, build_segment, write_segment
+
+logger = logging.getLogger(__name__)
+
+
+class KnowledgeBaseImport:
+    """Incremental NDJSON article import into a KnowledgeBaseService.
+
+    Bytes are fed as they arrive; only the trailing partial line and the chunk
+    being filled are buffered before a worker takes over. Nothing becomes
+    searchable until finish() registers every segment, so a failed import
+    leaves the knowledge base as it was; abort() then removes what was built.
+    """
+
+    def __init__(self, knowledge_base, replace: bool = False, workers: Optional[int] = None,
+                 chunk_size: int = 20000, max_line_bytes: int = 1 << 20, start_method: Optional[str] = None):
+        self.knowledge_base = knowledge_base
+        self.replace = replace
+        self.workers = workers or int(os.getenv('KB_IMPORT_WORKERS', '0')) or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.start_method = start_method or os.getenv('AI_PROCESS_START_METHOD') or 'spawn'
+
+        self.received = 0
+        self.invalid = 0
+        self.articles: List[Dict[str, Any]] = []
+        self._batch: List[Dict[str, Any]] = []
+        self._builds: List[Tuple[str, asyncio.Future]] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._ids: Set[str] = set()
+        self._buffer = b''
+        self._discarding = False
+        self._done = False
+        self._started = time.perf_counter()
+
+    async def feed(self, chunk: bytes):
+        if self._discarding:
+            # Skip the rest of an oversized line
+            newline = chunk.find(b'\n')
+            if newline == -1:
+                return
+            chunk = chunk[newline + 1:]
+            self._discarding = False
+
+        lines = (self._buffer + chunk).split(b'\n')
+        self._buffer = lines.pop()
+        if len(self._buffer) > self.max_line_bytes:
+            logger.warning(f"Dropping NDJSON line longer than {self.max_line_bytes} bytes")
+            self._buffer = b''
+            self._discarding = True
+            self.received += 1
+            self.invalid += 1
+        for line in lines:
+            self._parse_line(line)
+            if len(self._batch) >= self.chunk_size:
+                await self._dispatch()
+
+    def _parse_line(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        self.received += 1
+        try:
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise ValueError("article must be a JSON object")
+            if not data.get('title'):
+                raise ValueError("article has no title")
+        except ValueError as e:
+            self.invalid += 1
+            logger.debug(f"Skipping invalid article line: {str(e)}")
+            return
+
+        article_id = data.get('id')
+        if article_id is None:
+            article_id = self.knowledge_base.next_article_id(self._ids, ignore_existing=self.replace)
+        article = self.knowledge_base.build_article(data, str(article_id), keep_stats=True)
+        self._ids.add(article['id'])
+        self._batch.append(article)
+
+    async def _dispatch(self, last: bool = False):
+        """Hand the current chunk to a worker, waiting first if every worker is busy"""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        self.articles.extend(batch)
+        index = self.knowledge_base.search_index
+
+        running = [future for _, future in self._builds if not future.done()]
+        if len(running) >= self.workers * 2:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+        name = index.reserve_segment_name()
+        loop = asyncio.get_running_loop()
+        # An import that fits in one chunk is built on a thread rather than starting processes
+        if self.workers > 1 and not (last and not self._builds):
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method)
+                )
+            pool = self._pool
+        else:
+            pool = None
+        if index.storage_path:
+            future = loop.run_in_executor(pool, write_segment, name, batch, index.field_weights, index.storage_path)
+        else:
+            future = loop.run_in_executor(pool, build_segment, name, batch, index.field_weights)
+        self._builds.append((name, future))
+
+    async def finish(self) -> Dict[str, Any]:
+        """Build what is left, wait for every segment and make them searchable"""
+        try:
+            if self._buffer:
+                self._parse_line(self._buffer)
+                self._buffer = b''
+            await self._dispatch(last=True)
+
+            results = await asyncio.gather(*(future for _, future in self._builds))
+            segments = [Segment.load(result) if isinstance(result, str) else result for result in results]
+            replaced = await self.knowledge_base.apply_import(segments, self.articles, self.replace)
+        except Exception:
+            await self.abort()
+            raise
+        finally:
+            self._shutdown_pool()
+        self._done = True
+
+        elapsed = time.perf_counter() - self._started
+        logger.info(f"Imported {len(self.articles)} knowledge base articles in {len(segments)} segments ({elapsed:.1f}s)")
+        return {
+            'received': self.received,
+            'imported': len(self.articles),
+            'invalid': self.invalid,
+            'replaced': replaced,
+            'mode': 'replace' if self.replace else 'append',
+            'segments': len(segments),
+            'workers': self.workers if len(segments) > 1 else 1,
+            'seconds': round(elapsed, 3)
+        }
+
+    async def abort(self):
+        """Give up on an unfinished import: stop the workers, delete the built segments and free their names.
+
+        Does nothing once finish() has succeeded, so callers can run it unconditionally.
+        """
+        if self._done:
+            return
+        self._done = True
+        self._shutdown_pool()
+        index = self.knowledge_base.search_index
+        # A build already running cannot be interrupted; wait for it so nothing is written after the cleanup
+        await asyncio.gather(*(future for _, future in self._builds), return_exceptions=True)
+        registered = {segment.name for segment in index.segments}
+        for name, _ in self._builds:
+            if name in registered:
+                continue
+            if index.storage_path:
+                directory = os.path.join(index.storage_path, name)
+                shutil.rmtree(f"{directory}.tmp", ignore_errors=True)
+                shutil.rmtree(directory, ignore_errors=True)
+            index.release_segment_name(name)
+        self._builds = []
+
+    def _shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+async def _import_file(path: str, index_path: str, replace: bool, workers: Optional[int], chunk_size: int) -> Dict[str, Any]:
+    # Imported here so worker processes spawned for the segment builds stay light
+    from .knowledge_base import KnowledgeBaseService
+
+    knowledge_base = KnowledgeBaseService(index_path=index_path)
+    importer = KnowledgeBaseImport(knowledge_base, replace=replace, workers=workers, chunk_size=chunk_size)
+    source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    try:
+        while True:
+            chunk = source.read(1 << 20)
+            if not chunk:
+                break
+            await importer.feed(chunk)
+        stats = await importer.finish()
+    finally:
+        await importer.abort()
+        if source is not sys.stdin.buffer:
+            source.close()
+        knowledge_base.search_index.close()
+    stats['total_articles'] = len(knowledge_base.articles_by_id)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="NDJSON file of articles, or - for stdin")
+    parser.add_argument('--index-path', default=os.getenv('KB_INDEX_PATH'),
+                        help='knowledge base index directory (default KB_INDEX_PATH)')
+    parser.add_argument('--replace', action='store_true', help='drop the existing articles first')
+    parser.add_argument('--workers', type=int, default=None, help='segment build processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='articles per segment')
+    args = parser.parse_args()
+    if not args.index_path:
+        parser.error('--index-path or KB_INDEX_PATH is required')
+
+    logging.basicConfig(level=logging.INFO)
+    stats = asyncio.run(_import_file(args.path, args.index_path, args.replace, args.workers, args.chunk_size))
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,872 @@
+import asyncio
+import bisect
+import json
+import os
+import re
+import shutil
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+import logging
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; stored articles are parsed with the stdlib without it
+    orjson = None
+
+from .search_index import InvertedIndex, TermIndex, TermLookup, bm25_idf, max_edits, tokenize, weighted_terms
+
+logger = logging.getLogger(__name__)
+
+_ARRAYS = ('term_data', 'term_offsets', 'offsets', 'docs', 'freqs', 'doc_lengths', 'categories')
+_SEGMENT_NAME = re.compile(r"^seg-\d+$")
+_WAL_NAME = re.compile(r"^wal-(\d+)\.jsonl$")
+
+# Where an article's searchable copy lives: (segment, position) or (None, -1) for the memtable
+Location = Tuple[Optional['Segment'], int]
+
+
+class TermTable:
+    """Sorted terms stored as one UTF-8 byte array plus each term's start offset.
+
+    Its size follows the total length of the terms, where a fixed-width string
+    array would pad every term to the longest one. Indexing returns a str, so
+    the bisect module searches it; UTF-8 byte order is code point order.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        # Plain buffers: indexing them is much cheaper than indexing the numpy arrays
+        self._view = memoryview(data)
+        self._starts = memoryview(offsets)
+
+    @staticmethod
+    def arrays(terms: List[str]) -> Dict[str, np.ndarray]:
+        """The term_data and term_offsets arrays of an already sorted term list"""
+        encoded = [term.encode() for term in terms]
+        lengths = np.fromiter((len(term) for term in encoded), dtype=np.int64, count=len(encoded))
+        return {
+            'term_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'term_offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        }
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self._view[self._starts[index]:self._starts[index + 1]]).decode()
+
+    def find(self, term: str) -> int:
+        """Position of term, or -1"""
+        index = bisect.bisect_left(self, term)
+        return index if index < len(self) and self[index] == term else -1
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect.bisect_left(self, prefix)
+        # Every string starting with prefix sorts before prefix + the highest character
+        return start, bisect.bisect_left(self, prefix + '\uffff', start)
+
+    def tolist(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """Terms start to end, decoded in one pass"""
+        end = len(self) if end is None else end
+        if start >= end:
+            return []
+        bounds = (self.offsets[start:end + 1] - self.offsets[start]).tolist()
+        data = bytes(self._view[self.offsets[start]:self.offsets[end]])
+        return [data[bounds[i]:bounds[i + 1]].decode() for i in range(end - start)]
+
+
+class Segment:
+    """Immutable postings for one batch of articles, with an in-memory live mask.
+
+    Terms are sorted, and the postings of terms[i] are docs[offsets[i]:offsets[i + 1]]
+    (positions within the segment) with their weighted frequencies. Loaded
+    segments memory-map every array, so opening one costs no indexing work;
+    deleting or replacing an article only clears its live bit.
+    """
+
+    def __init__(self, name: str, arrays: Dict[str, np.ndarray], article_ids: List[str],
+                 category_names: List[str], directory: Optional[str] = None,
+                 lines: Optional[List[str]] = None):
+        self.name = name
+        self.directory = directory
+        self.terms = TermTable(arrays['term_data'], arrays['term_offsets'])
+        self.offsets = arrays['offsets']
+        self.docs = arrays['docs']
+        self.freqs = arrays['freqs']
+        self.doc_lengths = arrays['doc_lengths']
+        # Index into category_names, -1 when the article has none
+        self.categories = arrays['categories']
+        self.article_ids = article_ids
+        self.category_names = category_names
+        self._category_codes = {category: code for code, category in enumerate(category_names)}
+        # Serialized articles of segments that only live in memory
+        self._lines = lines
+
+        self.live = np.ones(len(article_ids), dtype=bool)
+        self.live_count = len(article_ids)
+        self.live_length = float(self.doc_lengths.sum())
+
+    @property
+    def size(self) -> int:
+        return len(self.article_ids)
+
+    def kill(self, position: int):
+        if self.live[position]:
+            self.live[position] = False
+            self.live_count -= 1
+            self.live_length -= float(self.doc_lengths[position])
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        index = self.terms.find(term)
+        if index < 0:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.docs[start:end], self.freqs[start:end]
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        return self.terms.prefix_range(prefix)
+
+    def category_code(self, category: str) -> Optional[int]:
+        return self._category_codes.get(category)
+
+    def article_lines(self):
+        """The stored articles as JSON lines, in position order"""
+        if self._lines is not None:
+            yield from self._lines
+            return
+        with open(os.path.join(self.directory, 'articles.jsonl')) as handle:
+            for line in handle:
+                yield line.rstrip('\n')
+
+    def read_articles(self) -> List[Dict[str, Any]]:
+        loads = orjson.loads if orjson is not None else json.loads
+        return [loads(line) for line in self.article_lines()]
+
+    def write(self, directory: str):
+        """Persist the segment; the directory appears complete or not at all"""
+        tmp_path = f"{directory}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        arrays = {'term_data': self.terms.data, 'term_offsets': self.terms.offsets}
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), arrays[name] if name in arrays else getattr(self, name))
+        with open(os.path.join(tmp_path, 'articles.jsonl'), 'w') as handle:
+            for line in self.article_lines():
+                handle.write(line + '\n')
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as handle:
+            json.dump({'article_ids': self.article_ids, 'categories': self.category_names}, handle)
+
+        os.replace(tmp_path, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'Segment':
+        """Open a persisted segment, memory-mapping its arrays by default"""
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in _ARRAYS}
+        with open(os.path.join(directory, 'meta.json')) as handle:
+            meta = json.load(handle)
+        return cls(os.path.basename(directory), arrays, meta['article_ids'], meta['categories'], directory=directory)
+
+
+def build_segment(name: str, articles: List[Dict[str, Any]], field_weights: Dict[str, float]) -> Segment:
+    """Tokenize and index a batch of articles into an in-memory segment"""
+    term_docs: Dict[str, List[int]] = defaultdict(list)
+    term_freqs: Dict[str, List[float]] = defaultdict(list)
+    doc_lengths = np.zeros(len(articles), dtype=np.float64)
+    categories = np.full(len(articles), -1, dtype=np.int16)
+    category_codes: Dict[str, int] = {}
+
+    for position, article in enumerate(articles):
+        frequencies = weighted_terms(article, field_weights)
+        for term, freq in frequencies.items():
+            term_docs[term].append(position)
+            term_freqs[term].append(freq)
+        doc_lengths[position] = sum(frequencies.values())
+        category = article.get('category')
+        if category:
+            categories[position] = category_codes.setdefault(category.lower(), len(category_codes))
+
+    vocabulary = sorted(term_docs)
+    counts = np.fromiter((len(term_docs[term]) for term in vocabulary), dtype=np.int64, count=len(vocabulary))
+    arrays = {
+        **TermTable.arrays(vocabulary),
+        'offsets': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        'docs': np.fromiter((doc for term in vocabulary for doc in term_docs[term]), dtype=np.int32),
+        'freqs': np.fromiter((freq for term in vocabulary for freq in term_freqs[term]), dtype=np.float32),
+        'doc_lengths': doc_lengths,
+        'categories': categories
+    }
+    lines = [json.dumps(article, default=str) for article in articles]
+    return Segment(name, arrays, [article['id'] for article in articles], list(category_codes), lines=lines)
+
+
+def write_segment(name: str, articles: List[Dict[str, Any]], field_weights: Dict[str, float], root: str) -> str:
+    """Build a segment and write it under root; returns its directory. Runs in worker processes."""
+    directory = os.path.join(root, name)
+    build_segment(name, articles, field_weights).write(directory)
+    return directory
+
+
+def merge_segments(name: str, parts: List[Tuple[Segment, np.ndarray]],
+                   root: Optional[str] = None) -> Tuple[Segment, np.ndarray, np.ndarray]:
+    """Merge the live articles of several segments into one, without re-tokenizing.
+
+    parts pairs each segment with the live mask to honour. Returns the new
+    segment and, for each of its positions, the source part and position.
+    """
+    part_terms = [segment.terms.tolist() for segment, _ in parts]
+    vocabulary = sorted(set().union(*part_terms))
+    vocabulary_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+    category_names = sorted({category for segment, _ in parts for category in segment.category_names})
+    category_codes = {category: code for code, category in enumerate(category_names)}
+
+    term_ids, docs, freqs, doc_lengths, categories = [], [], [], [], []
+    source_part, source_position, article_ids, lines = [], [], [], []
+    base = 0
+    for part, (segment, live) in enumerate(parts):
+        positions = np.flatnonzero(live)
+        renumber = np.full(segment.size, -1, dtype=np.int64)
+        renumber[positions] = base + np.arange(len(positions))
+
+        terms = part_terms[part]
+        term_of_posting = np.repeat(
+            np.fromiter((vocabulary_ids[term] for term in terms), dtype=np.int64, count=len(terms)),
+            np.diff(segment.offsets)
+        )
+        keep = live[segment.docs]
+        term_ids.append(term_of_posting[keep])
+        docs.append(renumber[segment.docs[keep]])
+        freqs.append(np.asarray(segment.freqs)[keep])
+
+        doc_lengths.append(np.asarray(segment.doc_lengths)[positions])
+        # The appended -1 maps "no category" (-1) to itself
+        recode = np.array([category_codes[category] for category in segment.category_names] + [-1], dtype=np.int16)
+        categories.append(recode[np.asarray(segment.categories)[positions]])
+
+        source_part.append(np.full(len(positions), part, dtype=np.int32))
+        source_position.append(positions)
+        article_ids.extend(segment.article_ids[position] for position in positions.tolist())
+        lines.extend(line for position, line in enumerate(segment.article_lines()) if live[position])
+        base += len(positions)
+
+    term_ids = np.concatenate(term_ids)
+    docs = np.concatenate(docs)
+    order = np.lexsort((docs, term_ids))
+    term_ids, docs, freqs = term_ids[order], docs[order], np.concatenate(freqs)[order]
+
+    # Terms that only occurred in dropped articles disappear
+    counts = np.bincount(term_ids, minlength=len(vocabulary))
+    present = counts > 0
+    arrays = {
+        **TermTable.arrays([term for term, kept in zip(vocabulary, present.tolist()) if kept]),
+        'offsets': np.concatenate([[0], np.cumsum(counts[present])]).astype(np.int64),
+        'docs': docs.astype(np.int32),
+        'freqs': freqs.astype(np.float32),
+        'doc_lengths': np.concatenate(doc_lengths),
+        'categories': np.concatenate(categories)
+    }
+    segment = Segment(name, arrays, article_ids, category_names, lines=lines)
+    if root:
+        directory = os.path.join(root, name)
+        segment.write(directory)
+        segment = Segment.load(directory)
+    return segment, np.concatenate(source_part), np.concatenate(source_position)
+
+
+class SegmentedIndex(TermLookup):
+    """Knowledge base search index made of immutable segments plus a small mutable memtable.
+
+    Bulk imports and background flushes produce segments; articles added or
+    changed since go to the memtable, an InvertedIndex, and (with a storage
+    path) to an append-only log. When the memtable and the articles whose
+    stored copy changed outgrow memtable_limit, they are written out as a new
+    segment in the background, and segments are merged once there are more
+    than max_segments or one is mostly deleted. Searches score every part with
+    collection-wide BM25 statistics, so results match a single InvertedIndex.
+
+    On disk a manifest lists the segments and their deletions; log files from
+    wal_start on are replayed over them at startup.
+    """
+
+    def __init__(self, field_weights: Dict[str, float], storage_path: Optional[str] = None,
+                 memtable_limit: int = 1000, max_segments: int = 8, k1: float = 1.2, b: float = 0.75):
+        self.field_weights = field_weights
+        self.storage_path = storage_path
+        self.memtable_limit = memtable_limit
+        self.max_segments = max_segments
+        self.k1 = k1
+        self.b = b
+
+        self.memtable = InvertedIndex(field_weights, k1, b)
+        self.segments: List[Segment] = []
+        self.locations: Dict[str, Location] = {}
+        # Vocabulary of the segments, for spelling correction; the memtable keeps its own.
+        # It is extended on a background thread as segments arrive and swapped in when ready
+        self._terms = TermIndex()
+        self._vocabulary_builder: Optional[ThreadPoolExecutor] = None
+        self._vocabulary_update: Optional[Future] = None
+
+        # Articles whose latest version is not in a segment yet: the memtable's and the dirty ones
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        # Articles still searchable from a segment whose stored copy is out of date (views, rating)
+        self._dirty: Set[str] = set()
+        # Bumped on every change, so a flush can tell which snapshotted articles changed meanwhile
+        self._versions: Dict[str, int] = {}
+        self._clock = 0
+
+        self._next_segment = 1
+        self._generation = 0
+        self._wal_number = 1
+        self._wal = None
+        self._lock = asyncio.Lock()
+        self._maintenance: Optional[asyncio.Task] = None
+        # Names handed out to imports whose segments are still being built
+        self._reserved: Set[str] = set()
+        self.flushes = 0
+        self.merges = 0
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.locations
+
+    # Loading and persistence
+
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        """Open the persisted segments and replay the log; None when nothing was persisted"""
+        if not self.storage_path:
+            return None
+        os.makedirs(self.storage_path, exist_ok=True)
+
+        manifest_path = os.path.join(self.storage_path, 'manifest.json')
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as handle:
+                manifest = json.load(handle)
+        wal_start = manifest.get('wal_start', 1)
+        wal_numbers = sorted(number for number in self._wal_numbers() if number >= wal_start)
+        if not manifest and not wal_numbers:
+            return None
+
+        restored: Dict[str, Dict[str, Any]] = {}
+        for entry in manifest.get('segments', []):
+            segment = Segment.load(os.path.join(self.storage_path, entry['name']))
+            if entry.get('deleted'):
+                for position in np.load(os.path.join(self.storage_path, entry['deleted'])).tolist():
+                    segment.kill(position)
+            for position, article in enumerate(segment.read_articles()):
+                if segment.live[position]:
+                    self.locations[article['id']] = (segment, position)
+                    restored[article['id']] = article
+            self.segments.append(segment)
+        if self.segments:
+            self._index_terms(self.segments)
+        self._next_segment = manifest.get('next_segment', 1)
+        self._generation = manifest.get('generation', 0)
+
+        replayed = 0
+        for number in wal_numbers:
+            with open(self._wal_path(number)) as handle:
+                for line in handle:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash; everything before it is intact
+                        logger.warning(f"Skipping truncated knowledge base log entry in wal-{number}")
+                        continue
+                    if entry['op'] == 'put':
+                        article = entry['article']
+                        self._put(article['id'], article, article.get('category'))
+                        restored[article['id']] = article
+                    elif entry['op'] == 'delete':
+                        self._delete(entry['id'])
+                        restored.pop(entry['id'], None)
+                    replayed += 1
+        self._wal_number = max(wal_numbers[-1] if wal_numbers else wal_start, wal_start)
+
+        self._collect_garbage(manifest)
+        logger.info(
+            f"Opened knowledge base index with {len(self.segments)} segments and "
+            f"{len(self.locations)} articles from {self.storage_path} ({replayed} log entries replayed)"
+        )
+        return list(restored.values())
+
+    def close(self):
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+        if self._vocabulary_builder is not None:
+            self._vocabulary_builder.shutdown(wait=False, cancel_futures=True)
+            self._vocabulary_builder = None
+
+    def _wal_path(self, number: int) -> str:
+        return os.path.join(self.storage_path, f"wal-{number:06d}.jsonl")
+
+    def _wal_numbers(self) -> List[int]:
+        numbers = []
+        for entry in os.listdir(self.storage_path):
+            match = _WAL_NAME.match(entry)
+            if match:
+                numbers.append(int(match.group(1)))
+        return numbers
+
+    def _log(self, entry: Dict[str, Any]):
+        if not self.storage_path:
+            return
+        if self._wal is None:
+            self._wal = open(self._wal_path(self._wal_number), 'a')
+        self._wal.write(json.dumps(entry, default=str) + '\n')
+        self._wal.flush()
+
+    def _rotate_log(self) -> int:
+        """Send further changes to a new log file; returns its number"""
+        self.close()
+        self._wal_number += 1
+        return self._wal_number
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    def reserve_segment_name(self) -> str:
+        """Name for a segment an import builds outside the index; kept from cleanup until registered"""
+        name = self._new_segment_name()
+        self._reserved.add(name)
+        return name
+
+    def release_segment_name(self, name: str):
+        self._reserved.discard(name)
+
+    def _commit(self, wal_start: Optional[int] = None):
+        """Atomically record the current segments and deletions"""
+        if not self.storage_path:
+            return
+        self._generation += 1
+        entries = []
+        for segment in self.segments:
+            deleted = None
+            if segment.live_count < segment.size:
+                deleted = f"{segment.name}.del-{self._generation:06d}.npy"
+                np.save(os.path.join(self.storage_path, deleted), np.flatnonzero(~segment.live).astype(np.int32))
+            entries.append({'name': segment.name, 'deleted': deleted})
+
+        manifest = {
+            'generation': self._generation,
+            'next_segment': self._next_segment,
+            'wal_start': wal_start if wal_start is not None else self._manifest_wal_start(),
+            'segments': entries
+        }
+        manifest_path = os.path.join(self.storage_path, 'manifest.json')
+        with open(f"{manifest_path}.tmp", 'w') as handle:
+            json.dump(manifest, handle)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        self._collect_garbage(manifest)
+
+    def _manifest_wal_start(self) -> int:
+        manifest_path = os.path.join(self.storage_path, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as handle:
+                return json.load(handle).get('wal_start', 1)
+        return 1
+
+    def _collect_garbage(self, manifest: Dict[str, Any]):
+        """Remove segments, deletion files and logs the manifest no longer refers to"""
+        keep = {entry['name'] for entry in manifest.get('segments', [])}
+        keep |= {entry['deleted'] for entry in manifest.get('segments', []) if entry.get('deleted')}
+        wal_start = manifest.get('wal_start', 1)
+        for entry in os.listdir(self.storage_path):
+            path = os.path.join(self.storage_path, entry)
+            wal = _WAL_NAME.match(entry)
+            if wal:
+                if int(wal.group(1)) < wal_start:
+                    os.remove(path)
+            elif entry.endswith('.tmp') and entry.startswith('seg-'):
+                # Left by a segment build that did not finish; may be a build in progress
+                continue
+            elif _SEGMENT_NAME.match(entry) and entry not in keep:
+                if entry not in self._reserved:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif entry.startswith('seg-') and entry.endswith('.npy') and entry not in keep:
+                os.remove(path)
+
+    # Changes
+
+    def _bump(self, doc_id: str):
+        self._clock += 1
+        self._versions[doc_id] = self._clock
+
+    def _kill(self, doc_id: str):
+        """Remove the current searchable copy of an article, wherever it lives"""
+        location = self.locations.pop(doc_id, None)
+        if location is None:
+            return
+        segment, position = location
+        if segment is None:
+            self.memtable.remove(doc_id)
+        else:
+            segment.kill(position)
+
+    def _put(self, doc_id: str, fields: Dict[str, Any], category: Optional[str]):
+        self._kill(doc_id)
+        self.memtable.add(doc_id, fields, category)
+        self.locations[doc_id] = (None, -1)
+        self._payloads[doc_id] = fields
+        self._dirty.discard(doc_id)
+        self._bump(doc_id)
+
+    def _delete(self, doc_id: str) -> bool:
+        if doc_id not in self.locations:
+            return False
+        self._kill(doc_id)
+        self._payloads.pop(doc_id, None)
+        self._dirty.discard(doc_id)
+        self._bump(doc_id)
+        return True
+
+    def add(self, doc_id: str, fields: Dict[str, Any], category: Optional[str] = None):
+        """Index an article in the memtable, replacing any previous version with the same ID"""
+        self._put(doc_id, fields, category)
+        self._log({'op': 'put', 'article': fields})
+        self._schedule_maintenance()
+
+    def touch(self, doc_id: str, fields: Dict[str, Any]):
+        """Record a change to an article's stored fields that does not affect search"""
+        location = self.locations.get(doc_id)
+        if location is None:
+            return
+        self._bump(doc_id)
+        self._payloads[doc_id] = fields
+        if location[0] is not None:
+            self._dirty.add(doc_id)
+        self._log({'op': 'put', 'article': fields})
+        self._schedule_maintenance()
+
+    def remove(self, doc_id: str) -> bool:
+        """Remove an article from the index"""
+        if not self._delete(doc_id):
+            return False
+        self._log({'op': 'delete', 'id': doc_id})
+        return True
+
+    # Search
+
+    @property
+    def terms(self) -> TermIndex:
+        """Segment vocabulary as of the last background update; lookups never build it"""
+        return self._terms
+
+    def _index_terms(self, segments: List[Segment], reset: bool = False):
+        """Queue the segments' terms for the vocabulary; with reset, the old vocabulary is dropped"""
+        if self._vocabulary_builder is None:
+            self._vocabulary_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='kb-vocabulary')
+        self._vocabulary_update = self._vocabulary_builder.submit(self._extend_terms, segments, reset)
+
+    def _extend_terms(self, segments: List[Segment], reset: bool):
+        try:
+            base = TermIndex() if reset else self._terms
+            terms = [term for segment in segments for term in segment.terms.tolist()]
+            self._terms = base.extended(terms)
+        except Exception as e:
+            logger.error(f"Error indexing knowledge base vocabulary: {str(e)}")
+            raise
+
+    def wait_for_vocabulary(self, timeout: Optional[float] = None):
+        """Block until every queued vocabulary update has been swapped in"""
+        if self._vocabulary_update is not None:
+            self._vocabulary_update.result(timeout)
+
+    def document_frequency(self, term: str) -> int:
+        frequency = self.memtable.document_frequency(term)
+        for segment in self.segments:
+            postings = segment.postings(term)
+            if postings is not None:
+                docs = postings[0]
+                frequency += len(docs) if segment.live_count == segment.size else int(np.count_nonzero(segment.live[docs]))
+        return frequency
+
+    def _spellings(self, term: str) -> List[Tuple[str, int]]:
+        # Both vocabularies; the memtable's is small
+        vocabularies = (self.terms, self.memtable.terms)
+        matches = _closest(vocabulary.similar(term, max_edits(term)) for vocabulary in vocabularies)
+        if not matches and len(term) >= 4:
+            matches = _closest(vocabulary.similar_prefixes(term, 1) for vocabulary in vocabularies)
+        return matches
+
+    def completions(self, prefix: str, limit: int = 10, scan_limit: int = 5000) -> List[Tuple[str, int]]:
+        """Terms starting with prefix by document count; counts include deleted articles not yet merged away"""
+        counts: Counter = Counter()
+        for term in self.memtable.terms.with_prefix(prefix, scan_limit):
+            counts[term] += self.memtable.document_frequency(term)
+        for segment in self.segments:
+            start, end = segment.prefix_range(prefix)
+            end = min(end, start + scan_limit)
+            if start < end:
+                frequencies = np.diff(segment.offsets[start:end + 1]).tolist()
+                for term, frequency in zip(segment.terms.tolist(start, end), frequencies):
+                    counts[term] += frequency
+        return counts.most_common(limit)
+
+    def search(self, query: str, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Return (doc_id, bm25_score) for every document matching at least one query term"""
+        return self.search_terms({term: 1.0 for term in tokenize(query)}, category)
+
+    def search_terms(self, weights: Dict[str, float], category: Optional[str] = None,
+                     candidate_limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        return self.search_top(weights, category, None, candidate_limit)[1]
+
+    def search_top(self, weights: Dict[str, float], category: Optional[str] = None, limit: Optional[int] = 10,
+                   candidate_limit: Optional[int] = None) -> Tuple[int, List[Tuple[str, float]]]:
+        """Number of matches, and every match that can rank in the top `limit` (ties included).
+
+        Segments are scored with numpy over their memory-mapped postings and
+        contribute only their best `limit` matches; candidate_limit bounds the
+        memtable's share as in InvertedIndex.search_terms.
+        """
+        doc_count = len(self.locations)
+        if not weights or doc_count == 0:
+            return 0, []
+
+        segment_postings = []
+        frequencies = {term: self.memtable.document_frequency(term) for term in weights}
+        for segment in self.segments:
+            if segment.live_count == 0:
+                continue
+            found = {}
+            for term in weights:
+                postings = segment.postings(term)
+                if postings is None:
+                    continue
+                docs, freqs = postings
+                if segment.live_count < segment.size:
+                    live = segment.live[docs]
+                    frequencies[term] += int(np.count_nonzero(live))
+                else:
+                    frequencies[term] += len(docs)
+                found[term] = postings
+            if found:
+                segment_postings.append((segment, found))
+
+        idfs = {
+            term: weights[term] * bm25_idf(doc_count, frequency)
+            for term, frequency in frequencies.items()
+            if frequency > 0
+        }
+        if not idfs:
+            return 0, []
+        total_length = self.memtable.total_length + sum(segment.live_length for segment in self.segments)
+        avg_length = total_length / doc_count if total_length > 0 else 1.0
+
+        matches = self.memtable.score(idfs, category, avg_length, candidate_limit)
+        total = len(matches)
+        category_key = category.lower() if category else None
+
+        for segment, found in segment_postings:
+            code = None
+            if category_key:
+                code = segment.category_code(category_key)
+                if code is None:
+                    continue
+
+            scores = np.zeros(segment.size, dtype=np.float64)
+            for term, (docs, freqs) in found.items():
+                if term not in idfs:
+                    continue
+                freqs = freqs.astype(np.float64)
+                norm = self.k1 * (1 - self.b + self.b * segment.doc_lengths[docs] / avg_length)
+                scores[docs] += idfs[term] * freqs * (self.k1 + 1) / (freqs + norm)
+
+            hits = scores > 0
+            if segment.live_count < segment.size:
+                hits &= segment.live
+            if code is not None:
+                hits &= segment.categories == code
+            positions = np.flatnonzero(hits)
+            total += len(positions)
+
+            if limit is not None and len(positions) > limit:
+                cutoff = np.partition(scores[positions], len(positions) - limit)[len(positions) - limit]
+                positions = positions[scores[positions] >= cutoff]
+            article_ids = segment.article_ids
+            matches.extend(zip(
+                [article_ids[position] for position in positions.tolist()],
+                scores[positions].tolist()
+            ))
+
+        return total, matches
+
+    # Background maintenance
+
+    def _needs_maintenance(self) -> bool:
+        return (
+            len(self.memtable) + len(self._dirty) >= self.memtable_limit
+            or len(self.segments) > self.max_segments
+        )
+
+    def _schedule_maintenance(self):
+        if not self._needs_maintenance():
+            return
+        if self._maintenance is not None and not self._maintenance.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._maintenance = loop.create_task(self.maintain())
+
+    async def maintain(self):
+        """Flush the memtable to a segment and merge segments as needed"""
+        try:
+            if len(self.memtable) + len(self._dirty) >= self.memtable_limit:
+                await self.flush()
+            await self.compact()
+        except Exception as e:
+            logger.error(f"Error maintaining knowledge base index: {str(e)}")
+
+    async def flush(self):
+        """Write the memtable and the dirty articles out as a new segment"""
+        async with self._lock:
+            doc_ids = list(self.memtable.doc_lengths) + [doc_id for doc_id in self._dirty if doc_id not in self.memtable]
+            if not doc_ids:
+                return
+            snapshot = [(doc_id, self._versions[doc_id], dict(self._payloads[doc_id])) for doc_id in doc_ids]
+            # Changes from here on go to the new log, which the committed manifest will start from
+            wal_start = self._rotate_log()
+            dirty, self._dirty = self._dirty, set()
+
+            name = self._new_segment_name()
+            articles = [article for _, _, article in snapshot]
+            try:
+                segment = await self._build(name, articles)
+            except Exception:
+                self._dirty |= {doc_id for doc_id in dirty if doc_id in self.locations}
+                raise
+
+            for position, (doc_id, version, _) in enumerate(snapshot):
+                if self._versions.get(doc_id) == version and doc_id in self.locations:
+                    self._kill(doc_id)
+                    self.locations[doc_id] = (segment, position)
+                    self._payloads.pop(doc_id, None)
+                else:
+                    # Changed or deleted while the segment was built; the newer state stays put
+                    segment.kill(position)
+            self.segments.append(segment)
+            self._index_terms([segment])
+            self._commit(wal_start)
+            self.flushes += 1
+            logger.info(f"Flushed {len(snapshot)} knowledge base articles to segment {name}")
+
+    async def _build(self, name: str, articles: List[Dict[str, Any]]) -> Segment:
+        if self.storage_path:
+            directory = await asyncio.to_thread(write_segment, name, articles, self.field_weights, self.storage_path)
+            return Segment.load(directory)
+        return await asyncio.to_thread(build_segment, name, articles, self.field_weights)
+
+    async def compact(self):
+        """Merge the smallest segments while there are too many, and rewrite mostly deleted ones"""
+        async with self._lock:
+            by_size = sorted(self.segments, key=lambda segment: segment.live_count)
+            selected = set()
+            if len(by_size) > self.max_segments:
+                selected.update(id(segment) for segment in by_size[:len(by_size) - self.max_segments + 1])
+            selected.update(
+                id(segment) for segment in self.segments
+                if segment.size and segment.live_count < segment.size / 2
+            )
+            chosen = [segment for segment in self.segments if id(segment) in selected]
+            if not chosen:
+                return
+
+            parts = [(segment, segment.live.copy()) for segment in chosen]
+            name = self._new_segment_name()
+            merged, source_part, source_position = await asyncio.to_thread(
+                merge_segments, name, parts, self.storage_path
+            )
+
+            for position, (part, old_position) in enumerate(zip(source_part.tolist(), source_position.tolist())):
+                old_segment = chosen[part]
+                if old_segment.live[old_position]:
+                    self.locations[merged.article_ids[position]] = (merged, position)
+                else:
+                    merged.kill(position)
+            self.segments = [segment for segment in self.segments if id(segment) not in selected]
+            if merged.size:
+                self.segments.append(merged)
+            self._commit()
+            self.merges += 1
+            logger.info(f"Merged {len(chosen)} knowledge base segments into {name} ({merged.live_count} articles)")
+
+    # Bulk import
+
+    async def register_segments(self, segments: List[Segment], replace: bool = False) -> List[str]:
+        """Make imported segments searchable; imported articles replace ones with the same ID.
+
+        With replace, everything indexed before is dropped. Returns the IDs of
+        articles that were replaced or, with replace, removed.
+        """
+        async with self._lock:
+            wal_start = self._rotate_log()
+            displaced: List[str] = []
+            if replace:
+                displaced = list(self.locations)
+                self.memtable = InvertedIndex(self.field_weights, self.k1, self.b)
+                self.segments = []
+                self.locations = {}
+                self._payloads = {}
+                self._dirty = set()
+
+            for segment in segments:
+                for position, doc_id in enumerate(segment.article_ids):
+                    if doc_id in self.locations:
+                        if not replace:
+                            displaced.append(doc_id)
+                        self._kill(doc_id)
+                        self._payloads.pop(doc_id, None)
+                        self._dirty.discard(doc_id)
+                    self.locations[doc_id] = (segment, position)
+                    self._bump(doc_id)
+                self.segments.append(segment)
+                self._reserved.discard(segment.name)
+            self._index_terms(segments, reset=replace)
+
+            # The new log starts with what the memtable and dirty articles still hold
+            for doc_id, article in self._payloads.items():
+                self._log({'op': 'put', 'article': article})
+            self._commit(wal_start)
+
+        self._schedule_maintenance()
+        return displaced
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'articles': len(self.locations),
+            'memtable_articles': len(self.memtable),
+            'dirty_articles': len(self._dirty),
+            'segments': [
+                {'name': segment.name, 'articles': segment.size, 'live': segment.live_count}
+                for segment in self.segments
+            ],
+            'memtable_limit': self.memtable_limit,
+            'max_segments': self.max_segments,
+            'flushes': self.flushes,
+            'merges': self.merges,
+            'storage_path': self.storage_path,
+            'generation': self._generation
+        }
+
+
+def _closest(results) -> List[Tuple[str, int]]:
+    """Merge (term, edits) lists, keeping each term's smallest distance, closest first"""
+    best: Dict[str, int] = {}
+    for matches in results:
+        for term, distance in matches:
+            best[term] = min(distance, best.get(term, distance))
+    return sorted(best.items(), key=lambda match: (match[1], match[0]))
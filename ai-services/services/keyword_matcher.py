@@ -0,0 +1,145 @@
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordHits:
+    """Keywords found in one text, with per-label counts for every registered table"""
+
+    __slots__ = ('keywords', '_counts')
+
+    def __init__(self, keywords: frozenset, counts: Dict[str, Dict[str, int]]):
+        self.keywords = keywords
+        self._counts = counts
+
+    def counts(self, namespace: str) -> Dict[str, int]:
+        """Number of the label's keywords present in the text, for labels with at least one hit"""
+        return self._counts.get(namespace, {})
+
+    def has(self, namespace: str, label: str) -> bool:
+        return label in self._counts.get(namespace, {})
+
+    def first(self, namespace: str, labels: Sequence[str]) -> Optional[str]:
+        """First label, in the given order, that has a hit"""
+        hits = self._counts.get(namespace, {})
+        for label in labels:
+            if label in hits:
+                return label
+        return None
+
+
+class KeywordMatcher:
+    """Shared multi-table keyword matcher.
+
+    Every classifier registers its keyword table under a namespace. The tables are
+    compiled into one deduplicated keyword list, so a single scan of a lowercased
+    message checks each distinct keyword exactly once and yields the hit counts for
+    all labels of all namespaces. Scans are memoized per text, which lets the
+    router, the chosen agent and any other classifier share the work for one
+    message. Matching keeps the original substring semantics.
+    """
+
+    def __init__(self, cache_size: int = 1024):
+        self.cache_size = cache_size
+        self._tables: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        self._keywords: Tuple[str, ...] = ()
+        self._keyword_labels: Dict[str, List[Tuple[str, str]]] = {}
+        self._compiled = True
+        self._cache: 'OrderedDict[str, KeywordHits]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, namespace: str, table: Dict[str, Sequence[str]]):
+        """Register or replace a label -> keywords table"""
+        normalized = {label: tuple(keyword.lower() for keyword in keywords) for label, keywords in table.items()}
+        with self._lock:
+            if self._tables.get(namespace) == normalized:
+                return
+            self._tables[namespace] = normalized
+            self._compiled = False
+            self._cache.clear()
+
+    def compile(self):
+        """Rebuild the keyword list after tables changed"""
+        with self._lock:
+            if self._compiled:
+                return
+            keyword_labels: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+            for namespace, table in self._tables.items():
+                for label, keywords in table.items():
+                    for keyword in keywords:
+                        keyword_labels[keyword].append((namespace, label))
+            self._keyword_labels = dict(keyword_labels)
+            self._keywords = tuple(keyword_labels)
+            self._compiled = True
+            logger.debug(f"Compiled keyword matcher: {len(self._keywords)} keywords in {len(self._tables)} tables")
+
+    def scan(self, text: str) -> KeywordHits:
+        """Find every registered keyword contained in text"""
+        cached = self._cache.get(text)
+        if cached is not None:
+            return cached
+
+        if not self._compiled:
+            self.compile()
+
+        text_lower = text.lower()
+        found = frozenset(keyword for keyword in self._keywords if keyword in text_lower)
+        hits = self._build_hits(found)
+
+        with self._lock:
+            self._cache[text] = hits
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return hits
+
+    def scan_many(self, texts: Sequence[str]) -> List[KeywordHits]:
+        """Scan a batch of texts in one pass per keyword.
+
+        The lowercased texts are joined with newlines, which no keyword contains,
+        and each keyword is located with repeated str.find calls that jump to the
+        next text after every hit. The work therefore grows with the number of
+        hits rather than with keywords x texts. Batch results are not memoized.
+        """
+        if not self._compiled:
+            self.compile()
+
+        unique = list(dict.fromkeys(texts))
+        # Offsets come from the lowercased texts: lower() can change a string's length ('İ')
+        lowered = [text.lower() for text in unique]
+        starts = []
+        offset = 0
+        for text in lowered:
+            starts.append(offset)
+            offset += len(text) + 1
+        joined = '\n'.join(lowered)
+
+        found: List[set] = [set() for _ in unique]
+        for keyword in self._keywords:
+            position = joined.find(keyword)
+            while position != -1:
+                index = bisect.bisect_right(starts, position) - 1
+                found[index].add(keyword)
+                if index + 1 == len(starts):
+                    break
+                position = joined.find(keyword, starts[index + 1])
+
+        by_text = {text: self._build_hits(frozenset(keywords)) for text, keywords in zip(unique, found)}
+        return [by_text[text] for text in texts]
+
+    def _build_hits(self, found: frozenset) -> KeywordHits:
+        counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for keyword in found:
+            for namespace, label in self._keyword_labels[keyword]:
+                counts[namespace][label] += 1
+        return KeywordHits(found, {namespace: dict(labels) for namespace, labels in counts.items()})
+
+    def table(self, namespace: str) -> Dict[str, Tuple[str, ...]]:
+        return self._tables.get(namespace, {})
+
+
+# Process-wide matcher shared by all classifiers
+keyword_matcher = KeywordMatcher()
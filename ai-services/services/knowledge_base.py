@@ -1,14 +1,23 @@
 import asyncio
-from typing import Dict, List, Any, Optional
+import heapq
+import os
+import time
+from typing import Collection, Dict, List, Any, Optional
 from datetime import datetime
 import logging
+from .search_index import tokenize
+from .metrics import KB_SEARCH_RESULTS, KB_SEARCH_SECONDS
+from .kb_aggregates import KnowledgeBaseAggregates
+from .kb_segments import Segment, SegmentedIndex
+from .profiling import span
+from .view_counter import ViewCounter
 
 logger = logging.getLogger(__name__)
 
 class KnowledgeBaseService:
-    def __init__(self):
+    def __init__(self, index_path: Optional[str] = None):
         # Mock knowledge base data
-        self.articles = [
+        seed_articles = [
             {
                 'id': 'KB001',
                 'title': 'How to reset user password',
@@ -73,51 +82,91 @@ class KnowledgeBaseService:
             'General'
         ]
 
-    async def search(self, query: str, category: Optional[str] = None) -> Dict[str, Any]:
-        """Search knowledge base articles"""
+        # Field weights keep the same proportions as the original substring scoring
+        self.field_weights = {
+            'title': 5.0,
+            'tags': 2.5,
+            'category': 1.5,
+            'content': 1.0
+        }
+        # Segments and the change log live under KB_INDEX_PATH; without it the index is in memory only
+        self.search_index = SegmentedIndex(
+            self.field_weights,
+            storage_path=index_path or os.getenv('KB_INDEX_PATH') or None,
+            memtable_limit=int(os.getenv('KB_MEMTABLE_LIMIT', '1000')),
+            max_segments=int(os.getenv('KB_MAX_SEGMENTS', '8'))
+        )
+        # Primary store, keyed by article ID; insertion order is the article order
+        self.articles_by_id: Dict[str, Dict[str, Any]] = {}
+        self.aggregates = KnowledgeBaseAggregates(
+            self.articles_by_id,
+            capacity=int(os.getenv('KB_TOPK_CAPACITY', '100'))
+        )
+        restored = self.search_index.load()
+        if restored is None:
+            for article in seed_articles:
+                self._index_article(article)
+        else:
+            # Opening maps the stored segments; nothing is re-indexed
+            for article in restored:
+                self.articles_by_id[article['id']] = article
+        self.aggregates.extend(self.articles_by_id.values())
+
+        self.view_counter = ViewCounter(
+            batch_size=int(os.getenv('KB_VIEW_FLUSH_BATCH', '256')),
+            flush_interval=float(os.getenv('KB_VIEW_FLUSH_SECONDS', '5'))
+        )
+
+        # Documents scored per autocomplete request, bounding the cost of each keystroke
+        self.autocomplete_candidates = int(os.getenv('KB_AUTOCOMPLETE_CANDIDATES', '2000'))
+
+    @property
+    def articles(self) -> List[Dict[str, Any]]:
+        """All articles in insertion order"""
+        return list(self.articles_by_id.values())
+
+    def _index_article(self, article: Dict[str, Any]):
+        """Add or refresh an article in the search index"""
+        self.articles_by_id[article['id']] = article
+        self.search_index.add(article['id'], article, article.get('category'))
+
+    def flush_views(self) -> int:
+        """Apply queued views to the articles; returns the number applied"""
+        counts = self.view_counter.drain()
+        articles_by_id = self.articles_by_id
+        for article_id, views in counts.items():
+            article = articles_by_id.get(article_id)
+            # Views of articles deleted since they were read are dropped
+            if article is not None:
+                article['views'] += views
+                self.aggregates.refresh(article)
+                self.search_index.touch(article_id, article)
+        return sum(counts.values())
+
+    @span
+    async def search(self, query: str, category: Optional[str] = None, fuzzy: bool = True) -> Dict[str, Any]:
+        """Search knowledge base articles; misspelled terms are matched to their closest indexed spelling"""
         try:
-            query_lower = query.lower()
-            results = []
-            
-            for article in self.articles:
-                # Skip if category filter doesn't match
-                if category and article['category'].lower() != category.lower():
-                    continue
-                
-                # Calculate relevance score
-                score = 0
-                
-                # Title match (highest weight)
-                if query_lower in article['title'].lower():
-                    score += 10
-                
-                # Tag match (medium weight)
-                for tag in article['tags']:
-                    if query_lower in tag.lower():
-                        score += 5
-                
-                # Content match (lower weight)
-                if query_lower in article['content'].lower():
-                    score += 2
-                
-                # Category match (bonus)
-                if query_lower in article['category'].lower():
-                    score += 3
-                
-                if score > 0:
-                    results.append({
-                        **article,
-                        'relevance_score': score
-                    })
-            
-            # Sort by relevance score and rating
-            results.sort(key=lambda x: (x['relevance_score'], x['rating']), reverse=True)
+            started = time.perf_counter()
+            weights, corrections = self.search_index.expand_query(query, fuzzy)
+            total, matches = self.search_index.search_top(weights, category, 10)
+            top_matches = self._top_matches(matches, 10)
+            results = [
+                {
+                    **self.articles_by_id[article_id],
+                    'relevance_score': round(score, 4)
+                }
+                for article_id, score in top_matches
+            ]
+            KB_SEARCH_SECONDS.observe(time.perf_counter() - started)
+            KB_SEARCH_RESULTS.observe(total)
             
             return {
                 'query': query,
                 'category_filter': category,
-                'total_results': len(results),
-                'results': results[:10],  # Limit to top 10 results
+                'total_results': total,
+                'results': results,  # Limited to top 10 results
+                'corrections': corrections,
                 'search_timestamp': datetime.now().isoformat()
             }
             
@@ -125,26 +174,75 @@ class KnowledgeBaseService:
             logger.error(f"Error searching knowledge base: {str(e)}")
             raise
 
+    def _top_matches(self, matches: List[Any], limit: int) -> List[Any]:
+        """Rank only the matched articles; ties broken by rating"""
+        articles_by_id = self.articles_by_id
+        return heapq.nlargest(
+            limit,
+            matches,
+            key=lambda match: (match[1], articles_by_id[match[0]]['rating'])
+        )
+
+    @span
+    async def autocomplete(self, text: str, limit: int = 10, category: Optional[str] = None) -> Dict[str, Any]:
+        """Search-as-you-type: complete the word being typed and suggest matching articles.
+
+        The last word is treated as a prefix unless the text ends in a separator;
+        when nothing starts with it, its closest spellings are offered instead.
+        Earlier words are spelling-corrected as in search().
+        """
+        try:
+            index = self.search_index
+            terms = tokenize(text)
+            completing = bool(terms) and text[-1:].isalnum()
+            prefix = terms[-1] if completing else ''
+            weights, corrections = index.expand_query(' '.join(terms[:-1] if completing else terms))
+
+            completions = []
+            if prefix:
+                completions = index.completions(prefix, limit)
+                if not completions:
+                    completions = [
+                        (term, index.document_frequency(term)) for term, _ in index.corrections(prefix, limit)
+                    ]
+                if completions:
+                    # The most common completion carries the suggestions; the others still count
+                    best = completions[0][0]
+                    for term, _ in completions[:3]:
+                        weights[term] = max(weights.get(term, 0.0), 1.0 if term == best else 0.5)
+
+            _, matches = index.search_top(
+                weights, category, limit, candidate_limit=self.autocomplete_candidates
+            ) if weights else (0, [])
+            suggestions = [
+                {
+                    'id': article_id,
+                    'title': self.articles_by_id[article_id]['title'],
+                    'category': self.articles_by_id[article_id]['category'],
+                    'relevance_score': round(score, 4)
+                }
+                for article_id, score in self._top_matches(matches, limit)
+            ]
+
+            return {
+                'query': text,
+                'completions': [{'term': term, 'articles': count} for term, count in completions],
+                'corrections': corrections,
+                'suggestions': suggestions
+            }
+
+        except Exception as e:
+            logger.error(f"Error autocompleting knowledge base query: {str(e)}")
+            raise
+
     async def add_article(self, article_data: Dict[str, Any]) -> str:
         """Add new article to knowledge base"""
         try:
-            article_id = f"KB{len(self.articles) + 1:03d}"
+            article_id = self.next_article_id()
+            new_article = self.build_article(article_data, article_id)
             
-            new_article = {
-                'id': article_id,
-                'title': article_data.get('title'),
-                'category': article_data.get('category', 'General'),
-                'content': article_data.get('content'),
-                'tags': article_data.get('tags', []),
-                'views': 0,
-                'rating': 0.0,
-                'created_at': datetime.now().isoformat(),
-                'updated_at': datetime.now().isoformat(),
-                'author': article_data.get('author', 'System'),
-                'status': article_data.get('status', 'draft')
-            }
-            
-            self.articles.append(new_article)
+            self._index_article(new_article)
+            self.aggregates.refresh(new_article)
             
             logger.info(f"Added new knowledge base article: {article_id}")
             return article_id
@@ -153,16 +251,65 @@ class KnowledgeBaseService:
             logger.error(f"Error adding article: {str(e)}")
             raise
 
+    def next_article_id(self, taken: Collection[str] = (), ignore_existing: bool = False) -> str:
+        """Next sequential KB ID that is neither stored nor in taken"""
+        existing = set() if ignore_existing else self.articles_by_id
+        number = len(taken) + len(existing) + 1
+        while f"KB{number:03d}" in existing or f"KB{number:03d}" in taken:
+            number += 1
+        return f"KB{number:03d}"
+
+    def build_article(self, article_data: Dict[str, Any], article_id: str, keep_stats: bool = False) -> Dict[str, Any]:
+        """A stored article from submitted fields; imports may carry views, rating and timestamps"""
+        now = datetime.now().isoformat()
+        article = {
+            'id': article_id,
+            'title': article_data.get('title'),
+            'category': article_data.get('category', 'General'),
+            'content': article_data.get('content'),
+            'tags': article_data.get('tags', []),
+            'views': 0,
+            'rating': 0.0,
+            'created_at': now,
+            'updated_at': now,
+            'author': article_data.get('author', 'System'),
+            'status': article_data.get('status', 'draft')
+        }
+        if keep_stats:
+            for key in ('views', 'rating', 'created_at', 'updated_at'):
+                if article_data.get(key) is not None:
+                    article[key] = article_data[key]
+        return article
+
+    async def apply_import(self, segments: List[Segment], articles: List[Dict[str, Any]], replace: bool = False) -> int:
+        """Make imported segments searchable and store their articles; returns how many existing ones were replaced"""
+        try:
+            displaced = await self.search_index.register_segments(segments, replace)
+            if replace:
+                # Queued views belong to the articles being dropped
+                self.view_counter.drain()
+                self.articles_by_id.clear()
+                self.aggregates = KnowledgeBaseAggregates(self.articles_by_id, capacity=self.aggregates.popular.capacity)
+            for article in articles:
+                self.articles_by_id[article['id']] = article
+            self.aggregates.extend(articles)
+            return len(displaced)
+
+        except Exception as e:
+            logger.error(f"Error importing articles: {str(e)}")
+            raise
+
     async def get_article(self, article_id: str) -> Optional[Dict[str, Any]]:
         """Get specific article by ID"""
         try:
-            for article in self.articles:
-                if article['id'] == article_id:
-                    # Increment view count
-                    article['views'] += 1
-                    return article
-            
-            return None
+            article = self.articles_by_id.get(article_id)
+            if article is None:
+                return None
+
+            # Counted write-behind; 'views' catches up at the next flush
+            if self.view_counter.record(article_id):
+                self.flush_views()
+            return article
             
         except Exception as e:
             logger.error(f"Error getting article {article_id}: {str(e)}")
@@ -171,20 +318,25 @@ class KnowledgeBaseService:
     async def update_article(self, article_id: str, updates: Dict[str, Any]) -> bool:
         """Update existing article"""
         try:
-            for i, article in enumerate(self.articles):
-                if article['id'] == article_id:
-                    # Update fields
-                    for key, value in updates.items():
-                        if key in article:
-                            article[key] = value
-                    
-                    article['updated_at'] = datetime.now().isoformat()
-                    self.articles[i] = article
-                    
-                    logger.info(f"Updated knowledge base article: {article_id}")
-                    return True
+            article = self.articles_by_id.get(article_id)
+            if article is None:
+                return False
+
+            # Update fields
+            for key, value in updates.items():
+                if key in article:
+                    article[key] = value
+            
+            article['updated_at'] = datetime.now().isoformat()
+            
+            if any(key in self.field_weights for key in updates):
+                self._index_article(article)
+            else:
+                self.search_index.touch(article_id, article)
+            self.aggregates.refresh(article)
             
-            return False
+            logger.info(f"Updated knowledge base article: {article_id}")
+            return True
             
         except Exception as e:
             logger.error(f"Error updating article {article_id}: {str(e)}")
@@ -193,18 +345,22 @@ class KnowledgeBaseService:
     async def delete_article(self, article_id: str) -> bool:
         """Delete article from knowledge base"""
         try:
-            for i, article in enumerate(self.articles):
-                if article['id'] == article_id:
-                    del self.articles[i]
-                    logger.info(f"Deleted knowledge base article: {article_id}")
-                    return True
-            
-            return False
+            if self.articles_by_id.pop(article_id, None) is None:
+                return False
+
+            self.search_index.remove(article_id)
+            self.aggregates.remove(article_id)
+            logger.info(f"Deleted knowledge base article: {article_id}")
+            return True
             
         except Exception as e:
             logger.error(f"Error deleting article {article_id}: {str(e)}")
             raise
 
+    async def get_index_status(self) -> Dict[str, Any]:
+        """Segments, memtable and storage of the search index"""
+        return self.search_index.stats()
+
     async def get_categories(self) -> List[str]:
         """Get list of available categories"""
         return self.categories
@@ -212,8 +368,8 @@ class KnowledgeBaseService:
     async def get_popular_articles(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Get most popular articles by views"""
         try:
-            sorted_articles = sorted(self.articles, key=lambda x: x['views'], reverse=True)
-            return sorted_articles[:limit]
+            self.flush_views()
+            return self.aggregates.ranked(self.aggregates.popular, 'views', limit)
             
         except Exception as e:
             logger.error(f"Error getting popular articles: {str(e)}")
@@ -222,12 +378,7 @@ class KnowledgeBaseService:
     async def get_recent_articles(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Get most recently updated articles"""
         try:
-            sorted_articles = sorted(
-                self.articles, 
-                key=lambda x: x['updated_at'], 
-                reverse=True
-            )
-            return sorted_articles[:limit]
+            return self.aggregates.ranked(self.aggregates.recent, 'updated_at', limit)
             
         except Exception as e:
             logger.error(f"Error getting recent articles: {str(e)}")
@@ -236,20 +387,25 @@ class KnowledgeBaseService:
     async def rate_article(self, article_id: str, rating: float) -> bool:
         """Rate an article"""
         try:
-            for article in self.articles:
-                if article['id'] == article_id:
-                    # Simple rating update (in real implementation, would track individual ratings)
-                    current_rating = article.get('rating', 0.0)
-                    views = article.get('views', 1)
-                    
-                    # Calculate new average rating
-                    new_rating = ((current_rating * (views - 1)) + rating) / views
-                    article['rating'] = round(new_rating, 1)
-                    
-                    logger.info(f"Updated rating for article {article_id}: {new_rating}")
-                    return True
+            article = self.articles_by_id.get(article_id)
+            if article is None:
+                return False
+
+            # The average is weighted by views, so bring them up to date first
+            self.flush_views()
+
+            # Simple rating update (in real implementation, would track individual ratings)
+            current_rating = article.get('rating', 0.0)
+            views = article.get('views', 1)
             
-            return False
+            # Calculate new average rating
+            new_rating = ((current_rating * (views - 1)) + rating) / views
+            article['rating'] = round(new_rating, 1)
+            self.aggregates.refresh(article)
+            self.search_index.touch(article_id, article)
+            
+            logger.info(f"Updated rating for article {article_id}: {new_rating}")
+            return True
             
         except Exception as e:
             logger.error(f"Error rating article {article_id}: {str(e)}")
@@ -258,22 +414,20 @@ class KnowledgeBaseService:
     async def get_statistics(self) -> Dict[str, Any]:
         """Get knowledge base statistics"""
         try:
-            total_articles = len(self.articles)
-            total_views = sum(article['views'] for article in self.articles)
-            avg_rating = sum(article['rating'] for article in self.articles) / total_articles if total_articles > 0 else 0
-            
-            category_counts = {}
-            for article in self.articles:
-                category = article['category']
-                category_counts[category] = category_counts.get(category, 0) + 1
+            self.flush_views()
+            aggregates = self.aggregates
+            total_articles = len(aggregates)
+            avg_rating = aggregates.rating_sum / total_articles if total_articles > 0 else 0
+            most_viewed = aggregates.ranked(aggregates.popular, 'views', 1)
+            highest_rated = aggregates.ranked(aggregates.highest_rated, 'rating', 1)
             
             return {
                 'total_articles': total_articles,
-                'total_views': total_views,
+                'total_views': aggregates.total_views,
                 'average_rating': round(avg_rating, 2),
-                'articles_by_category': category_counts,
-                'most_viewed_article': max(self.articles, key=lambda x: x['views']) if self.articles else None,
-                'highest_rated_article': max(self.articles, key=lambda x: x['rating']) if self.articles else None,
+                'articles_by_category': dict(aggregates.category_counts),
+                'most_viewed_article': most_viewed[0] if most_viewed else None,
+                'highest_rated_article': highest_rated[0] if highest_rated else None,
                 'generated_at': datetime.now().isoformat()
             }
             
@@ -0,0 +1,165 @@
+import time
+from typing import Any, Iterator, Optional
+import logging
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Most handlers finish in well under a millisecond; analyses can take seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TASK_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'ai_http_request_duration_seconds', 'HTTP request latency by route template',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS
+)
+
+AGENT_ROUTES = Counter(
+    'ai_agent_routes_total', 'Chat messages routed, by target agent and how it was chosen',
+    ['agent', 'reason']
+)
+AGENT_STAGE_SECONDS = Histogram(
+    'ai_agent_stage_seconds', 'Time spent in each stage of handling a chat message',
+    ['stage'], buckets=LATENCY_BUCKETS
+)
+AGENT_RESPONSE_CACHE = Counter(
+    'ai_agent_response_cache_total', 'Agent response template lookups',
+    ['result']
+)
+
+AUTOMATION_TASKS = Counter(
+    'ai_automation_tasks_total', 'Automation tasks by type and final status',
+    ['task_type', 'status']
+)
+AUTOMATION_TASK_SECONDS = Histogram(
+    'ai_automation_task_duration_seconds', 'Automation task run time, from worker start to finish',
+    ['task_type'], buckets=TASK_BUCKETS
+)
+
+KB_SEARCH_SECONDS = Histogram(
+    'ai_kb_search_duration_seconds', 'Knowledge base search latency', buckets=LATENCY_BUCKETS
+)
+KB_SEARCH_RESULTS = Histogram(
+    'ai_kb_search_results', 'Matching articles per knowledge base search', buckets=COUNT_BUCKETS
+)
+
+
+def _size(value: Any) -> Optional[int]:
+    try:
+        return len(value)
+    except TypeError:
+        # e.g. the Redis session store, which can only be counted with a round trip
+        return None
+
+
+class ServiceStateCollector:
+    """Queue depths and in-memory store sizes, read from the live services at scrape time.
+
+    Only services that already exist are read, so a scrape never builds one.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def _created(self, name: str):
+        return self.registry.get(name) if self.registry.is_created(name) else None
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        stores = GaugeMetricFamily('ai_store_entries', 'Entries held in in-memory stores', labels=['store'])
+        sizes = {}
+
+        chatbot = self._created('chatbot')
+        if chatbot is not None:
+            sizes['conversation_history'] = _size(chatbot.conversation_history)
+
+        engine = self._created('automation_engine')
+        if engine is not None:
+            sizes['task_registry'] = len(engine.task_registry)
+            queue_depth = GaugeMetricFamily('ai_automation_queue_depth', 'Automation tasks waiting for a worker')
+            queue_depth.add_metric([], engine.task_queue.depth)
+            running = GaugeMetricFamily('ai_automation_running_tasks', 'Automation tasks currently running')
+            running.add_metric([], engine.task_queue.running)
+            yield queue_depth
+            yield running
+
+        knowledge_base = self._created('knowledge_base')
+        if knowledge_base is not None:
+            sizes['kb_articles'] = len(knowledge_base.articles_by_id)
+            sizes['kb_pending_views'] = len(knowledge_base.view_counter)
+            sizes['kb_memtable_articles'] = len(knowledge_base.search_index.memtable)
+            sizes['kb_index_segments'] = len(knowledge_base.search_index.segments)
+
+        incident_analyzer = self._created('incident_analyzer')
+        if incident_analyzer is not None:
+            sizes['incident_similarity_index'] = len(incident_analyzer.similarity_index.records)
+
+        patch_intelligence = self._created('patch_intelligence')
+        if patch_intelligence is not None:
+            sizes['patch_recommendation_cache'] = len(patch_intelligence.recommendation_cache)
+
+        problem_detector = self._created('problem_detector')
+        if problem_detector is not None:
+            sizes['problem_window_incidents'] = len(problem_detector)
+
+        multi_agent_system = self._created('multi_agent_system')
+        if multi_agent_system is not None:
+            sizes['agent_response_templates'] = len(multi_agent_system.response_cache)
+
+        for store, size in sizes.items():
+            if size is not None:
+                stores.add_metric([store], size)
+        yield stores
+
+
+_collector: Optional[ServiceStateCollector] = None
+
+
+def register_service_collector(registry):
+    """Expose the state of the registry's services; safe to call more than once"""
+    global _collector
+    if _collector is None:
+        _collector = ServiceStateCollector(registry)
+        REGISTRY.register(_collector)
+
+
+def render_latest() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+class PrometheusMiddleware:
+    """ASGI middleware timing every HTTP request under its route template.
+
+    Labels use the matched route's path (/api/patches/recommendations/{system_id})
+    rather than the raw URL, so cardinality stays bounded. Streaming responses are
+    timed until the last byte is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            HTTP_REQUEST_SECONDS.labels(
+                scope['method'],
+                getattr(route, 'path', 'unmatched'),
+                str(status)
+            ).observe(time.perf_counter() - started)
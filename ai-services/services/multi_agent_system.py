@@ -1,13 +1,14 @@
 import asyncio
-from typing import Dict, List, Any, Optional
+import os
+import time
+from typing import Dict, List, Any, Hashable, Optional, Tuple
 from datetime import datetime
 import logging
-from .chatbot import ChatbotService
-from .incident_analyzer import IncidentAnalyzer
-from .problem_analyzer import ProblemAnalyzer
-from .patch_intelligence import PatchIntelligence
-from .automation_engine import AutomationEngine
-from .knowledge_base import KnowledgeBaseService
+from .keyword_matcher import keyword_matcher
+from .registry import service_registry
+from .metrics import AGENT_RESPONSE_CACHE, AGENT_ROUTES, AGENT_STAGE_SECONDS
+from .response_templates import ResponseTemplate, ResponseTemplateCache, encode_json
+from .profiling import span
 
 logger = logging.getLogger(__name__)
 
@@ -43,46 +44,101 @@ class MultiAgentSystem:
             'user': ['user', 'account', 'access', 'permission', 'onboard', 'offboard'],
             'os': ['os', 'operating system', 'configuration', 'hardening', 'baseline']
         }
+        keyword_matcher.register('agent', self.agent_capabilities)
+        
+        # Prebuilt responses per (agent, detected features), optionally with encoded JSON
+        self.response_cache = ResponseTemplateCache(
+            max_entries=int(os.getenv('AGENT_RESPONSE_CACHE_SIZE', '1024')),
+            serialize=os.getenv('AGENT_RESPONSE_PRESERIALIZE', 'true').lower() == 'true'
+        )
 
     async def route_message(self, message: str, user_context: Dict[str, Any], 
                            preferred_agent: Optional[str] = None) -> Dict[str, Any]:
         """Route message to appropriate agent based on content and context"""
         try:
-            # If specific agent requested, use it
-            if preferred_agent and preferred_agent in self.agents:
-                target_agent = preferred_agent
-            else:
-                # Use orchestrator to determine best agent
-                target_agent = await self._determine_target_agent(message, user_context)
-            
-            # Get response from target agent
-            response = await self.agents[target_agent].process_message(message, user_context)
-            
-            # Add agent metadata
-            response['agent_info'] = {
-                'agent_id': target_agent,
-                'agent_name': self.agents[target_agent].name,
-                'capabilities': self.agents[target_agent].capabilities,
-                'confidence': response.get('confidence', 0.8)
-            }
-            
-            return response
+            template, overlay = await self._route(message, user_context, preferred_agent)
+            return template.render(overlay)
             
         except Exception as e:
             logger.error(f"Error in multi-agent routing: {str(e)}")
+            AGENT_ROUTES.labels('orchestrator', 'error').inc()
             # Fallback to orchestrator
             return await self.agents['orchestrator'].process_message(message, user_context)
 
+    async def route_message_json(self, message: str, user_context: Dict[str, Any],
+                                 preferred_agent: Optional[str] = None) -> bytes:
+        """Same as route_message, returning the response encoded as JSON"""
+        try:
+            template, overlay = await self._route(message, user_context, preferred_agent)
+            started = time.perf_counter()
+            body = template.render_json(overlay)
+            AGENT_STAGE_SECONDS.labels('serialize').observe(time.perf_counter() - started)
+            return body
+            
+        except Exception as e:
+            logger.error(f"Error in multi-agent routing: {str(e)}")
+            AGENT_ROUTES.labels('orchestrator', 'error').inc()
+            return encode_json(await self.agents['orchestrator'].process_message(message, user_context))
+
+    @span
+    async def _route(self, message: str, user_context: Dict[str, Any],
+                     preferred_agent: Optional[str]) -> Tuple[ResponseTemplate, Optional[Dict[str, Any]]]:
+        """Pick the agent and return its response template with the per-request overlay"""
+        started = time.perf_counter()
+        # If specific agent requested, use it
+        if preferred_agent and preferred_agent in self.agents:
+            target_agent, reason = preferred_agent, 'preferred'
+        else:
+            # Use orchestrator to determine best agent
+            target_agent = await self._determine_target_agent(message, user_context)
+            reason = 'keywords' if target_agent != 'orchestrator' else 'default'
+        agent = self.agents[target_agent]
+        routed = time.perf_counter()
+        AGENT_ROUTES.labels(target_agent, reason).inc()
+        AGENT_STAGE_SECONDS.labels('route').observe(routed - started)
+        
+        features = agent.response_features(message, user_context)
+        if features is None:
+            AGENT_RESPONSE_CACHE.labels('uncacheable').inc()
+            template, overlay = ResponseTemplate(await self._build_response(target_agent, message, user_context)), None
+        else:
+            key = (target_agent, features[0])
+            template, overlay = self.response_cache.get(key), features[1]
+            if template is None:
+                AGENT_RESPONSE_CACHE.labels('miss').inc()
+                template = self.response_cache.put(key, await self._build_response(target_agent, message, user_context))
+            else:
+                AGENT_RESPONSE_CACHE.labels('hit').inc()
+                agent.last_used = datetime.now()
+        
+        AGENT_STAGE_SECONDS.labels('respond').observe(time.perf_counter() - routed)
+        return template, overlay
+
+    @span
+    async def _build_response(self, target_agent: str, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
+        # Get response from target agent
+        agent = self.agents[target_agent]
+        response = await agent.process_message(message, user_context)
+        
+        # Add agent metadata
+        response['agent_info'] = {
+            'agent_id': target_agent,
+            'agent_name': agent.name,
+            'capabilities': agent.capabilities,
+            'confidence': response.get('confidence', 0.8)
+        }
+        return response
+
     async def _determine_target_agent(self, message: str, user_context: Dict[str, Any]) -> str:
         """Determine the best agent to handle the message"""
-        message_lower = message.lower()
+        hits = keyword_matcher.scan(message).counts('agent')
         
         # Score each agent based on keyword matches
-        agent_scores = {}
-        for agent_id, keywords in self.agent_capabilities.items():
-            score = sum(1 for keyword in keywords if keyword in message_lower)
-            if score > 0:
-                agent_scores[agent_id] = score
+        agent_scores = {
+            agent_id: hits[agent_id]
+            for agent_id in self.agent_capabilities
+            if agent_id in hits
+        }
         
         # Return highest scoring agent or orchestrator as fallback
         if agent_scores:
@@ -103,6 +159,9 @@ class MultiAgentSystem:
         return status
 
 class BaseAgent:
+    # Agents whose reply never depends on the message or context set this to share one cached response
+    static_response = False
+    
     def __init__(self, name: str, capabilities: List[str]):
         self.name = name
         self.capabilities = capabilities
@@ -113,11 +172,23 @@ class BaseAgent:
         self.last_used = datetime.now()
         return await self._generate_response(message, user_context)
     
+    def response_features(self, message: str,
+                          user_context: Dict[str, Any]) -> Optional[Tuple[Hashable, Optional[Dict[str, Any]]]]:
+        """Detected features that fully determine the response, and per-request fields.
+        
+        Responses are cached per (agent, features) and the returned overlay is merged
+        into each copy. None, the default, means the response is built for every
+        request; agents opt in by overriding this or by setting static_response.
+        """
+        return ((), None) if self.static_response else None
+    
     async def _generate_response(self, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         """Override in subclasses"""
         raise NotImplementedError
 
 class OrchestratorAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("Orchestrator Agent", ["routing", "coordination", "general"])
     
@@ -139,9 +210,16 @@ class OrchestratorAgent(BaseAgent):
         }
 
 class IncidentAgent(BaseAgent):
+    severity_keywords = {
+        'Critical': ['critical', 'down', 'outage', 'emergency'],
+        'High': ['high', 'urgent', 'major'],
+        'Medium': ['medium', 'moderate']
+    }
+    
     def __init__(self):
         super().__init__("Incident Management Agent", ["incident_analysis", "impact_assessment", "escalation"])
-        self.incident_analyzer = IncidentAnalyzer()
+        self.incident_analyzer = service_registry.proxy('incident_analyzer')
+        keyword_matcher.register('incident_severity', self.severity_keywords)
     
     async def _generate_response(self, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         # Analyze the incident context
@@ -160,19 +238,23 @@ class IncidentAgent(BaseAgent):
             'confidence': 0.85
         }
     
+    def response_features(self, message: str, user_context: Dict[str, Any]):
+        return (self._detect_severity(message),), None
+    
     def _detect_severity(self, message: str) -> str:
-        message_lower = message.lower()
-        if any(word in message_lower for word in ['critical', 'down', 'outage', 'emergency']):
-            return 'Critical'
-        elif any(word in message_lower for word in ['high', 'urgent', 'major']):
-            return 'High'
-        elif any(word in message_lower for word in ['medium', 'moderate']):
-            return 'Medium'
-        return 'Low'
+        hits = keyword_matcher.scan(message)
+        return hits.first('incident_severity', self.severity_keywords) or 'Low'
 
 class RequestAgent(BaseAgent):
+    request_type_keywords = {
+        'Software': ['software', 'application', 'install'],
+        'Hardware': ['hardware', 'laptop', 'desktop'],
+        'Access': ['access', 'permission', 'account']
+    }
+    
     def __init__(self):
         super().__init__("Request Fulfillment Agent", ["service_catalog", "approval_workflow", "fulfillment"])
+        keyword_matcher.register('request_type', self.request_type_keywords)
     
     async def _generate_response(self, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         request_type = self._detect_request_type(message)
@@ -190,20 +272,19 @@ class RequestAgent(BaseAgent):
             'confidence': 0.8
         }
     
+    def response_features(self, message: str, user_context: Dict[str, Any]):
+        return (self._detect_request_type(message),), None
+    
     def _detect_request_type(self, message: str) -> str:
-        message_lower = message.lower()
-        if any(word in message_lower for word in ['software', 'application', 'install']):
-            return 'Software'
-        elif any(word in message_lower for word in ['hardware', 'laptop', 'desktop']):
-            return 'Hardware'
-        elif any(word in message_lower for word in ['access', 'permission', 'account']):
-            return 'Access'
-        return 'General'
+        hits = keyword_matcher.scan(message)
+        return hits.first('request_type', self.request_type_keywords) or 'General'
 
 class ProblemAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("Problem Management Agent", ["root_cause_analysis", "pattern_detection", "prevention"])
-        self.problem_analyzer = ProblemAnalyzer()
+        self.problem_analyzer = service_registry.proxy('problem_analyzer')
     
     async def _generate_response(self, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         return {
@@ -219,6 +300,8 @@ class ProblemAgent(BaseAgent):
         }
 
 class ChangeAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("Change Management Agent", ["change_planning", "risk_assessment", "approval_process"])
     
@@ -236,6 +319,8 @@ class ChangeAgent(BaseAgent):
         }
 
 class AssetAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("Asset Management Agent", ["asset_discovery", "configuration_tracking", "cmdb_management"])
     
@@ -253,6 +338,8 @@ class AssetAgent(BaseAgent):
         }
 
 class ApplicationAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("Application Management Agent", ["software_deployment", "lifecycle_management", "automation"])
     
@@ -270,6 +357,8 @@ class ApplicationAgent(BaseAgent):
         }
 
 class VMAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("VM Management Agent", ["vm_provisioning", "resource_management", "automation"])
     
@@ -287,9 +376,11 @@ class VMAgent(BaseAgent):
         }
 
 class PatchAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("Patch Management Agent", ["patch_analysis", "deployment_planning", "compliance_tracking"])
-        self.patch_intelligence = PatchIntelligence()
+        self.patch_intelligence = service_registry.proxy('patch_intelligence')
     
     async def _generate_response(self, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         return {
@@ -305,6 +396,8 @@ class PatchAgent(BaseAgent):
         }
 
 class UserAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("User Access Management Agent", ["user_provisioning", "access_control", "compliance"])
     
@@ -322,15 +415,40 @@ class UserAgent(BaseAgent):
         }
 
 class ServiceDeskAgent(BaseAgent):
+    ticket_request_phrases = {
+        'ticket_request': ['create ticket', 'new ticket', 'ticket for', 'report issue', 'need help with']
+    }
+    
+    priority_keywords = {
+        'High': ['urgent', 'critical', 'emergency', 'down', 'not working'],
+        'Low': ['when possible', 'low priority', 'not urgent']
+    }
+    
+    category_keywords = {
+        'Email': ['email', 'outlook', 'mail'],
+        'Network': ['network', 'internet', 'wifi', 'connection'],
+        'Software': ['software', 'application', 'program', 'install'],
+        'Hardware': ['hardware', 'computer', 'laptop', 'printer'],
+        'Access': ['access', 'permission', 'login', 'password']
+    }
+    
+    recommended_agent_keywords = {
+        'incident': ['down', 'outage', 'not working', 'error'],
+        'request': ['install', 'request', 'need access'],
+        'problem': ['recurring', 'multiple times', 'pattern'],
+        'change': ['change', 'update', 'deployment']
+    }
+    
     def __init__(self):
         super().__init__("Service Desk Agent", ["ticket_creation", "support", "knowledge_base", "routing"])
+        keyword_matcher.register('ticket_request', self.ticket_request_phrases)
+        keyword_matcher.register('ticket_priority', self.priority_keywords)
+        keyword_matcher.register('ticket_category', self.category_keywords)
+        keyword_matcher.register('ticket_agent', self.recommended_agent_keywords)
     
     async def _generate_response(self, message: str, user_context: Dict[str, Any]) -> Dict[str, Any]:
         # Analyze if this is a ticket creation request
-        message_lower = message.lower()
-        is_ticket_request = any(phrase in message_lower for phrase in [
-            'create ticket', 'new ticket', 'ticket for', 'report issue', 'need help with'
-        ])
+        is_ticket_request = keyword_matcher.scan(message).has('ticket_request', 'ticket_request')
         
         if is_ticket_request:
             # Extract ticket information from message
@@ -361,40 +479,27 @@ class ServiceDeskAgent(BaseAgent):
             'confidence': 0.9
         }
     
+    def response_features(self, message: str, user_context: Dict[str, Any]):
+        if not keyword_matcher.scan(message).has('ticket_request', 'ticket_request'):
+            return ('general',), None
+        # The suggestion quotes the message, so it is applied per request
+        ticket_suggestion = self._extract_ticket_info(message)
+        features = ('ticket', ticket_suggestion['priority'], ticket_suggestion['category'],
+                    ticket_suggestion['recommended_agent'])
+        return features, {'ticket_suggestion': ticket_suggestion}
+    
     def _extract_ticket_info(self, message: str) -> Dict[str, Any]:
         """Extract ticket information from user message"""
-        message_lower = message.lower()
+        hits = keyword_matcher.scan(message)
         
         # Determine priority based on urgency keywords
-        priority = 'Medium'
-        if any(word in message_lower for word in ['urgent', 'critical', 'emergency', 'down', 'not working']):
-            priority = 'High'
-        elif any(word in message_lower for word in ['when possible', 'low priority', 'not urgent']):
-            priority = 'Low'
+        priority = hits.first('ticket_priority', self.priority_keywords) or 'Medium'
         
         # Determine category based on content
-        category = 'Other'
-        if any(word in message_lower for word in ['email', 'outlook', 'mail']):
-            category = 'Email'
-        elif any(word in message_lower for word in ['network', 'internet', 'wifi', 'connection']):
-            category = 'Network'
-        elif any(word in message_lower for word in ['software', 'application', 'program', 'install']):
-            category = 'Software'
-        elif any(word in message_lower for word in ['hardware', 'computer', 'laptop', 'printer']):
-            category = 'Hardware'
-        elif any(word in message_lower for word in ['access', 'permission', 'login', 'password']):
-            category = 'Access'
+        category = hits.first('ticket_category', self.category_keywords) or 'Other'
         
         # Determine recommended agent
-        recommended_agent = 'servicedesk'
-        if any(word in message_lower for word in ['down', 'outage', 'not working', 'error']):
-            recommended_agent = 'incident'
-        elif any(word in message_lower for word in ['install', 'request', 'need access']):
-            recommended_agent = 'request'
-        elif any(word in message_lower for word in ['recurring', 'multiple times', 'pattern']):
-            recommended_agent = 'problem'
-        elif any(word in message_lower for word in ['change', 'update', 'deployment']):
-            recommended_agent = 'change'
+        recommended_agent = hits.first('ticket_agent', self.recommended_agent_keywords) or 'servicedesk'
         
         return {
             'title': message[:100] if len(message) <= 100 else message[:97] + '...',
@@ -406,6 +511,8 @@ class ServiceDeskAgent(BaseAgent):
         }
 
 class OSAgent(BaseAgent):
+    static_response = True
+    
     def __init__(self):
         super().__init__("OS Management Agent", ["os_deployment", "configuration_management", "hardening"])
     
@@ -0,0 +1,313 @@
+import heapq
+import itertools
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+import logging
+
+from .incident_records import IncidentRecord
+from .similarity_join import prefix_length
+
+logger = logging.getLogger(__name__)
+
+
+class _Node:
+    """Incidents sharing one token set; they are all linked to each other and to the same neighbors"""
+
+    __slots__ = ('key', 'tokens', 'members', 'neighbors', 'group')
+
+    def __init__(self, key: int, tokens: frozenset):
+        self.key = key
+        self.tokens = tokens
+        self.members: Set[int] = set()
+        self.neighbors: Set['_Node'] = set()
+        self.group: Optional['_Group'] = None
+
+
+class _Group:
+    """One connected component of the similarity graph with its running aggregates"""
+
+    __slots__ = ('nodes', 'members', 'symptoms', 'systems', 'severities', 'first', 'last')
+
+    def __init__(self):
+        self.nodes: Set[_Node] = set()
+        self.members: Set[int] = set()
+        self.symptoms: Counter = Counter()
+        self.systems: Counter = Counter()
+        self.severities: Counter = Counter()
+        # (seq, created_at) of the earliest and latest arrival
+        self.first = None
+        self.last = None
+
+    def add(self, seq: int, record: IncidentRecord):
+        self.members.add(seq)
+        self.symptoms.update(record.symptoms)
+        self.systems.update(set(record.affected_systems))
+        self.severities[record.severity] += 1
+        if self.first is None or seq < self.first[0]:
+            self.first = (seq, record.created_at)
+        if self.last is None or seq > self.last[0]:
+            self.last = (seq, record.created_at)
+
+    def absorb(self, other: '_Group'):
+        self.nodes |= other.nodes
+        self.members |= other.members
+        self.symptoms.update(other.symptoms)
+        self.systems.update(other.systems)
+        self.severities.update(other.severities)
+        self.first = min(self.first, other.first)
+        self.last = max(self.last, other.last)
+
+
+class OnlineProblemDetector:
+    """Incremental recurring-problem detection over a sliding time window.
+
+    Incidents are pushed as they arrive and expire once they fall out of the
+    window. Every incident is linked to the live incidents whose Jaccard
+    similarity exceeds the threshold when it is inserted; candidates come from the
+    postings of its rarest tokens (a prefix of length |a| - ceil(t|a|) + 1 in any
+    token order must hit every qualifying set), so links are exact. Incidents with
+    identical token sets share one graph node, so a burst of repeated alerts adds
+    members to a node instead of a quadratic number of links. Problem groups are
+    the connected components of the nodes. Inserts merge components
+    smaller-into-larger together with their symptom, system, severity and timing
+    aggregates; expiries only rebuild the components they touched. The live groups
+    are tracked directly, so a snapshot costs time proportional to the number of
+    groups, not incidents.
+    """
+
+    def __init__(self, analyzer, window_days: int = 30, correlation_threshold: Optional[float] = None,
+                 min_incident_count: Optional[int] = None):
+        self.analyzer = analyzer
+        self.window_seconds = window_days * 86400
+        self.window_days = window_days
+        self.correlation_threshold = (
+            analyzer.correlation_threshold if correlation_threshold is None else correlation_threshold
+        )
+        self.min_incident_count = (
+            analyzer.min_incident_count if min_incident_count is None else min_incident_count
+        )
+
+        self._sequence = itertools.count()
+        self._records: Dict[int, IncidentRecord] = {}
+        self._node_of: Dict[int, _Node] = {}
+        self._nodes_by_tokens: Dict[frozenset, _Node] = {}
+        self._postings: Dict[str, Set[_Node]] = defaultdict(set)
+        self._groups: Set[_Group] = set()
+        self._expiry: List = []
+        self._version = 0
+        self._snapshot_cache = None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def push(self, incidents: List[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, int]:
+        """Add incidents to the window; returns how many were accepted, rejected and expired"""
+        if now is None:
+            now = time.time()
+        expired = self.expire(now)
+        cutoff = now - self.window_seconds
+
+        accepted = outside_window = invalid = 0
+        for incident in incidents:
+            try:
+                record = IncidentRecord.from_incident(incident, now)
+            except (ValueError, TypeError) as e:
+                invalid += 1
+                logger.debug(f"Skipping invalid incident: {str(e)}")
+                continue
+            if record.created_at <= cutoff:
+                outside_window += 1
+                continue
+            self._insert(record)
+            accepted += 1
+
+        if accepted:
+            self._version += 1
+        return {
+            'accepted': accepted,
+            'outside_window': outside_window,
+            'invalid': invalid,
+            'expired': expired,
+            'live_incidents': len(self._records)
+        }
+
+    def _insert(self, record: IncidentRecord):
+        seq = next(self._sequence)
+        tokens = record.tokens
+        threshold = self.correlation_threshold
+        self._records[seq] = record
+        heapq.heappush(self._expiry, (record.created_at, seq))
+
+        # Identical non-empty sets have similarity 1, so they link whenever the threshold is below it
+        shared = bool(tokens) and threshold < 1
+        node = self._nodes_by_tokens.get(tokens) if shared else None
+        if node is not None:
+            node.members.add(seq)
+            node.group.add(seq, record)
+            self._node_of[seq] = node
+            return
+
+        node = _Node(seq, tokens)
+        node.members.add(seq)
+        self._node_of[seq] = node
+        if shared:
+            self._nodes_by_tokens[tokens] = node
+        if tokens:
+            postings = self._postings
+            probe = sorted(tokens, key=lambda token: len(postings.get(token, ())))
+            candidates = set()
+            for token in probe[:prefix_length(len(tokens), threshold)]:
+                candidates.update(postings.get(token, ()))
+            size = len(tokens)
+            for candidate in candidates:
+                other = candidate.tokens
+                # Inlined jaccard(); the comparison must stay identical to the batch join
+                overlap = len(tokens & other)
+                if overlap / (size + len(other) - overlap) > threshold:
+                    node.neighbors.add(candidate)
+                    candidate.neighbors.add(node)
+            for token in tokens:
+                postings[token].add(node)
+
+        group = _Group()
+        group.nodes.add(node)
+        group.add(seq, record)
+        node.group = group
+        self._groups.add(group)
+        for neighbor in node.neighbors:
+            other = neighbor.group
+            if other is group:
+                continue
+            if len(other.nodes) > len(group.nodes):
+                group, other = other, group
+            group.absorb(other)
+            self._groups.discard(other)
+            for member in other.nodes:
+                member.group = group
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop incidents that fell out of the window and rebuild the groups they belonged to"""
+        cutoff = (time.time() if now is None else now) - self.window_seconds
+        touched: Dict[int, _Group] = {}
+        expired = 0
+
+        while self._expiry and self._expiry[0][0] <= cutoff:
+            _, seq = heapq.heappop(self._expiry)
+            self._records.pop(seq)
+            node = self._node_of.pop(seq)
+            node.members.discard(seq)
+            group = node.group
+            touched[id(group)] = group
+            expired += 1
+            if node.members:
+                continue
+
+            for token in node.tokens:
+                posting = self._postings[token]
+                posting.discard(node)
+                if not posting:
+                    del self._postings[token]
+            for neighbor in node.neighbors:
+                neighbor.neighbors.discard(node)
+            if self._nodes_by_tokens.get(node.tokens) is node:
+                del self._nodes_by_tokens[node.tokens]
+            group.nodes.discard(node)
+
+        for group in touched.values():
+            self._groups.discard(group)
+            self._rebuild(group.nodes)
+
+        if expired:
+            self._version += 1
+        return expired
+
+    def _rebuild(self, nodes: Set[_Node]):
+        """Split what is left of a group into its connected components"""
+        remaining = set(nodes)
+        for start in sorted(nodes, key=lambda node: node.key):
+            if start not in remaining:
+                continue
+            group = _Group()
+            stack = [start]
+            remaining.discard(start)
+            while stack:
+                node = stack.pop()
+                group.nodes.add(node)
+                node.group = group
+                for seq in node.members:
+                    group.add(seq, self._records[seq])
+                for neighbor in node.neighbors:
+                    if neighbor in remaining:
+                        remaining.discard(neighbor)
+                        stack.append(neighbor)
+            self._groups.add(group)
+
+    async def snapshot(self, include_incidents: bool = False, now: Optional[float] = None) -> Dict[str, Any]:
+        """Current problem groups, patterns, root causes and recommendations for the window"""
+        self.expire(now)
+        cache_key = (self._version, include_incidents)
+        if self._snapshot_cache and self._snapshot_cache[0] == cache_key:
+            return self._snapshot_cache[1]
+
+        live = len(self._records)
+        groups = sorted(
+            (group for group in self._groups if len(group.members) >= self.min_incident_count),
+            key=lambda group: group.first[0]
+        )
+
+        problem_groups = []
+        patterns = {'temporal_patterns': [], 'system_patterns': [], 'severity_patterns': []}
+        for group in groups:
+            group_id = f"GRP-{group.first[0]}"
+            affected_systems = list(group.systems)
+            problem_group = {
+                'group_id': group_id,
+                'incident_count': len(group.members),
+                'common_symptoms': [symptom for symptom, count in group.symptoms.most_common(5)],
+                'affected_systems': affected_systems,
+                'frequency': len(group.members) / live,
+                'first_seen': datetime.fromtimestamp(group.first[1]).isoformat(),
+                'last_seen': datetime.fromtimestamp(group.last[1]).isoformat()
+            }
+            if include_incidents:
+                problem_group['incidents'] = [
+                    self._records[seq].summary() for seq in sorted(group.members)
+                ]
+            problem_groups.append(problem_group)
+
+            if len(group.members) > 1:
+                # Consecutive arrival gaps telescope to (last - first) / (n - 1)
+                average_interval = (group.last[1] - group.first[1]) / 3600 / (len(group.members) - 1)
+                patterns['temporal_patterns'].append({
+                    'group_id': group_id,
+                    'average_interval_hours': average_interval,
+                    'pattern_type': 'recurring' if average_interval < 168 else 'sporadic'
+                })
+            if affected_systems:
+                patterns['system_patterns'].append({
+                    'group_id': group_id,
+                    'affected_systems': affected_systems,
+                    'system_count': len(affected_systems)
+                })
+            patterns['severity_patterns'].append({
+                'group_id': group_id,
+                'severity_distribution': dict(group.severities),
+                'most_common_severity': group.severities.most_common(1)[0][0]
+            })
+
+        root_causes = await self.analyzer._identify_root_causes(problem_groups)
+        recommendations = await self.analyzer._generate_problem_recommendations(patterns, root_causes)
+
+        snapshot = {
+            'window_days': self.window_days,
+            'total_incidents': live,
+            'problem_groups': problem_groups,
+            'patterns': patterns,
+            'root_causes': root_causes,
+            'recommendations': recommendations,
+            'snapshot_timestamp': datetime.now().isoformat()
+        }
+        self._snapshot_cache = (cache_key, snapshot)
+        return snapshot
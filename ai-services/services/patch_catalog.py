@@ -0,0 +1,337 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Used when no catalog file is configured
+DEFAULT_PATCHES = [
+    {
+        'patch_id': 'KB5001234',
+        'title': 'Security Update for Windows',
+        'severity': 'critical',
+        'category': 'security',
+        'release_date': '2024-01-15',
+        'size_mb': 45,
+        'reboot_required': True,
+        'supersedes': ['KB5001200'],
+        'cve_list': ['CVE-2024-0001', 'CVE-2024-0002']
+    },
+    {
+        'patch_id': 'KB5001235',
+        'title': 'Cumulative Update for Windows',
+        'severity': 'important',
+        'category': 'update',
+        'release_date': '2024-01-10',
+        'size_mb': 120,
+        'reboot_required': True,
+        'supersedes': ['KB5001210'],
+        'cve_list': []
+    },
+    {
+        'patch_id': 'KB5001236',
+        'title': 'Feature Update',
+        'severity': 'moderate',
+        'category': 'feature',
+        'release_date': '2024-01-05',
+        'size_mb': 25,
+        'reboot_required': False,
+        'supersedes': [],
+        'cve_list': []
+    }
+]
+
+
+def _supersedence_closure(patches: Sequence[Dict[str, Any]]) -> Tuple[Tuple[str, ...], Dict[str, int]]:
+    """Map each patch_id to a bitmask of every patch_id it supersedes directly or transitively.
+
+    Returns the patch_id of each bit (catalog patches in catalog order, then
+    superseded IDs missing from the catalog) and the masks. Strongly connected
+    components are found with an iterative Tarjan walk, which emits them
+    dependencies-first, so each component's mask is the OR of masks that are
+    already final. Members of a component share one int, so a long supersedence
+    chain costs n bits per patch instead of a set of n strings. Cycles in bad
+    catalog data collapse into one component instead of recursing forever.
+    """
+    edges: Dict[str, Tuple[str, ...]] = {
+        patch['patch_id']: tuple(patch.get('supersedes') or ()) for patch in patches
+    }
+    bit_ids = list(edges)
+    bit_of = {patch_id: bit for bit, patch_id in enumerate(bit_ids)}
+    for targets in edges.values():
+        for target in targets:
+            if target not in bit_of:
+                bit_of[target] = len(bit_ids)
+                bit_ids.append(target)
+
+    index_of: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    on_stack = set()
+    stack: List[str] = []
+    component_of: Dict[str, int] = {}
+    closures: List[int] = []
+
+    for root in edges:
+        if root in index_of:
+            continue
+        work = [(root, iter(edges[root]))]
+        index_of[root] = lowlink[root] = len(index_of)
+        stack.append(root)
+        on_stack.add(root)
+
+        while work:
+            node, targets = work[-1]
+            advanced = False
+            for target in targets:
+                if target not in edges:
+                    continue
+                if target not in index_of:
+                    index_of[target] = lowlink[target] = len(index_of)
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(edges[target])))
+                    advanced = True
+                    break
+                if target in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[target])
+            if advanced:
+                continue
+
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] != index_of[node]:
+                continue
+
+            members = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                members.append(member)
+                if member == node:
+                    break
+
+            component = len(closures)
+            closure = 0
+            for member in members:
+                for target in edges[member]:
+                    closure |= 1 << bit_of[target]
+                    target_component = component_of.get(target)
+                    if target_component is not None:
+                        closure |= closures[target_component]
+            for member in members:
+                component_of[member] = component
+            closures.append(closure)
+
+    return tuple(bit_ids), {patch_id: closures[component] for patch_id, component in component_of.items()}
+
+
+class CatalogSnapshot:
+    """Immutable indexes over one version of the catalog, swapped in whole on reload"""
+
+    def __init__(self, patches: List[Dict[str, Any]], version: str):
+        self.version = version
+        self.loaded_at = datetime.now().isoformat()
+        self.patches: Tuple[Dict[str, Any], ...] = tuple(patches)
+        self.by_id: Dict[str, Dict[str, Any]] = {patch['patch_id']: patch for patch in self.patches}
+
+        # Patches without system_types apply to every system type
+        system_types = {
+            system_type.lower()
+            for patch in self.patches
+            for system_type in patch.get('system_types') or ()
+        }
+        typed: Dict[str, List[Dict[str, Any]]] = {system_type: [] for system_type in system_types}
+        generic: List[Dict[str, Any]] = []
+        for patch in self.patches:
+            targets = patch.get('system_types')
+            if targets:
+                for system_type in {target.lower() for target in targets}:
+                    typed[system_type].append(patch)
+            else:
+                generic.append(patch)
+                for type_patches in typed.values():
+                    type_patches.append(patch)
+        self.generic: Tuple[Dict[str, Any], ...] = tuple(generic)
+        self.by_system_type: Dict[str, Tuple[Dict[str, Any], ...]] = {
+            system_type: tuple(type_patches) for system_type, type_patches in typed.items()
+        }
+
+        # Bit i of a mask stands for superseded_ids[i]
+        self.superseded_ids, self.superseded = _supersedence_closure(self.patches)
+        self.superseded_bit: Dict[str, int] = {patch_id: bit for bit, patch_id in enumerate(self.superseded_ids)}
+
+    def superseded_mask(self, installed: Iterable[str]) -> int:
+        """Bitmask of every patch made obsolete by the installed patches"""
+        superseded = self.superseded
+        mask = 0
+        for patch_id in installed:
+            mask |= superseded.get(patch_id, 0)
+        return mask
+
+    def mask_ids(self, mask: int) -> FrozenSet[str]:
+        """The patch_ids whose bits are set in a mask"""
+        bits = bin(mask)[:1:-1]
+        return frozenset(self.superseded_ids[bit] for bit, flag in enumerate(bits) if flag == '1')
+
+
+class PatchCatalog:
+    """Patch catalog loaded once and indexed by patch_id and system_type.
+
+    The transitive supersedence closure is precomputed at load time as one bitmask
+    per patch, so the patches made obsolete by a host's installed patches are an OR
+    of precomputed masks and missing patches are a single pass over the applicable
+    catalog. When
+    backed by a file, refresh() reloads it once the file's mtime or size changes,
+    checking at most every check_interval seconds. Each load builds a new snapshot
+    that replaces the old one in a single assignment, so readers never see a
+    half-built index.
+    """
+
+    def __init__(self, path: Optional[str] = None, patches: Optional[List[Dict[str, Any]]] = None,
+                 check_interval: float = 30.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._file_signature: Optional[Tuple[float, int]] = None
+        self._next_check = 0.0
+
+        if path:
+            self._snapshot = self._load_file(path)
+        else:
+            source = patches if patches is not None else DEFAULT_PATCHES
+            self._snapshot = CatalogSnapshot(list(source), self._fingerprint(source))
+
+    @classmethod
+    def from_env(cls) -> 'PatchCatalog':
+        """Build the catalog from PATCH_CATALOG_PATH, falling back to the built-in patches"""
+        return cls(
+            path=os.getenv('PATCH_CATALOG_PATH') or None,
+            check_interval=float(os.getenv('PATCH_CATALOG_CHECK_SECONDS', '30'))
+        )
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        """The current immutable catalog indexes"""
+        return self._snapshot
+
+    @property
+    def version(self) -> str:
+        """Content hash of the loaded catalog; changes whenever a reload changes its contents"""
+        return self._snapshot.version
+
+    def __len__(self) -> int:
+        return len(self._snapshot.patches)
+
+    @staticmethod
+    def _fingerprint(payload: Any) -> str:
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha1(payload).hexdigest()[:16]
+
+    def _load_file(self, path: str) -> CatalogSnapshot:
+        started = time.perf_counter()
+        stat = os.stat(path)
+        with open(path, 'rb') as handle:
+            raw = handle.read()
+
+        if path.endswith('.jsonl'):
+            patches = [json.loads(line) for line in raw.splitlines() if line.strip()]
+        else:
+            document = json.loads(raw)
+            patches = document['patches'] if isinstance(document, dict) else document
+
+        snapshot = CatalogSnapshot(patches, self._fingerprint(raw))
+        self._file_signature = (stat.st_mtime, stat.st_size)
+        logger.info(
+            f"Loaded patch catalog {path} version {snapshot.version}: {len(snapshot.patches)} patches "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+        return snapshot
+
+    def refresh(self) -> bool:
+        """Reload the catalog file if it changed; returns True when a new version was loaded"""
+        if not self.path:
+            return False
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+            try:
+                stat = os.stat(self.path)
+                if (stat.st_mtime, stat.st_size) == self._file_signature:
+                    return False
+                snapshot = self._load_file(self.path)
+            except Exception as e:
+                # Keep serving the last good catalog
+                logger.error(f"Error reloading patch catalog {self.path}: {str(e)}")
+                return False
+
+            changed = snapshot.version != self._snapshot.version
+            self._snapshot = snapshot
+            return changed
+
+    def reload(self) -> bool:
+        """Force a reload check on the next refresh"""
+        self._next_check = 0.0
+        self._file_signature = None
+        return self.refresh()
+
+    def get(self, patch_id: str) -> Optional[Dict[str, Any]]:
+        return self._snapshot.by_id.get(patch_id)
+
+    def patches_for(self, system_type: Optional[str]) -> Tuple[Dict[str, Any], ...]:
+        """Patches applicable to a system type, in catalog order"""
+        snapshot = self._snapshot
+        if not system_type:
+            return snapshot.patches
+        return snapshot.by_system_type.get(system_type.lower(), snapshot.generic)
+
+    def system_types(self) -> List[str]:
+        return sorted(self._snapshot.by_system_type)
+
+    def superseded_by(self, installed: Iterable[str]) -> FrozenSet[str]:
+        """Every patch_id made obsolete by the installed patches"""
+        snapshot = self._snapshot
+        return snapshot.mask_ids(snapshot.superseded_mask(installed))
+
+    def missing(self, installed: Iterable[str],
+                available: Optional[Sequence[Dict[str, Any]]] = None,
+                system_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Available patches that are neither installed nor superseded by an installed patch"""
+        installed = installed if isinstance(installed, (set, frozenset)) else set(installed)
+        snapshot = self._snapshot
+        if available is None:
+            available = self.patches_for(system_type)
+        # Bit flags lowest first, so flags[bit] == '1' for every superseded patch
+        flags = bin(snapshot.superseded_mask(installed))[:1:-1]
+        bit_of = snapshot.superseded_bit
+        missing = []
+        for patch in available:
+            patch_id = patch['patch_id']
+            if patch_id in installed:
+                continue
+            bit = bit_of.get(patch_id, len(flags))
+            if bit >= len(flags) or flags[bit] != '1':
+                missing.append(patch)
+        return missing
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version,
+            'path': self.path,
+            'patch_count': len(snapshot.patches),
+            'system_types': sorted(snapshot.by_system_type),
+            'loaded_at': snapshot.loaded_at
+        }
@@ -1,12 +1,19 @@
 import asyncio
-from typing import Dict, List, Any
+import os
+from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import logging
+from .patch_catalog import PatchCatalog
+from .fleet_patch_analysis import FleetPatchAnalyzer
+from .result_cache import AsyncResultCache
+from .profiling import span
 
 logger = logging.getLogger(__name__)
 
 class PatchIntelligence:
-    def __init__(self):
+    def __init__(self, catalog: Optional[PatchCatalog] = None):
+        self.catalog = catalog if catalog is not None else PatchCatalog.from_env()
+        
         self.criticality_scores = {
             'critical': 10,
             'important': 7,
@@ -20,7 +27,22 @@ class PatchIntelligence:
             'development': 1.0,
             'test': 0.8
         }
+        
+        self.fleet_analyzer = FleetPatchAnalyzer(
+            self.catalog,
+            self.criticality_scores,
+            self.system_priorities,
+            chunk_size=int(os.getenv('PATCH_FLEET_CHUNK_SIZE', '256'))
+        )
+        
+        # Recommendations keyed by (system_id, catalog version)
+        self.recommendation_cache = AsyncResultCache(
+            max_entries=int(os.getenv('PATCH_RECOMMENDATION_CACHE_SIZE', '10000')),
+            ttl_seconds=float(os.getenv('PATCH_RECOMMENDATION_TTL_SECONDS', '300'))
+        )
+        self._recommendation_catalog_version = self.catalog.version
 
+    @span
     async def analyze_patch_requirements(self, system_id: str, current_patches: List[str], 
                                        system_type: str, criticality_level: str) -> Dict[str, Any]:
         """Analyze patch requirements for a system"""
@@ -57,96 +79,65 @@ class PatchIntelligence:
             logger.error(f"Error analyzing patch requirements: {str(e)}")
             raise
 
+    @span
     async def get_patch_recommendations(self, system_id: str) -> Dict[str, Any]:
         """Get patch recommendations for a specific system"""
         try:
-            # Mock system data - in real implementation, this would query actual system info
-            system_info = await self._get_system_info(system_id)
-            
-            # Get patch intelligence
-            intelligence = await self._gather_patch_intelligence(system_info)
-            
-            # Generate recommendations
-            recommendations = await self._generate_recommendations(intelligence, system_info)
+            self.catalog.refresh()
+            version = self.catalog.version
+            if version != self._recommendation_catalog_version:
+                # Entries for older catalog versions can never be hit again
+                self.recommendation_cache.clear()
+                self._recommendation_catalog_version = version
             
-            return {
-                'system_id': system_id,
-                'recommendations': recommendations,
-                'priority_patches': intelligence.get('priority_patches', []),
-                'maintenance_window': await self._suggest_maintenance_window(system_info),
-                'rollback_plan': await self._create_rollback_plan(system_info),
-                'testing_requirements': await self._define_testing_requirements(intelligence),
-                'generated_at': datetime.now().isoformat()
-            }
+            return await self.recommendation_cache.get_or_compute(
+                (system_id, version),
+                lambda: self._build_patch_recommendations(system_id)
+            )
             
         except Exception as e:
             logger.error(f"Error getting patch recommendations: {str(e)}")
             raise
 
+    def invalidate_system(self, system_id: str) -> bool:
+        """Drop cached results for a system whose CMDB record changed"""
+        return self.recommendation_cache.invalidate((system_id, self._recommendation_catalog_version))
+
+    @span
+    async def _build_patch_recommendations(self, system_id: str) -> Dict[str, Any]:
+        # Mock system data - in real implementation, this would query actual system info
+        system_info = await self._get_system_info(system_id)
+        
+        # Get patch intelligence
+        intelligence = await self._gather_patch_intelligence(system_info)
+        
+        # Generate recommendations
+        recommendations = await self._generate_recommendations(intelligence, system_info)
+        
+        return {
+            'system_id': system_id,
+            'recommendations': recommendations,
+            'priority_patches': intelligence.get('priority_patches', []),
+            'maintenance_window': await self._suggest_maintenance_window(system_info),
+            'rollback_plan': await self._create_rollback_plan(system_info),
+            'testing_requirements': await self._define_testing_requirements(intelligence),
+            'catalog_version': self.catalog.version,
+            'generated_at': datetime.now().isoformat()
+        }
+
+    @span
     async def _get_available_patches(self, system_type: str) -> List[Dict[str, Any]]:
         """Get available patches for system type"""
-        # Mock patch data - in real implementation, this would query patch repositories
-        patches = [
-            {
-                'patch_id': 'KB5001234',
-                'title': 'Security Update for Windows',
-                'severity': 'critical',
-                'category': 'security',
-                'release_date': '2024-01-15',
-                'size_mb': 45,
-                'reboot_required': True,
-                'supersedes': ['KB5001200'],
-                'cve_list': ['CVE-2024-0001', 'CVE-2024-0002']
-            },
-            {
-                'patch_id': 'KB5001235',
-                'title': 'Cumulative Update for Windows',
-                'severity': 'important',
-                'category': 'update',
-                'release_date': '2024-01-10',
-                'size_mb': 120,
-                'reboot_required': True,
-                'supersedes': ['KB5001210'],
-                'cve_list': []
-            },
-            {
-                'patch_id': 'KB5001236',
-                'title': 'Feature Update',
-                'severity': 'moderate',
-                'category': 'feature',
-                'release_date': '2024-01-05',
-                'size_mb': 25,
-                'reboot_required': False,
-                'supersedes': [],
-                'cve_list': []
-            }
-        ]
-        
-        return patches
+        self.catalog.refresh()
+        return list(self.catalog.patches_for(system_type))
 
+    @span
     async def _identify_missing_patches(self, current_patches: List[str], 
                                       available_patches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Identify patches that are missing from the system"""
-        missing = []
-        
-        for patch in available_patches:
-            if patch['patch_id'] not in current_patches:
-                # Check if superseded by installed patch
-                superseded = False
-                for installed in current_patches:
-                    for available in available_patches:
-                        if (available['patch_id'] == installed and 
-                            patch['patch_id'] in available.get('supersedes', [])):
-                            superseded = True
-                            break
-                    if superseded:
-                        break
-                
-                if not superseded:
-                    missing.append(patch)
-        
-        return missing
+        return self.catalog.missing(current_patches, available_patches)
 
+    @span
     async def _assess_patch_criticality(self, missing_patches: List[Dict[str, Any]], 
                                       criticality_level: str) -> Dict[str, Any]:
         """Assess criticality of missing patches"""
@@ -188,6 +179,7 @@ class PatchIntelligence:
         
         return assessment
 
+    @span
     async def _generate_patch_schedule(self, patch_assessment: Dict[str, Any], 
                                      system_id: str) -> Dict[str, Any]:
         """Generate recommended patch deployment schedule"""
@@ -238,6 +230,7 @@ class PatchIntelligence:
         
         return schedule
 
+    @span
     async def _calculate_risk_scores(self, missing_patches: List[Dict[str, Any]], 
                                    criticality_level: str) -> Dict[str, Any]:
         """Calculate risk scores for missing patches"""
@@ -278,6 +271,7 @@ class PatchIntelligence:
             'risk_level': 'High' if overall_risk > 70 else 'Medium' if overall_risk > 40 else 'Low'
         }
 
+    @span
     async def _check_compliance_status(self, missing_patches: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Check compliance status based on missing patches"""
         security_patches_overdue = 0
@@ -315,6 +309,7 @@ class PatchIntelligence:
             'patch_group': 'Group-A'
         }
 
+    @span
     async def _gather_patch_intelligence(self, system_info: Dict[str, Any]) -> Dict[str, Any]:
         """Gather patch intelligence for system"""
         return {
@@ -335,6 +330,7 @@ class PatchIntelligence:
             ]
         }
 
+    @span
     async def _generate_recommendations(self, intelligence: Dict[str, Any], 
                                       system_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generate patch recommendations"""
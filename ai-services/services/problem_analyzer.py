@@ -1,32 +1,66 @@
 import asyncio
-from typing import Dict, List, Any
+import time
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import Counter
 import logging
 
+import numpy as np
+
+from .similarity_join import jaccard, jaccard_components
+from .incident_records import IncidentRecord, SEVERITY_NAMES
+from .profiling import span
+
 logger = logging.getLogger(__name__)
 
+
+def _epoch_micros(records: List[IncidentRecord]) -> np.ndarray:
+    """Creation times as integer microseconds, so differences are exact like datetime arithmetic"""
+    seconds = np.fromiter((record.created_at for record in records), dtype=np.float64, count=len(records))
+    return np.rint(seconds * 1e6).astype(np.int64)
+
+
+def _hours(micros) -> np.ndarray:
+    return np.asarray(micros) / 1e6 / 3600
+
+
+def _isoformat(micros: int) -> str:
+    micros = int(micros)
+    return datetime.fromtimestamp(micros // 1_000_000).replace(microsecond=micros % 1_000_000).isoformat()
+
+
+def _severity_distribution(records: List[IncidentRecord]) -> Tuple[Dict[str, int], str]:
+    """Severity counts in first-seen order and the most common severity"""
+    if not records:
+        return {}, 'medium'
+    codes = np.fromiter((record.severity_code for record in records), dtype=np.int64, count=len(records))
+    values, first_seen, counts = np.unique(codes, return_index=True, return_counts=True)
+    distribution = {SEVERITY_NAMES[values[i]]: int(counts[i]) for i in np.argsort(first_seen)}
+    return distribution, max(distribution, key=distribution.get)
+
 class ProblemAnalyzer:
     def __init__(self):
         self.correlation_threshold = 0.7
         self.min_incident_count = 3
         
+    @span
     async def analyze_recurring_problems(self, incidents: List[Dict[str, Any]], 
                                        timeframe_days: int = 30) -> Dict[str, Any]:
         """Analyze incidents to identify recurring problems"""
         try:
-            # Filter incidents by timeframe
-            cutoff_date = datetime.now() - timedelta(days=timeframe_days)
-            recent_incidents = [
-                inc for inc in incidents 
-                if datetime.fromisoformat(inc.get('created_date', datetime.now().isoformat())) > cutoff_date
-            ]
+            # Parse every incident once, then filter by timeframe
+            now = time.time()
+            records = [IncidentRecord.from_incident(inc, now) for inc in incidents]
+            created = np.fromiter((record.created_at for record in records), dtype=np.float64, count=len(records))
+            recent = np.flatnonzero(created > now - timeframe_days * 86400)
+            recent_incidents = [incidents[i] for i in recent]
+            recent_records = [records[i] for i in recent]
             
             # Group incidents by similarity
-            problem_groups = await self._group_similar_incidents(recent_incidents)
+            problem_groups, group_records = await self._group_similar_incidents(recent_records, recent_incidents)
             
             # Analyze patterns
-            patterns = await self._analyze_patterns(problem_groups)
+            patterns = await self._analyze_patterns(problem_groups, group_records)
             
             # Identify root causes
             root_causes = await self._identify_root_causes(problem_groups)
@@ -49,14 +83,47 @@ class ProblemAnalyzer:
             logger.error(f"Error analyzing recurring problems: {str(e)}")
             raise
 
+    @span
+    async def analyze_incident_records(self, records: List[IncidentRecord], timeframe_days: int = 30,
+                                       ingestion: Dict[str, int] = None) -> Dict[str, Any]:
+        """Analyze recurring problems over compact records already filtered to the timeframe"""
+        try:
+            problem_groups, group_records = await self._group_similar_incidents(records)
+            patterns = await self._analyze_patterns(problem_groups, group_records)
+            root_causes = await self._identify_root_causes(problem_groups)
+            recommendations = await self._generate_problem_recommendations(patterns, root_causes)
+            
+            analysis = {
+                'analysis_id': f"PROB-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                'timeframe_days': timeframe_days,
+                'total_incidents': len(records),
+                'problem_groups': problem_groups,
+                'patterns': patterns,
+                'root_causes': root_causes,
+                'recommendations': recommendations,
+                'analysis_timestamp': datetime.now().isoformat()
+            }
+            if ingestion is not None:
+                analysis['ingestion'] = ingestion
+            return analysis
+            
+        except Exception as e:
+            logger.error(f"Error analyzing incident records: {str(e)}")
+            raise
+
+    @span
     async def find_root_cause(self, incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Perform root cause analysis on a group of incidents"""
         try:
+            now = time.time()
+            records = [IncidentRecord.from_incident(inc, now) for inc in incidents]
+            created_micros = _epoch_micros(records)
+            
             # Analyze common factors
-            common_factors = await self._find_common_factors(incidents)
+            common_factors = await self._find_common_factors(records, created_micros)
             
             # Analyze timeline patterns
-            timeline_analysis = await self._analyze_timeline_patterns(incidents)
+            timeline_analysis = await self._analyze_timeline_patterns(created_micros)
             
             # Identify potential root causes
             potential_causes = await self._identify_potential_causes(common_factors, timeline_analysis)
@@ -79,82 +146,69 @@ class ProblemAnalyzer:
             logger.error(f"Error in root cause analysis: {str(e)}")
             raise
 
-    async def _group_similar_incidents(self, incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Group incidents by similarity"""
+    @span
+    async def _group_similar_incidents(self, records: List[IncidentRecord],
+                                       incidents: Optional[List[Dict[str, Any]]] = None
+                                       ) -> Tuple[List[Dict[str, Any]], List[List[IncidentRecord]]]:
+        """Group incidents by similarity.
+        
+        Groups list the original incidents when they are given and compact record
+        summaries otherwise. The member records of each group are returned alongside.
+        """
         groups = []
-        processed_incidents = set()
+        group_records = []
+        
+        # Link every pair above the threshold
+        union_find = jaccard_components([record.tokens for record in records], self.correlation_threshold)
         
-        for i, incident in enumerate(incidents):
-            if i in processed_incidents:
+        for members in union_find.components():
+            if len(members) < self.min_incident_count:
                 continue
-                
-            similar_group = [incident]
-            processed_incidents.add(i)
             
-            for j, other_incident in enumerate(incidents[i+1:], i+1):
-                if j in processed_incidents:
-                    continue
-                    
-                similarity = await self._calculate_similarity(incident, other_incident)
-                if similarity > self.correlation_threshold:
-                    similar_group.append(other_incident)
-                    processed_incidents.add(j)
-            
-            if len(similar_group) >= self.min_incident_count:
-                groups.append({
-                    'group_id': f"GRP-{len(groups)+1}",
-                    'incident_count': len(similar_group),
-                    'incidents': similar_group,
-                    'common_symptoms': await self._extract_common_symptoms(similar_group),
-                    'affected_systems': await self._get_affected_systems(similar_group),
-                    'frequency': len(similar_group) / len(incidents)
-                })
+            member_records = [records[i] for i in members]
+            groups.append({
+                'group_id': f"GRP-{len(groups)+1}",
+                'incident_count': len(member_records),
+                'incidents': (
+                    [incidents[i] for i in members] if incidents is not None
+                    else [record.summary() for record in member_records]
+                ),
+                'common_symptoms': await self._extract_common_symptoms(member_records),
+                'affected_systems': await self._get_affected_systems(member_records),
+                'frequency': len(member_records) / len(records)
+            })
+            group_records.append(member_records)
         
-        return groups
+        return groups, group_records
+
+    def _tokenize_incident(self, incident: Dict[str, Any]) -> frozenset:
+        """Word set used for incident similarity"""
+        text = f"{incident.get('title', '')} {incident.get('description', '')}".lower()
+        return frozenset(text.split())
 
     async def _calculate_similarity(self, incident1: Dict[str, Any], incident2: Dict[str, Any]) -> float:
         """Calculate similarity score between two incidents"""
         # Simple similarity based on title and description keywords
-        text1 = f"{incident1.get('title', '')} {incident1.get('description', '')}".lower()
-        text2 = f"{incident2.get('title', '')} {incident2.get('description', '')}".lower()
-        
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        intersection = len(words1.intersection(words2))
-        union = len(words1.union(words2))
-        
-        return intersection / union if union > 0 else 0.0
+        return jaccard(self._tokenize_incident(incident1), self._tokenize_incident(incident2))
 
-    async def _extract_common_symptoms(self, incidents: List[Dict[str, Any]]) -> List[str]:
+    @span
+    async def _extract_common_symptoms(self, records: List[IncidentRecord]) -> List[str]:
         """Extract common symptoms from a group of incidents"""
-        all_symptoms = []
-        for incident in incidents:
-            symptoms = incident.get('symptoms', [])
-            if isinstance(symptoms, list):
-                all_symptoms.extend(symptoms)
-            else:
-                # Extract from description if symptoms not available
-                description = incident.get('description', '')
-                all_symptoms.extend(description.split())
-        
-        # Count frequency and return most common
-        symptom_counts = Counter(all_symptoms)
+        # Records fall back to description words when symptoms are not available
+        symptom_counts = Counter(symptom for record in records for symptom in record.symptoms)
         return [symptom for symptom, count in symptom_counts.most_common(5)]
 
-    async def _get_affected_systems(self, incidents: List[Dict[str, Any]]) -> List[str]:
+    @span
+    async def _get_affected_systems(self, records: List[IncidentRecord]) -> List[str]:
         """Get list of affected systems from incidents"""
         systems = set()
-        for incident in incidents:
-            affected = incident.get('affected_systems', [])
-            if isinstance(affected, list):
-                systems.update(affected)
+        for record in records:
+            systems.update(record.affected_systems)
         return list(systems)
 
-    async def _analyze_patterns(self, problem_groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @span
+    async def _analyze_patterns(self, problem_groups: List[Dict[str, Any]],
+                                group_records: Optional[List[List[IncidentRecord]]] = None) -> Dict[str, Any]:
         """Analyze patterns in problem groups"""
         patterns = {
             'temporal_patterns': [],
@@ -162,16 +216,16 @@ class ProblemAnalyzer:
             'severity_patterns': []
         }
         
-        for group in problem_groups:
-            incidents = group['incidents']
+        for position, group in enumerate(problem_groups):
+            if group_records is not None:
+                records = group_records[position]
+            else:
+                records = [IncidentRecord.from_incident(inc) for inc in group['incidents']]
             
-            # Temporal patterns
-            times = [datetime.fromisoformat(inc.get('created_date', datetime.now().isoformat())) 
-                    for inc in incidents]
-            if len(times) > 1:
-                time_diffs = [(times[i+1] - times[i]).total_seconds() / 3600 
-                             for i in range(len(times)-1)]
-                avg_interval = sum(time_diffs) / len(time_diffs)
+            # Temporal patterns: gaps between consecutive incidents in group order
+            created_micros = _epoch_micros(records)
+            if len(created_micros) > 1:
+                avg_interval = float(_hours(np.diff(created_micros)).mean())
                 patterns['temporal_patterns'].append({
                     'group_id': group['group_id'],
                     'average_interval_hours': avg_interval,
@@ -188,22 +242,21 @@ class ProblemAnalyzer:
                 })
             
             # Severity patterns
-            severities = [inc.get('severity', 'medium') for inc in incidents]
-            severity_counts = Counter(severities)
+            severity_distribution, most_common_severity = _severity_distribution(records)
             patterns['severity_patterns'].append({
                 'group_id': group['group_id'],
-                'severity_distribution': dict(severity_counts),
-                'most_common_severity': severity_counts.most_common(1)[0][0] if severity_counts else 'medium'
+                'severity_distribution': severity_distribution,
+                'most_common_severity': most_common_severity
             })
         
         return patterns
 
+    @span
     async def _identify_root_causes(self, problem_groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Identify potential root causes for problem groups"""
         root_causes = []
         
         for group in problem_groups:
-            incidents = group['incidents']
             common_symptoms = group['common_symptoms']
             affected_systems = group['affected_systems']
             
@@ -251,53 +304,46 @@ class ProblemAnalyzer:
         
         return root_causes
 
-    async def _find_common_factors(self, incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @span
+    async def _find_common_factors(self, records: List[IncidentRecord],
+                                   created_micros: np.ndarray) -> Dict[str, Any]:
         """Find common factors across incidents"""
         # Extract common systems
-        all_systems = []
-        for incident in incidents:
-            systems = incident.get('affected_systems', [])
-            all_systems.extend(systems)
-        
-        system_counts = Counter(all_systems)
+        system_counts = Counter(system for record in records for system in record.affected_systems)
         
         # Extract common timeframes
-        times = [datetime.fromisoformat(inc.get('created_date', datetime.now().isoformat())) 
-                for inc in incidents]
+        start, end = created_micros.min(), created_micros.max()
         
         # Extract common severities
-        severities = [inc.get('severity', 'medium') for inc in incidents]
-        severity_counts = Counter(severities)
+        severity_distribution, most_common_severity = _severity_distribution(records)
         
         return {
             'common_systems': [sys for sys, count in system_counts.most_common(3)],
             'time_range': {
-                'start': min(times).isoformat(),
-                'end': max(times).isoformat(),
-                'span_hours': (max(times) - min(times)).total_seconds() / 3600
+                'start': _isoformat(start),
+                'end': _isoformat(end),
+                'span_hours': float(_hours(end - start))
             },
-            'severity_distribution': dict(severity_counts),
-            'most_common_severity': severity_counts.most_common(1)[0][0] if severity_counts else 'medium'
+            'severity_distribution': severity_distribution,
+            'most_common_severity': most_common_severity
         }
 
-    async def _analyze_timeline_patterns(self, incidents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    @span
+    async def _analyze_timeline_patterns(self, created_micros: np.ndarray) -> Dict[str, Any]:
         """Analyze timeline patterns in incidents"""
-        times = [datetime.fromisoformat(inc.get('created_date', datetime.now().isoformat())) 
-                for inc in incidents]
-        times.sort()
-        
         # Calculate intervals
-        intervals = [(times[i+1] - times[i]).total_seconds() / 3600 
-                    for i in range(len(times)-1)]
+        ordered = np.sort(created_micros)
+        intervals = _hours(np.diff(ordered))
         
         return {
-            'incident_count': len(incidents),
-            'time_span_hours': (max(times) - min(times)).total_seconds() / 3600 if len(times) > 1 else 0,
-            'average_interval_hours': sum(intervals) / len(intervals) if intervals else 0,
-            'intervals': intervals,
-            'pattern_type': 'burst' if len(intervals) > 0 and max(intervals) < 24 else 'distributed'
+            'incident_count': len(ordered),
+            'time_span_hours': float(_hours(ordered[-1] - ordered[0])) if len(ordered) > 1 else 0,
+            'average_interval_hours': float(intervals.mean()) if len(intervals) else 0,
+            'intervals': intervals.tolist(),
+            'pattern_type': 'burst' if len(intervals) > 0 and intervals.max() < 24 else 'distributed'
         }
 
+    @span
     async def _identify_potential_causes(self, common_factors: Dict[str, Any], 
                                        timeline_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Identify potential root causes based on analysis"""
@@ -333,6 +379,7 @@ class ProblemAnalyzer:
         
         return causes
 
+    @span
     async def _rank_root_causes(self, potential_causes: List[Dict[str, Any]], 
                               incidents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Rank potential root causes by likelihood"""
@@ -384,6 +431,7 @@ class ProblemAnalyzer:
         # Remove duplicates while preserving order
         return list(dict.fromkeys(steps))
 
+    @span
     async def _generate_problem_recommendations(self, patterns: Dict[str, Any], 
                                              root_causes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Generate recommendations based on problem analysis"""
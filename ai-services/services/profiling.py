@@ -0,0 +1,205 @@
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Frame:
+    """One open span of a sampled request"""
+
+    __slots__ = ('profile', 'path', 'started', 'children')
+
+    def __init__(self, profile: Dict[Tuple[str, ...], float], path: Tuple[str, ...]):
+        self.profile = profile
+        self.path = path
+        self.started = time.perf_counter()
+        # Time spent in child spans, subtracted to get this span's self time
+        self.children = 0.0
+
+
+# Innermost open span of the current request; None when the request is not sampled
+_active_frame: ContextVar[Optional[_Frame]] = ContextVar('profile_frame', default=None)
+
+
+def _close(frame: _Frame, parent: _Frame):
+    elapsed = time.perf_counter() - frame.started
+    parent.children += elapsed
+    # Children running concurrently (gather) can add up to more than the span itself
+    self_time = max(elapsed - frame.children, 0.0)
+    frame.profile[frame.path] = frame.profile.get(frame.path, 0.0) + self_time
+
+
+def open_profile() -> Tuple[_Frame, Any]:
+    """Open a root frame with an empty profile in the current context"""
+    frame = _Frame({}, ())
+    return frame, _active_frame.set(frame)
+
+
+def close_profile(frame: _Frame, token: Any) -> Dict[Tuple[str, ...], float]:
+    """Close a root frame and return its profile of span path -> self seconds"""
+    _active_frame.reset(token)
+    elapsed = time.perf_counter() - frame.started
+    frame.profile[()] = frame.profile.get((), 0.0) + max(elapsed - frame.children, 0.0)
+    return frame.profile
+
+
+def is_sampled() -> bool:
+    """Whether the current context belongs to a sampled request"""
+    return _active_frame.get() is not None
+
+
+def merge_profile(profile: Dict[Tuple[str, ...], float]):
+    """Add a profile recorded elsewhere, e.g. in a worker process, under the current span"""
+    parent = _active_frame.get()
+    if parent is None:
+        return
+    for path, seconds in profile.items():
+        key = parent.path + path
+        parent.profile[key] = parent.profile.get(key, 0.0) + seconds
+    # The caller spent that time waiting, so it is not the caller's self time
+    parent.children += sum(profile.values())
+
+
+def span(name: Any = None) -> Callable:
+    """Time a function as a span of the sampled request's profile.
+
+    Use as @span or @span('label'); the default label is the function's qualified
+    name. Outside a sampled request the wrapper only checks a context variable.
+    """
+    def decorate(function: Callable) -> Callable:
+        label = name if isinstance(name, str) else function.__qualname__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                parent = _active_frame.get()
+                if parent is None:
+                    return await function(*args, **kwargs)
+                frame = _Frame(parent.profile, parent.path + (label,))
+                token = _active_frame.set(frame)
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    _active_frame.reset(token)
+                    _close(frame, parent)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            parent = _active_frame.get()
+            if parent is None:
+                return function(*args, **kwargs)
+            frame = _Frame(parent.profile, parent.path + (label,))
+            token = _active_frame.set(frame)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _active_frame.reset(token)
+                _close(frame, parent)
+        return wrapper
+
+    if callable(name):
+        return decorate(name)
+    return decorate
+
+
+class Profiler:
+    """Samples requests and aggregates their span timings as collapsed stacks.
+
+    Each sampled request gets a root frame in a context variable; @span-decorated
+    calls made while handling it record their self time under their call path.
+    Finished requests are merged into one table of "root;span;span" -> seconds,
+    which flamegraph.pl, speedscope and similar tools read directly.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, max_stacks: int = 10000):
+        self.sample_rate = sample_rate
+        self.max_stacks = max_stacks
+        self._stacks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.sampled_requests = 0
+        self.dropped_stacks = 0
+
+    @classmethod
+    def from_env(cls) -> 'Profiler':
+        return cls(
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+            max_stacks=int(os.getenv('PROFILE_MAX_STACKS', '10000'))
+        )
+
+    def should_sample(self) -> bool:
+        rate = self.sample_rate
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def start(self) -> Tuple[_Frame, Any]:
+        """Open the root frame of a sampled request in the current context"""
+        return open_profile()
+
+    def finish(self, root: str, frame: _Frame, token: Any):
+        """Close the root frame and merge the request's spans into the aggregate"""
+        profile = close_profile(frame, token)
+
+        with self._lock:
+            self.sampled_requests += 1
+            for path, seconds in profile.items():
+                key = ';'.join((root,) + path)
+                if key not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    self.dropped_stacks += 1
+                    continue
+                self._stacks[key] = self._stacks.get(key, 0.0) + seconds
+
+    def collapsed(self) -> str:
+        """Aggregated stacks, one "frame;frame;frame microseconds" line each"""
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        return ''.join(f"{key.replace(' ', '_')} {round(seconds * 1e6)}\n" for key, seconds in stacks)
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.sampled_requests = 0
+            self.dropped_stacks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sample_rate': self.sample_rate,
+            'sampled_requests': self.sampled_requests,
+            'stacks': len(self._stacks),
+            'max_stacks': self.max_stacks,
+            'dropped_stacks': self.dropped_stacks
+        }
+
+
+profiler = Profiler.from_env()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles a sampled fraction of HTTP requests.
+
+    Stacks are rooted at "METHOD /route/template". Calls run on the analysis
+    thread pool keep the request's context; calls shipped to worker processes
+    record their spans in the worker and merge them back under the caller.
+    """
+
+    def __init__(self, app, profiler: Profiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.profiler.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        frame, token = self.profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = scope.get('route')
+            self.profiler.finish(f"{scope['method']} {getattr(route, 'path', 'unmatched')}", frame, token)
@@ -0,0 +1,145 @@
+import importlib
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Builds a service from the resolved class (or other module attribute) and the registry
+ServiceFactory = Callable[[Any, 'ServiceRegistry'], Any]
+
+
+class LazyService:
+    """Stand-in that builds the named service on first attribute access"""
+
+    __slots__ = ('_registry', '_name', '_instance')
+
+    def __init__(self, registry: 'ServiceRegistry', name: str):
+        self._registry = registry
+        self._name = name
+        self._instance = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        instance = self._instance
+        if instance is None:
+            instance = self._instance = self._registry.get(self._name)
+        return getattr(instance, attribute)
+
+    def __repr__(self) -> str:
+        state = 'created' if self._registry.is_created(self._name) else 'lazy'
+        return f"<LazyService {self._name} ({state})>"
+
+
+class ServiceRegistry:
+    """Process-wide service singletons, created on first use.
+
+    Services are registered as (module, attribute) specs, so neither the module nor
+    its heavy dependencies (numpy, scipy, scikit-learn) are imported until someone
+    asks for the service. Every consumer, the API endpoints and the agents alike,
+    gets the same instance. The import and construction time of each component is
+    recorded for the startup report; both include any dependencies the component
+    pulls in first, so the first user of a shared library pays for it.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, Tuple[str, str, Optional[ServiceFactory]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._timings: Dict[str, Dict[str, Any]] = {}
+        self._phases: Dict[str, float] = {}
+        # Re-entrant: factories resolve their own dependencies through the registry
+        self._lock = threading.RLock()
+
+    def register(self, name: str, module_name: str, attribute: str, factory: Optional[ServiceFactory] = None):
+        """Register a service; without a factory the attribute is called with no arguments"""
+        with self._lock:
+            if name in self._instances:
+                raise ValueError(f"Service '{name}' is already created")
+            self._specs[name] = (module_name, attribute, factory)
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+            if name not in self._specs:
+                raise KeyError(f"Unknown service '{name}'")
+            module_name, attribute, factory = self._specs[name]
+
+            started = time.perf_counter()
+            target = getattr(importlib.import_module(module_name), attribute)
+            imported = time.perf_counter()
+            instance = factory(target, self) if factory else target()
+            finished = time.perf_counter()
+
+            self._instances[name] = instance
+            self._timings[name] = {
+                'import_seconds': round(imported - started, 4),
+                'init_seconds': round(finished - imported, 4),
+                'created_at': datetime.now().isoformat()
+            }
+            logger.info(
+                f"Created service {name} (import {imported - started:.3f}s, init {finished - imported:.3f}s)"
+            )
+            return instance
+
+    def proxy(self, name: str) -> LazyService:
+        if name not in self._specs:
+            raise KeyError(f"Unknown service '{name}'")
+        return LazyService(self, name)
+
+    def is_created(self, name: str) -> bool:
+        return name in self._instances
+
+    def preload(self, names: Iterable[str]) -> List[str]:
+        """Create services ahead of traffic; 'all' creates every registered service"""
+        names = list(names)
+        if 'all' in names:
+            names = list(self._specs)
+        for name in names:
+            self.get(name)
+        return names
+
+    def record_phase(self, phase: str, seconds: float):
+        """Record a startup step that is not a service, such as importing the app module"""
+        self._phases[phase] = round(seconds, 4)
+
+    def report(self) -> Dict[str, Any]:
+        """Import and init cost per created component, plus the recorded startup phases"""
+        return {
+            'phases': dict(self._phases),
+            'services': {
+                name: self._timings.get(name, {'state': 'lazy'})
+                for name in self._specs
+            },
+            'created': [name for name in self._timings],
+            'total_service_seconds': round(sum(
+                timing['import_seconds'] + timing['init_seconds'] for timing in self._timings.values()
+            ), 4)
+        }
+
+
+def _online_problem_detector(detector_class: Any, registry: ServiceRegistry) -> Any:
+    return detector_class(
+        registry.get('problem_analyzer'),
+        window_days=int(os.getenv('PROBLEM_WINDOW_DAYS', '30'))
+    )
+
+
+# Shared by main.py and the agents
+service_registry = ServiceRegistry()
+service_registry.register('chatbot', 'services.chatbot', 'ChatbotService')
+service_registry.register('incident_analyzer', 'services.incident_analyzer', 'IncidentAnalyzer')
+service_registry.register('problem_analyzer', 'services.problem_analyzer', 'ProblemAnalyzer')
+service_registry.register('patch_intelligence', 'services.patch_intelligence', 'PatchIntelligence')
+service_registry.register('automation_engine', 'services.automation_engine', 'AutomationEngine')
+service_registry.register('knowledge_base', 'services.knowledge_base', 'KnowledgeBaseService')
+service_registry.register('multi_agent_system', 'services.multi_agent_system', 'MultiAgentSystem')
+service_registry.register('problem_detector', 'services.online_problems', 'OnlineProblemDetector',
+                          factory=_online_problem_detector)
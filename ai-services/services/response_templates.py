@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, Mapping, Optional
+import logging
+
+from . import fast_json
+
+logger = logging.getLogger(__name__)
+
+
+def freeze(value: Any) -> Any:
+    """Read-only copy of a JSON-like value: mappings become proxies and lists tuples"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def encode_json(payload: Any) -> bytes:
+    """Encode with the configured response encoder; frozen payloads are accepted"""
+    return fast_json.dumps(payload)
+
+
+class ResponseTemplate:
+    """One prebuilt response: a frozen payload and, optionally, its encoded JSON"""
+
+    __slots__ = ('payload', 'body')
+
+    def __init__(self, payload: Dict[str, Any], serialize: bool = False):
+        self.payload = freeze(payload)
+        self.body: Optional[bytes] = encode_json(self.payload) if serialize else None
+
+    def render(self, overlay: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fresh top-level dict for one request; nested values stay shared and read-only"""
+        response = dict(self.payload)
+        if overlay:
+            response.update(overlay)
+        return response
+
+    def render_json(self, overlay: Optional[Dict[str, Any]] = None) -> bytes:
+        """Encoded response; identical responses reuse the prebuilt bytes"""
+        if not overlay and self.body is not None:
+            return self.body
+        return encode_json(self.render(overlay))
+
+
+class ResponseTemplateCache:
+    """Bounded LRU of response templates keyed by (agent, detected features)"""
+
+    def __init__(self, max_entries: int = 1024, serialize: bool = True):
+        self.max_entries = max_entries
+        self.serialize = serialize
+        self._templates: 'OrderedDict[Hashable, ResponseTemplate]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[ResponseTemplate]:
+        template = self._templates.get(key)
+        if template is None:
+            self.misses += 1
+            return None
+        self._templates.move_to_end(key)
+        self.hits += 1
+        return template
+
+    def put(self, key: Hashable, payload: Dict[str, Any]) -> ResponseTemplate:
+        template = ResponseTemplate(payload, serialize=self.serialize)
+        if self.enabled:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        self._templates.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._templates),
+            'max_entries': self.max_entries,
+            'serialize': self.serialize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
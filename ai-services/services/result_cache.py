@@ -0,0 +1,85 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncResultCache:
+    """Bounded TTL + LRU cache for coroutine results with request coalescing.
+
+    Concurrent misses for the same key share one computation. It runs in its own
+    task and every caller, the first included, awaits it through asyncio.shield, so
+    a caller that is cancelled (a client disconnecting) leaves the computation and
+    the other waiters alone. Failures are passed to every waiter and are not cached.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires at, value), least recently used first
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            self.misses += 1
+            inflight = asyncio.ensure_future(compute())
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._finished(key, task))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(inflight)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        # exception() also marks a failure retrieved when nobody was left waiting
+        failed = task.cancelled() or task.exception() is not None
+        # Skip storing if the key was invalidated while computing
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        if not failed:
+            self._store(key, task.result())
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop one entry; a computation already in flight for it is not cached"""
+        inflight = self._inflight.pop(key, None)
+        return self._entries.pop(key, None) is not None or inflight is not None
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,494 @@
+import bisect
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric terms"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def weighted_terms(fields: Dict[str, Any], field_weights: Dict[str, float]) -> Dict[str, float]:
+    """Term frequencies of a document, each occurrence weighted by its field"""
+    term_freqs: Dict[str, float] = defaultdict(float)
+    for field, weight in field_weights.items():
+        value = fields.get(field)
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(item) for item in value)
+        for term in tokenize(value or ''):
+            term_freqs[term] += weight
+    return term_freqs
+
+
+def bm25_idf(doc_count: int, doc_freq: int) -> float:
+    return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def max_edits(term: str) -> int:
+    """Edits tolerated for a term of this length: none up to 2 characters, 1 up to 8, then 2.
+
+    Two edits on a shorter word reach too much unrelated vocabulary, and the
+    trigram filter in TermIndex needs at least 9 characters to keep more than
+    one shared gram at that budget.
+    """
+    if len(term) <= 2:
+        return 0
+    return 1 if len(term) <= 8 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance counting an adjacent transposition as one edit.
+
+    Stops as soon as the distance must exceed `limit` and returns limit + 1.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class TermIndex:
+    """The index vocabulary, searchable by prefix and by approximate spelling.
+
+    Terms are kept sorted, so the completions of a prefix are one contiguous
+    range found by bisection. Terms one edit away are found by looking up every
+    single-edit variant of the query, which does not depend on the vocabulary
+    size. For larger budgets each term is also indexed by its padded character
+    trigrams: a term within k edits of the query shares at least
+    |grams(query)| - (n + 1) * k of them (one edit or transposition changes at
+    most n + 1 grams), so only terms reaching that count are compared with the
+    exact, bounded edit distance.
+    """
+
+    def __init__(self, gram_size: int = 3):
+        self.gram_size = gram_size
+        self.sorted_terms: List[str] = []
+        self.gram_postings: Dict[str, Set[str]] = defaultdict(set)
+        # Fallback candidates when a query is too short for the gram filter
+        self.terms_by_length: Dict[int, Set[str]] = defaultdict(set)
+        # Characters used by the vocabulary, for the substitutions and insertions of a single edit
+        self.characters: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.sorted_terms)
+
+    def __contains__(self, term: str) -> bool:
+        index = bisect.bisect_left(self.sorted_terms, term)
+        return index < len(self.sorted_terms) and self.sorted_terms[index] == term
+
+    def _grams(self, term: str, pad_end: bool = True) -> Set[str]:
+        padding = '$' * (self.gram_size - 1)
+        padded = f"{padding}{term}{padding if pad_end else ''}"
+        return {padded[i:i + self.gram_size] for i in range(len(padded) - self.gram_size + 1)}
+
+    def _candidates(self, grams: Set[str], threshold: int) -> List[str]:
+        """Terms sharing at least threshold of the grams.
+
+        Such a term must contain one of the len(grams) - threshold + 1 rarest
+        grams, so only those postings are walked; the common grams are probed
+        per candidate instead.
+        """
+        postings = sorted((self.gram_postings.get(gram, ()) for gram in grams), key=len)
+        candidates = set()
+        for members in postings[:len(postings) - threshold + 1]:
+            candidates.update(members)
+        return [
+            candidate for candidate in candidates
+            if sum(candidate in members for members in postings) >= threshold
+        ]
+
+    def _single_edits(self, term: str) -> Set[str]:
+        """Every string one deletion, transposition, substitution or insertion away from term"""
+        characters = self.characters
+        splits = [(term[:i], term[i:]) for i in range(len(term) + 1)]
+        edits = {left + right[1:] for left, right in splits if right}
+        edits.update(left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1)
+        edits.update(left + character + right[1:] for left, right in splits if right for character in characters)
+        edits.update(left + character + right for left, right in splits for character in characters)
+        edits.discard(term)
+        return edits
+
+    def add(self, term: str):
+        bisect.insort(self.sorted_terms, term)
+        for gram in self._grams(term):
+            self.gram_postings[gram].add(term)
+        self.terms_by_length[len(term)].add(term)
+        self.characters.update(term)
+
+    def add_many(self, terms: List[str]):
+        """Add a batch of terms; one merge instead of an insertion per term"""
+        new_terms = [term for term in set(terms) if term not in self]
+        if not new_terms:
+            return
+        self.sorted_terms = sorted(self.sorted_terms + new_terms)
+        for term in new_terms:
+            for gram in self._grams(term):
+                self.gram_postings[gram].add(term)
+            self.terms_by_length[len(term)].add(term)
+            self.characters.update(term)
+
+    def extended(self, terms: List[str]) -> 'TermIndex':
+        """A copy with terms added, for swapping in while readers keep using this index.
+
+        Postings that gain no term are shared with this index rather than
+        copied, so neither index may be modified in place afterwards.
+        """
+        new_terms = [term for term in set(terms) if term not in self]
+        if not new_terms:
+            return self
+        index = TermIndex(self.gram_size)
+        index.sorted_terms = sorted(self.sorted_terms + new_terms)
+        index.gram_postings = defaultdict(set, self.gram_postings)
+        index.terms_by_length = defaultdict(set, self.terms_by_length)
+        index.characters = set(self.characters)
+        copied_grams: Set[str] = set()
+        copied_lengths: Set[int] = set()
+        for term in new_terms:
+            for gram in index._grams(term):
+                if gram not in copied_grams:
+                    index.gram_postings[gram] = set(index.gram_postings[gram])
+                    copied_grams.add(gram)
+                index.gram_postings[gram].add(term)
+            if len(term) not in copied_lengths:
+                index.terms_by_length[len(term)] = set(index.terms_by_length[len(term)])
+                copied_lengths.add(len(term))
+            index.terms_by_length[len(term)].add(term)
+            index.characters.update(term)
+        return index
+
+    def remove(self, term: str):
+        index = bisect.bisect_left(self.sorted_terms, term)
+        if index < len(self.sorted_terms) and self.sorted_terms[index] == term:
+            del self.sorted_terms[index]
+        for gram in self._grams(term):
+            members = self.gram_postings.get(gram)
+            if members is not None:
+                members.discard(term)
+                if not members:
+                    del self.gram_postings[gram]
+        members = self.terms_by_length.get(len(term))
+        if members is not None:
+            members.discard(term)
+            if not members:
+                del self.terms_by_length[len(term)]
+
+    def with_prefix(self, prefix: str, limit: int) -> List[str]:
+        """Up to `limit` terms starting with prefix, in alphabetical order"""
+        terms = self.sorted_terms
+        start = bisect.bisect_left(terms, prefix)
+        # Every string starting with prefix sorts before prefix + the highest character
+        end = bisect.bisect_left(terms, prefix + '\uffff', start, min(start + limit, len(terms)))
+        return terms[start:end]
+
+    def similar(self, term: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Terms within max_distance edits of term, closest first"""
+        if max_distance <= 0:
+            return []
+        if max_distance == 1:
+            return sorted((candidate, 1) for candidate in self._single_edits(term) if candidate in self)
+
+        grams = self._grams(term)
+        threshold = len(grams) - (self.gram_size + 1) * max_distance
+        if threshold > 0:
+            candidates = self._candidates(grams, threshold)
+        else:
+            candidates = [
+                candidate
+                for length in range(len(term) - max_distance, len(term) + max_distance + 1)
+                for candidate in self.terms_by_length.get(length, ())
+            ]
+
+        matches = []
+        for candidate in candidates:
+            if candidate == term:
+                continue
+            distance = edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append((candidate, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
+
+    def similar_prefixes(self, prefix: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Terms that start with something within max_distance edits of prefix, closest first"""
+        grams = self._grams(prefix, pad_end=False)
+        threshold = len(grams) - (self.gram_size + 1) * max_distance
+        if max_distance <= 0 or threshold <= 0:
+            # Too short to filter; a fuzzy one- or two-letter prefix matches nearly everything anyway
+            return []
+
+        low = max(len(prefix) - max_distance, 1)
+        matches = []
+        for candidate in self._candidates(grams, threshold):
+            distance = min(
+                edit_distance(prefix, candidate[:length], max_distance)
+                for length in range(low, min(len(prefix) + max_distance, len(candidate)) + 1)
+            ) if len(candidate) >= low else max_distance + 1
+            if distance <= max_distance:
+                matches.append((candidate, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
+
+
+class TermLookup(ABC):
+    """Spelling correction, prefix completion and query expansion over an index vocabulary.
+
+    Subclasses provide `terms` and document_frequency(); a term with no live
+    documents is treated as unknown.
+    """
+
+    @property
+    @abstractmethod
+    def terms(self) -> TermIndex:
+        """Vocabulary searched for completions and corrections"""
+
+    @abstractmethod
+    def document_frequency(self, term: str) -> int:
+        ...
+
+    def corrections(self, term: str, limit: int = 3) -> List[Tuple[str, int]]:
+        """Closest indexed spellings of an unknown term, most common first among equals.
+
+        When no whole word is close enough, words whose beginning is within one
+        edit are used instead ("conect" -> "connection").
+        """
+        matches = [match for match in self._spellings(term) if self.document_frequency(match[0]) > 0]
+        if not matches:
+            return []
+        best = matches[0][1]
+        closest = [match for match in matches if match[1] == best]
+        closest.sort(key=lambda match: -self.document_frequency(match[0]))
+        return closest[:limit]
+
+    def _spellings(self, term: str) -> List[Tuple[str, int]]:
+        """Vocabulary terms near term as (term, edits), closest first"""
+        matches = self.terms.similar(term, max_edits(term))
+        if not matches and len(term) >= 4:
+            matches = self.terms.similar_prefixes(term, 1)
+        return matches
+
+    def completions(self, prefix: str, limit: int = 10, scan_limit: int = 5000) -> List[Tuple[str, int]]:
+        """Indexed terms starting with prefix as (term, document count), most common first.
+
+        At most scan_limit terms of the prefix range are considered, which bounds
+        the cost of one- and two-letter prefixes on a large vocabulary.
+        """
+        terms = self.terms.with_prefix(prefix, scan_limit)
+        ranked = sorted(((term, self.document_frequency(term)) for term in terms), key=lambda item: -item[1])
+        return [item for item in ranked[:limit] if item[1] > 0]
+
+    def expand_query(self, query: str, fuzzy: bool = True) -> Tuple[Dict[str, float], Dict[str, List[str]]]:
+        """Query terms with weights; unknown terms are replaced by their closest spellings.
+
+        Corrections are weighted 1 / (1 + edits), so an exact match always
+        outranks a corrected one. Returns the weights and the corrections made.
+        """
+        weights: Dict[str, float] = {}
+        corrected: Dict[str, List[str]] = {}
+        for term in tokenize(query):
+            if not fuzzy or self.document_frequency(term) > 0:
+                weights[term] = 1.0
+                continue
+            replacements = self.corrections(term)
+            if replacements:
+                corrected[term] = [replacement for replacement, _ in replacements]
+            for replacement, distance in replacements:
+                weights[replacement] = max(weights.get(replacement, 0.0), 1.0 / (1 + distance))
+        return weights, corrected
+
+
+class InvertedIndex(TermLookup):
+    """Incrementally maintained inverted index with BM25 ranking"""
+
+    def __init__(self, field_weights: Dict[str, float], k1: float = 1.2, b: float = 0.75):
+        self.field_weights = field_weights
+        self.k1 = k1
+        self.b = b
+
+        # term -> {doc_id: weighted term frequency}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # doc_id -> {term: weighted term frequency}, kept so removals touch only the doc's own terms
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+
+        # lowercase category -> doc_ids
+        self.category_postings: Dict[str, Set[str]] = defaultdict(set)
+        self.doc_categories: Dict[str, str] = {}
+
+        # Vocabulary for prefix completion and spelling correction
+        self._terms = TermIndex()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    @property
+    def terms(self) -> TermIndex:
+        return self._terms
+
+    def add(self, doc_id: str, fields: Dict[str, Any], category: Optional[str] = None):
+        """Index a document, replacing any previous version with the same ID"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        term_freqs = weighted_terms(fields, self.field_weights)
+        for term, freq in term_freqs.items():
+            if term not in self.postings:
+                self.terms.add(term)
+            self.postings[term][doc_id] = freq
+
+        doc_length = sum(term_freqs.values())
+        self.doc_terms[doc_id] = dict(term_freqs)
+        self.doc_lengths[doc_id] = doc_length
+        self.total_length += doc_length
+
+        if category:
+            category_key = category.lower()
+            self.category_postings[category_key].add(doc_id)
+            self.doc_categories[doc_id] = category_key
+
+    def remove(self, doc_id: str) -> bool:
+        """Remove a document from the index"""
+        if doc_id not in self.doc_lengths:
+            return False
+
+        for term in self.doc_terms.pop(doc_id):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                self.terms.remove(term)
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+        category_key = self.doc_categories.pop(doc_id, None)
+        if category_key is not None:
+            members = self.category_postings[category_key]
+            members.discard(doc_id)
+            if not members:
+                del self.category_postings[category_key]
+
+        return True
+
+    def document_frequency(self, term: str) -> int:
+        postings = self.postings.get(term)
+        return len(postings) if postings else 0
+
+    def search(self, query: str, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Return (doc_id, bm25_score) for every document matching at least one query term"""
+        return self.search_terms({term: 1.0 for term in tokenize(query)}, category)
+
+    def search_terms(self, weights: Dict[str, float], category: Optional[str] = None,
+                     candidate_limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """BM25 search over already tokenized terms, each term's contribution scaled by its weight.
+
+        With candidate_limit, when the terms' postings hold more documents than
+        that, only candidate_limit documents are scored (against every term),
+        taken from the rarest terms first. Search-as-you-type uses this to bound
+        the work per keystroke; its ranking is then approximate.
+        """
+        doc_count = len(self.doc_lengths)
+        if not weights or doc_count == 0:
+            return []
+        idfs = {
+            term: weights[term] * bm25_idf(doc_count, len(self.postings[term]))
+            for term in weights
+            if self.postings.get(term)
+        }
+        avg_length = self.total_length / doc_count if self.total_length > 0 else 1.0
+        return self.score(idfs, category, avg_length, candidate_limit)
+
+    def search_top(self, weights: Dict[str, float], category: Optional[str] = None, limit: int = 10,
+                   candidate_limit: Optional[int] = None) -> Tuple[int, List[Tuple[str, float]]]:
+        """Number of matches and the matches that can rank in the top `limit`; here, all of them"""
+        matches = self.search_terms(weights, category, candidate_limit)
+        return len(matches), matches
+
+    def score(self, idfs: Dict[str, float], category: Optional[str], avg_length: float,
+              candidate_limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """BM25 scores of this index's documents for terms whose weighted IDF is already known.
+
+        The IDFs and average length may come from a larger collection this index
+        is one part of.
+        """
+        allowed = None
+        if category:
+            allowed = self.category_postings.get(category.lower())
+            if not allowed:
+                return []
+
+        terms = [term for term in idfs if self.postings.get(term)]
+        if candidate_limit is not None and sum(len(self.postings[term]) for term in terms) > candidate_limit:
+            return self._score_candidates(idfs, terms, allowed, avg_length, candidate_limit)
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in terms:
+            postings = self.postings[term]
+            idf = idfs[term]
+
+            # Walk whichever side is shorter when a category filter applies
+            if allowed is not None and len(allowed) < len(postings):
+                matches = ((doc_id, postings[doc_id]) for doc_id in allowed if doc_id in postings)
+            else:
+                matches = postings.items()
+
+            for doc_id, freq in matches:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+        return list(scores.items())
+
+    def _score_candidates(self, idfs: Dict[str, float], terms: List[str], allowed: Optional[Set[str]],
+                          avg_length: float, limit: int) -> List[Tuple[str, float]]:
+        candidates: Dict[str, None] = {}
+        for term in sorted(terms, key=lambda term: len(self.postings[term])):
+            for doc_id in self.postings[term]:
+                if allowed is None or doc_id in allowed:
+                    candidates[doc_id] = None
+                    if len(candidates) >= limit:
+                        break
+            if len(candidates) >= limit:
+                break
+
+        results = []
+        for doc_id in candidates:
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+            score = 0.0
+            for term in terms:
+                freq = self.postings[term].get(doc_id)
+                if freq is not None:
+                    score += idfs[term] * freq * (self.k1 + 1) / (freq + norm)
+            results.append((doc_id, score))
+        return results
@@ -0,0 +1,164 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (epoch seconds, role, text, meta, details) where meta is the user_id for user turns and the
+# intent for bot turns, and details holds the rest of a bot response besides its message
+Turn = Tuple[float, str, str, str, Optional[Dict[str, Any]]]
+
+
+def make_turn(role: str, text: str, meta: str = '', details: Optional[Dict[str, Any]] = None,
+              max_text_chars: int = 2000) -> Turn:
+    """Build a compact conversation turn, truncating text so per-turn size stays bounded"""
+    return (round(time.time(), 3), role, (text or '')[:max_text_chars], meta or '', details)
+
+
+class SessionStore(ABC):
+    """Conversation turns keyed by session_id"""
+
+    @abstractmethod
+    async def append(self, session_id: str, *turns: Turn):
+        ...
+
+    @abstractmethod
+    async def get(self, session_id: str) -> List[Turn]:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of live sessions"""
+
+
+class InMemorySessionStore(SessionStore):
+    """Bounded in-process store with per-session turn limits, TTL and LRU eviction"""
+
+    def __init__(self, max_sessions: int = 10000, max_turns: int = 50, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        # session_id -> (last access, turns), least recently used first
+        self._sessions: 'OrderedDict[str, Tuple[float, Deque[Turn]]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of live sessions; expired ones are dropped first"""
+        self._expire(time.time())
+        return len(self._sessions)
+
+    def _expire(self, now: float):
+        # Sessions are kept in access order, so expired ones are always at the front
+        cutoff = now - self.ttl_seconds
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if last_access > cutoff:
+                break
+            self._sessions.popitem(last=False)
+
+    async def append(self, session_id: str, *turns: Turn):
+        now = time.time()
+        self._expire(now)
+
+        entry = self._sessions.pop(session_id, None)
+        session_turns = entry[1] if entry else deque(maxlen=self.max_turns)
+        session_turns.extend(turns)
+        self._sessions[session_id] = (now, session_turns)
+
+        while len(self._sessions) > self.max_sessions:
+            evicted, _ = self._sessions.popitem(last=False)
+            logger.debug(f"Evicted least recently used chat session {evicted}")
+
+    async def get(self, session_id: str) -> List[Turn]:
+        now = time.time()
+        self._expire(now)
+
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return []
+        self._sessions[session_id] = (now, entry[1])
+        self._sessions.move_to_end(session_id)
+        return list(entry[1])
+
+    async def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    async def count(self) -> int:
+        return len(self)
+
+
+class RedisSessionStore(SessionStore):
+    """Redis-backed store; each session is a capped list that expires after the TTL.
+
+    Session count is bounded by the TTL together with the server's maxmemory
+    eviction policy rather than by this class.
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, max_turns: int = 50,
+                 ttl_seconds: float = 3600, key_prefix: str = 'chat:session:'):
+        if client is None:
+            import redis.asyncio as redis_asyncio
+            client = redis_asyncio.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.client = client
+        self.max_turns = max_turns
+        self.ttl_seconds = int(ttl_seconds)
+        self.key_prefix = key_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+
+    async def append(self, session_id: str, *turns: Turn):
+        if not turns:
+            return
+        key = self._key(session_id)
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.rpush(key, *(json.dumps(turn, separators=(',', ':')) for turn in turns))
+        pipeline.ltrim(key, -self.max_turns, -1)
+        pipeline.expire(key, self.ttl_seconds)
+        await pipeline.execute()
+
+    async def get(self, session_id: str) -> List[Turn]:
+        key = self._key(session_id)
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.lrange(key, 0, -1)
+        pipeline.expire(key, self.ttl_seconds)
+        raw_turns, _ = await pipeline.execute()
+        return [tuple(json.loads(raw)) for raw in raw_turns]
+
+    async def delete(self, session_id: str) -> bool:
+        return bool(await self.client.delete(self._key(session_id)))
+
+    async def count(self) -> int:
+        count = 0
+        async for _ in self.client.scan_iter(match=f"{self.key_prefix}*", count=1000):
+            count += 1
+        return count
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by CHAT_SESSION_BACKEND (memory or redis)"""
+    backend = os.getenv('CHAT_SESSION_BACKEND', 'memory').lower()
+    max_turns = int(os.getenv('CHAT_SESSION_MAX_TURNS', '50'))
+    ttl_seconds = float(os.getenv('CHAT_SESSION_TTL_SECONDS', '3600'))
+
+    if backend == 'redis':
+        return RedisSessionStore(
+            url=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+            max_turns=max_turns,
+            ttl_seconds=ttl_seconds
+        )
+    if backend != 'memory':
+        raise ValueError(f"Unknown chat session backend: {backend}")
+
+    return InMemorySessionStore(
+        max_sessions=int(os.getenv('CHAT_SESSION_MAX_SESSIONS', '10000')),
+        max_turns=max_turns,
+        ttl_seconds=ttl_seconds
+    )
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+from itertools import islice
+from typing import Dict, List, Any, Optional, Sequence
+import logging
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+logger = logging.getLogger(__name__)
+
+_MATRIX_FILES = ('data', 'indices', 'indptr')
+
+
+def _save_csr(directory: str, name: str, matrix: sparse.csr_matrix):
+    for part in _MATRIX_FILES:
+        np.save(os.path.join(directory, f"{name}_{part}.npy"), getattr(matrix, part))
+
+
+def _load_csr(directory: str, name: str, shape, mmap: bool) -> sparse.csr_matrix:
+    mode = 'r' if mmap else None
+    data, indices, indptr = (
+        np.load(os.path.join(directory, f"{name}_{part}.npy"), mmap_mode=mode)
+        for part in _MATRIX_FILES
+    )
+    return sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+
+class IncidentSimilarityIndex:
+    """Append-only TF-IDF index over historical incidents with top-k cosine queries.
+
+    Raw term counts are hashed into a fixed feature space, so new incidents can be
+    appended without refitting a vocabulary. Rows are held in two parts: a
+    consolidated base (term-major, so a query only touches the postings of its own
+    terms) and a small pending block of recent appends weighted with the current
+    IDF. The base is rebuilt from the counts once the pending block grows past a
+    fraction of it, which keeps appends amortized O(1). Under an event loop the
+    rebuild and the save that follows run on a thread and the new base is swapped
+    in when ready, so the append that crosses the threshold does not pay for it.
+    """
+
+    def __init__(self, n_features: int = 2 ** 18, storage_path: Optional[str] = None,
+                 consolidate_ratio: float = 0.1, min_consolidate_rows: int = 1000):
+        self.n_features = n_features
+        self.storage_path = storage_path
+        self.consolidate_ratio = consolidate_ratio
+        self.min_consolidate_rows = min_consolidate_rows
+
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32
+        )
+
+        self.records: List[Dict[str, Any]] = []
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+
+        empty = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self._base_counts = empty
+        self._base_terms = sparse.csr_matrix((n_features, 0), dtype=np.float32)
+        self._pending_counts: List[sparse.csr_matrix] = []
+        self._pending_weighted: List[sparse.csr_matrix] = []
+        self._pending_rows = 0
+
+        # Bumped whenever a new base is swapped in; stale background rebuilds are dropped
+        self._version = 0
+        self._saved_version = -1
+        self._save_lock = threading.Lock()
+        self._consolidation: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def base_rows(self) -> int:
+        return self._base_counts.shape[0]
+
+    def _idf(self) -> np.ndarray:
+        doc_count = len(self.records)
+        return (np.log((1 + doc_count) / (1 + self.doc_freq)) + 1).astype(np.float32)
+
+    @staticmethod
+    def _weight(counts: sparse.csr_matrix, idf: np.ndarray) -> sparse.csr_matrix:
+        """Apply sublinear TF, IDF and L2 row normalization"""
+        weighted = counts.copy()
+        weighted.data = np.log1p(weighted.data)
+        weighted = weighted.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms).dot(weighted).astype(np.float32).tocsr()
+
+    def _vectorize(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        return self.vectorizer.transform(texts).tocsr()
+
+    def add(self, texts: Sequence[str], records: Sequence[Dict[str, Any]]):
+        """Append incidents to the index"""
+        if len(texts) != len(records):
+            raise ValueError("texts and records must have the same length")
+        if not texts:
+            return
+
+        counts = self._vectorize(texts)
+        self.doc_freq += np.bincount(counts.indices, minlength=self.n_features)
+        self.records.extend(records)
+
+        self._pending_counts.append(counts)
+        self._pending_weighted.append(self._weight(counts, self._idf()))
+        self._pending_rows += counts.shape[0]
+
+        if self._pending_rows >= max(self.min_consolidate_rows, self.consolidate_ratio * self.base_rows):
+            self._schedule_consolidation()
+
+    def _schedule_consolidation(self):
+        if self._consolidation is not None and not self._consolidation.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to hand the work to: fold in place
+            self.consolidate()
+            if self.storage_path:
+                self.save(self.storage_path)
+            return
+        self._consolidation = loop.create_task(self._consolidate_in_background())
+
+    async def _consolidate_in_background(self):
+        """Rebuild the base from a snapshot on a thread; appends made meanwhile stay pending"""
+        try:
+            version = self._version
+            blocks = len(self._pending_counts)
+            pending = self._pending_counts[:blocks]
+            rows = len(self.records)
+            idf = self._idf()
+            doc_freq = self.doc_freq.copy()
+
+            base_counts, base_terms = await asyncio.to_thread(self._rebuild, self._base_counts, pending, idf)
+            if version != self._version:
+                # A synchronous consolidate() swapped in a newer base meanwhile
+                return
+            self._swap(base_counts, base_terms, blocks)
+
+            if self.storage_path:
+                await asyncio.to_thread(
+                    self._write, self.storage_path, self._version, base_counts, base_terms, doc_freq, rows
+                )
+        except Exception as e:
+            logger.error(f"Error consolidating incident similarity index: {str(e)}")
+
+    def _rebuild(self, base_counts: sparse.csr_matrix, pending: List[sparse.csr_matrix], idf: np.ndarray):
+        if pending:
+            base_counts = sparse.vstack([base_counts, *pending], format='csr')
+        return base_counts, self._weight(base_counts, idf).T.tocsr()
+
+    def _swap(self, base_counts: sparse.csr_matrix, base_terms: sparse.csr_matrix, blocks: int):
+        """Install a rebuilt base that covers the first `blocks` pending blocks"""
+        self._base_counts = base_counts
+        self._base_terms = base_terms
+        self._pending_rows -= sum(counts.shape[0] for counts in self._pending_counts[:blocks])
+        del self._pending_counts[:blocks]
+        del self._pending_weighted[:blocks]
+        self._version += 1
+
+    def consolidate(self):
+        """Fold pending rows into the base and re-weight everything with the current IDF"""
+        base_counts, base_terms = self._rebuild(self._base_counts, self._pending_counts, self._idf())
+        self._swap(base_counts, base_terms, len(self._pending_counts))
+
+    def query(self, texts: Sequence[str], top_k: int = 5, min_score: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """Return the top-k most similar historical incidents for each query text"""
+        if not texts:
+            return []
+        if not self.records:
+            return [[] for _ in texts]
+
+        queries = self._weight(self._vectorize(texts), self._idf())
+        blocks = [queries.dot(self._base_terms)]
+        blocks.extend(queries.dot(pending.T) for pending in self._pending_weighted)
+        scores = sparse.hstack(blocks, format='csr') if len(blocks) > 1 else blocks[0].tocsr()
+
+        results = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            row_scores = scores.data[start:end]
+            row_docs = scores.indices[start:end]
+
+            if len(row_scores) > top_k:
+                top = np.argpartition(-row_scores, top_k - 1)[:top_k]
+            else:
+                top = np.arange(len(row_scores))
+            top = top[np.argsort(-row_scores[top], kind='stable')]
+
+            results.append([
+                {**self.records[row_docs[i]], 'similarity_score': round(float(row_scores[i]), 4)}
+                for i in top
+                if row_scores[i] > min_score
+            ])
+
+        return results
+
+    def save(self, path: str):
+        """Persist the index as .npy arrays that can be memory-mapped on load"""
+        if self._pending_counts:
+            self.consolidate()
+        self._write(path, self._version, self._base_counts, self._base_terms, self.doc_freq.copy(), len(self.records))
+
+    def _write(self, path: str, version: int, base_counts: sparse.csr_matrix, base_terms: sparse.csr_matrix,
+               doc_freq: np.ndarray, rows: int):
+        """Write one consolidated base; an older version than the last one written is skipped"""
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            self._write_files(path, base_counts, base_terms, doc_freq, rows)
+            self._saved_version = version
+
+    def _write_files(self, path: str, base_counts: sparse.csr_matrix, base_terms: sparse.csr_matrix,
+                     doc_freq: np.ndarray, rows: int):
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        _save_csr(tmp_path, 'counts', base_counts)
+        _save_csr(tmp_path, 'terms', base_terms)
+        np.save(os.path.join(tmp_path, 'doc_freq.npy'), doc_freq)
+        with open(os.path.join(tmp_path, 'records.jsonl'), 'w') as handle:
+            # Records are append-only, so the first `rows` are the ones in this base
+            for record in islice(self.records, rows):
+                handle.write(json.dumps(record, default=str) + '\n')
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as handle:
+            json.dump({'n_features': self.n_features, 'rows': rows}, handle)
+
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        logger.info(f"Saved incident similarity index with {rows} rows to {path}")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, **kwargs) -> 'IncidentSimilarityIndex':
+        """Load a persisted index, memory-mapping the matrices by default"""
+        with open(os.path.join(path, 'meta.json')) as handle:
+            meta = json.load(handle)
+
+        index = cls(n_features=meta['n_features'], storage_path=path, **kwargs)
+        rows = meta['rows']
+        index._base_counts = _load_csr(path, 'counts', (rows, index.n_features), mmap)
+        index._base_terms = _load_csr(path, 'terms', (index.n_features, rows), mmap)
+        index.doc_freq = np.load(os.path.join(path, 'doc_freq.npy'))
+        with open(os.path.join(path, 'records.jsonl')) as handle:
+            index.records = [json.loads(line) for line in handle if line.strip()]
+
+        logger.info(f"Loaded incident similarity index with {rows} rows from {path}")
+        return index
+
+    @classmethod
+    def open(cls, path: Optional[str] = None, **kwargs) -> 'IncidentSimilarityIndex':
+        """Load the index at path if one was persisted there, otherwise start empty"""
+        if path and os.path.exists(os.path.join(path, 'meta.json')):
+            return cls.load(path, **kwargs)
+        return cls(storage_path=path, **kwargs)
@@ -0,0 +1,147 @@
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, AbstractSet
+
+import numpy as np
+from scipy import sparse
+
+# Guards ceil() against float noise such as 0.7 * 10 == 7.000000000000001
+_EPSILON = 1e-9
+
+
+class UnionFind:
+    """Disjoint-set forest with path halving and union by size"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> int:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
+    def components(self) -> List[List[int]]:
+        """Return components ordered by their smallest member, members in ascending order"""
+        members: Dict[int, List[int]] = defaultdict(list)
+        for item in range(len(self.parent)):
+            members[self.find(item)].append(item)
+        return list(members.values())
+
+
+def jaccard(a: AbstractSet, b: AbstractSet) -> float:
+    """Jaccard similarity of two sets, 0.0 when either is empty"""
+    if not a or not b:
+        return 0.0
+    intersection = len(a & b)
+    return intersection / (len(a) + len(b) - intersection)
+
+
+def prefix_length(size: int, threshold: float) -> int:
+    """Number of leading tokens two sets must overlap in to possibly reach the threshold"""
+    return size - math.ceil(threshold * size - _EPSILON) + 1
+
+
+def jaccard_components(token_sets: Sequence[AbstractSet[str]], threshold: float,
+                       chunk_size: int = 2048, max_pairs_per_batch: int = 1 << 20) -> UnionFind:
+    """Union every pair of sets whose Jaccard similarity is strictly above threshold.
+
+    Candidate pairs come from prefix filtering: with tokens ordered rarest first,
+    two sets can only reach the threshold if their short prefixes share a token.
+    Candidates are generated as a sparse product of the prefix matrix, pruned by
+    the length filter and verified exactly in bulk, so the resulting components
+    are identical to an all-pairs comparison.
+    """
+    union_find = UnionFind(len(token_sets))
+    token_freq = Counter(token for tokens in token_sets for token in tokens)
+
+    # Tokens seen in a single set can never be shared, so sets with the same
+    # shared core and the same number of unique tokens compare identically
+    # against everything else. Only one representative per class joins; every
+    # member is then linked wherever its representative was.
+    classes: Dict[tuple, List[int]] = defaultdict(list)
+    for i, tokens in enumerate(token_sets):
+        if tokens:
+            core = frozenset(token for token in tokens if token_freq[token] > 1)
+            classes[(core, len(tokens) - len(core))].append(i)
+
+    distinct: List[int] = []
+    class_members: List[List[int]] = []
+    for (core, unique_count), members in classes.items():
+        distinct.append(members[0])
+        class_members.append(members)
+        if len(members) > 1 and core and len(core) / (len(core) + 2 * unique_count) > threshold:
+            for i in members[1:]:
+                union_find.union(members[0], i)
+
+    if not distinct:
+        return union_find
+
+    rank = {token: position for position, (token, _) in enumerate(
+        sorted(token_freq.items(), key=lambda item: (item[1], item[0]))
+    )}
+
+    # Binary set matrix whose column order is rarest token first
+    indices: List[int] = []
+    indptr = [0]
+    for i in distinct:
+        indices.extend(sorted(rank[token] for token in token_sets[i]))
+        indptr.append(len(indices))
+    indices = np.asarray(indices, dtype=np.int32)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    sizes = np.diff(indptr)
+    data = np.ones(len(indices), dtype=np.float32)
+    shape = (len(distinct), len(rank))
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=shape)
+
+    prefix_lengths = sizes - np.ceil(threshold * sizes - _EPSILON).astype(np.int64) + 1
+    prefix_lengths = np.clip(prefix_lengths, 0, sizes)
+    positions = np.arange(len(indices)) - np.repeat(indptr[:-1], sizes)
+    in_prefix = positions < np.repeat(prefix_lengths, sizes)
+    prefix_indptr = np.concatenate(([0], np.cumsum(prefix_lengths)))
+    prefix = sparse.csr_matrix((data[in_prefix], indices[in_prefix], prefix_indptr), shape=shape)
+    prefix_by_token = prefix.T.tocsr()
+    linked = np.zeros(len(distinct), dtype=bool)
+
+    for start in range(0, shape[0], chunk_size):
+        candidates = prefix[start:start + chunk_size].dot(prefix_by_token).tocoo()
+        rows = candidates.row.astype(np.int64) + start
+        cols = candidates.col.astype(np.int64)
+
+        # Each unordered pair once, then the length filter
+        keep = cols > rows
+        rows, cols = rows[keep], cols[keep]
+        smaller = np.minimum(sizes[rows], sizes[cols])
+        larger = np.maximum(sizes[rows], sizes[cols])
+        keep = smaller >= threshold * larger - _EPSILON
+        rows, cols = rows[keep], cols[keep]
+
+        for batch in range(0, len(rows), max_pairs_per_batch):
+            batch_rows = rows[batch:batch + max_pairs_per_batch]
+            batch_cols = cols[batch:batch + max_pairs_per_batch]
+            overlap = np.asarray(matrix[batch_rows].multiply(matrix[batch_cols]).sum(axis=1)).ravel()
+            similar = overlap / (sizes[batch_rows] + sizes[batch_cols] - overlap) > threshold
+            linked[batch_rows[similar]] = True
+            linked[batch_cols[similar]] = True
+            for a, b in zip(batch_rows[similar].tolist(), batch_cols[similar].tolist()):
+                union_find.union(distinct[a], distinct[b])
+
+    # A member is as similar to the other classes as its representative
+    for representative in np.flatnonzero(linked).tolist():
+        members = class_members[representative]
+        for i in members[1:]:
+            union_find.union(members[0], i)
+
+    return union_find
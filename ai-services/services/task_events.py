@@ -0,0 +1,91 @@
+import asyncio
+import itertools
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSubscription:
+    """One consumer's view of the task event stream.
+
+    Events are buffered in a bounded queue. When a consumer falls behind, the
+    oldest buffered event is dropped and counted; every event carries the full
+    task status, so a newer event for the same task supersedes the dropped one.
+    """
+
+    def __init__(self, task_ids: Optional[Iterable[str]] = None, task_type: Optional[str] = None,
+                 max_pending: int = 100):
+        self.task_ids: Optional[Set[str]] = set(task_ids) if task_ids else None
+        self.task_type = task_type
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+
+    def offer(self, event: Dict[str, Any]):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TaskEventBus:
+    """In-process fan-out of task status transitions to subscribers"""
+
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._sequence = itertools.count(1)
+        self._by_task: Dict[str, Set[TaskSubscription]] = defaultdict(set)
+        self._by_type: Dict[str, Set[TaskSubscription]] = defaultdict(set)
+        self._all: Set[TaskSubscription] = set()
+        self._subscriptions: Set[TaskSubscription] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, task_ids: Optional[Iterable[str]] = None,
+                  task_type: Optional[str] = None) -> TaskSubscription:
+        """Subscribe to specific tasks, to every task of a type, or to all tasks when neither is given"""
+        subscription = TaskSubscription(task_ids, task_type, self.max_pending)
+        self._subscriptions.add(subscription)
+        if subscription.task_ids:
+            for task_id in subscription.task_ids:
+                self._by_task[task_id].add(subscription)
+        if task_type:
+            self._by_type[task_type].add(subscription)
+        if not subscription.task_ids and not task_type:
+            self._all.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TaskSubscription):
+        for task_id in subscription.task_ids or ():
+            self._discard(self._by_task, task_id, subscription)
+        if subscription.task_type:
+            self._discard(self._by_type, subscription.task_type, subscription)
+        self._all.discard(subscription)
+        self._subscriptions.discard(subscription)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[TaskSubscription]], key: str, subscription: TaskSubscription):
+        subscriptions = index.get(key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del index[key]
+
+    def publish(self, event: Dict[str, Any]):
+        """Deliver an event to every matching subscriber without blocking the publisher"""
+        event = {**event, 'sequence': next(self._sequence)}
+        recipients = set(self._all)
+        recipients.update(self._by_task.get(event.get('task_id'), ()))
+        recipients.update(self._by_type.get(event.get('type'), ()))
+        for subscription in recipients:
+            subscription.offer(event)
@@ -0,0 +1,246 @@
+import asyncio
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of waiting tasks"""
+
+
+class TaskStore:
+    """SQLite persistence for automation task records"""
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                type TEXT,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                message TEXT,
+                payload TEXT,
+                result TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks (finished_at);
+        ''')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def insert(self, record: Dict[str, Any], payload: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO tasks (id, type, status, priority, message, payload, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (record['id'], record['type'], record['status'], record['priority'],
+                 record.get('message'), json.dumps(payload, default=str), record['created_at'])
+            )
+
+    def update(self, task_id: str, status: str, message: str, updated_at: str,
+               result: Optional[Dict[str, Any]] = None):
+        finished_at = time.time() if status in TERMINAL_STATUSES else None
+        with self._lock:
+            self._conn.execute(
+                'UPDATE tasks SET status = ?, message = ?, updated_at = ?, finished_at = ?, '
+                'result = COALESCE(?, result) WHERE id = ?',
+                (status, message, updated_at, finished_at,
+                 json.dumps(result, default=str) if result is not None else None, task_id)
+            )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, type, status, priority, message, result, created_at, updated_at '
+                'FROM tasks WHERE id = ?',
+                (task_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = {key: row[key] for key in row.keys() if row[key] is not None}
+        if 'result' in record:
+            record['result'] = json.loads(record['result'])
+        return record
+
+    def payload(self, task_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute('SELECT payload FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return json.loads(row['payload']) if row and row['payload'] else {}
+
+    def active(self) -> List[Dict[str, Any]]:
+        """Tasks that were queued or running, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, type, status, priority, message, created_at, updated_at FROM tasks '
+                f"WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)}) ORDER BY created_at",
+                ACTIVE_STATUSES
+            ).fetchall()
+        return [{key: row[key] for key in row.keys()} for row in rows]
+
+    def purge_finished(self, finished_before: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?',
+                (finished_before,)
+            )
+        return cursor.rowcount
+
+    def count_by_status(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall()
+        return {row[0]: row[1] for row in rows}
+
+
+class TaskQueue:
+    """Priority task queue with a bounded worker pool and per-type concurrency caps.
+
+    Only (priority, sequence, task_id, task_type) tuples are held in memory while a
+    task waits; the payload stays in the TaskStore until a worker slot opens.
+    """
+
+    def __init__(self, store: TaskStore, handler: Callable[[str, str, Dict[str, Any]], Awaitable[None]],
+                 max_workers: int = 8, type_limits: Optional[Dict[str, int]] = None,
+                 max_queued: int = 10000, retention_seconds: float = 86400):
+        self.store = store
+        self.handler = handler
+        self.max_workers = max_workers
+        self.type_limits = type_limits or {}
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+
+        self._heap: List[Tuple[int, int, str, str]] = []
+        self._parked: Dict[str, List[Tuple[int, int, str, str]]] = defaultdict(list)
+        self._sequence = itertools.count()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_by_type: Dict[str, int] = defaultdict(int)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._dispatcher is not None
+
+    @property
+    def depth(self) -> int:
+        """Tasks waiting for a worker slot"""
+        return len(self._heap) + sum(len(parked) for parked in self._parked.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    async def start(self) -> List[Dict[str, Any]]:
+        """Start dispatching and re-enqueue tasks left active by a previous process"""
+        if self.started:
+            return []
+        self._wakeup = asyncio.Event()
+
+        recovered = self.store.active()
+        for record in recovered:
+            self._push(record['priority'], record['id'], record['type'])
+
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        self._sweeper = asyncio.create_task(self._retention_loop())
+        self._wakeup.set()
+
+        if recovered:
+            logger.info(f"Re-enqueued {len(recovered)} automation tasks from {self.store.path}")
+        return recovered
+
+    async def stop(self) -> List[str]:
+        """Stop dispatching; interrupted tasks stay active in the store and resume on next start"""
+        for background in (self._dispatcher, self._sweeper):
+            if background:
+                background.cancel()
+        self._dispatcher = self._sweeper = None
+
+        interrupted = list(self._running)
+        for task in self._running.values():
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+        self._running.clear()
+        self._running_by_type.clear()
+        self._heap.clear()
+        self._parked.clear()
+        return interrupted
+
+    def check_capacity(self):
+        """Raise QueueFullError when no more tasks may wait; call before persisting a new task"""
+        if self.depth >= self.max_queued:
+            raise QueueFullError(f"Automation queue is full ({self.max_queued} tasks waiting)")
+
+    def submit(self, task_id: str, task_type: str, priority: int):
+        """Enqueue a task whose record and payload are already in the store"""
+        self.check_capacity()
+        self._push(priority, task_id, task_type)
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _push(self, priority: int, task_id: str, task_type: str):
+        heapq.heappush(self._heap, (priority, next(self._sequence), task_id, task_type))
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._heap and len(self._running) < self.max_workers:
+                entry = heapq.heappop(self._heap)
+                task_type = entry[3]
+                limit = self.type_limits.get(task_type)
+                if limit is not None and self._running_by_type[task_type] >= limit:
+                    # Hold it aside, in priority order, until one of its type's slots frees up
+                    heapq.heappush(self._parked[task_type], entry)
+                    continue
+                self._launch(entry)
+
+    def _launch(self, entry: Tuple[int, int, str, str]):
+        _, _, task_id, task_type = entry
+        self._running_by_type[task_type] += 1
+        task = asyncio.create_task(self.handler(task_id, task_type, self.store.payload(task_id)))
+        self._running[task_id] = task
+        task.add_done_callback(lambda _, task_id=task_id, task_type=task_type: self._finished(task_id, task_type))
+
+    def _finished(self, task_id: str, task_type: str):
+        if self._running.pop(task_id, None) is None:
+            return
+        self._running_by_type[task_type] -= 1
+        if self._parked[task_type]:
+            heapq.heappush(self._heap, heapq.heappop(self._parked[task_type]))
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _retention_loop(self):
+        interval = max(1.0, min(self.retention_seconds / 10, 300.0))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                purged = self.store.purge_finished(time.time() - self.retention_seconds)
+                if purged:
+                    logger.info(f"Purged {purged} finished automation tasks past retention")
+            except Exception as e:
+                logger.error(f"Error purging finished automation tasks: {str(e)}")
@@ -0,0 +1,64 @@
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Hashable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Write-behind view counts: reads are queued and applied to the store in batches.
+
+    record() only appends the key to a deque, which is atomic under the GIL, so
+    readers on the event loop and on worker threads never take a lock or write to
+    the article itself. drain() pops what is queued, aggregates it per key and
+    hands the totals back for the owner to apply in one pass.
+    """
+
+    def __init__(self, batch_size: int = 256, flush_interval: float = 5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: deque = deque()
+        self._last_flush = time.monotonic()
+        self.recorded = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, key: Hashable) -> bool:
+        """Queue one view; True when a flush is due"""
+        self._pending.append(key)
+        self.recorded += 1
+        return (
+            len(self._pending) >= self.batch_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def drain(self) -> Counter:
+        """Pop everything queued so far and return the count per key"""
+        counts: Counter = Counter()
+        pending = self._pending
+        # Bounded by the length seen now, so concurrent record() calls cannot keep it spinning
+        for _ in range(len(pending)):
+            try:
+                counts[pending.popleft()] += 1
+            except IndexError:
+                break
+        self._last_flush = time.monotonic()
+        drained = sum(counts.values())
+        self.flushed += drained
+        if drained:
+            self.flushes += 1
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._pending),
+            'recorded': self.recorded,
+            'flushed': self.flushed,
+            'flushes': self.flushes,
+            'batch_size': self.batch_size,
+            'flush_interval_seconds': self.flush_interval
+        }
@@ -0,0 +1,98 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from services.executor import AnalysisExecutor, parse_policy
+from services.problem_analyzer import ProblemAnalyzer
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+class _Service:
+    async def describe(self, value):
+        return value, request_id.get(), threading.current_thread().name
+
+
+class _BrokenPool(Executor):
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_parse_policy():
+    assert parse_policy(' problems.analyze = Process ,kb.search=thread,, ') == {
+        'problems.analyze': 'process', 'kb.search': 'thread'
+    }
+    assert parse_policy(None) == parse_policy('') == {}
+    with pytest.raises(ValueError):
+        parse_policy('problems.analyze=gpu')
+
+
+def test_policy_overrides_the_defaults():
+    executor = AnalysisExecutor({}, policy={'problems.analyze': 'inline', 'kb.search': 'thread'})
+    assert executor.mode_for('problems.analyze') == 'inline'
+    assert executor.mode_for('patches.analyze') == 'process'
+    assert executor.mode_for('kb.search') == 'thread'
+    assert executor.mode_for('chat.message') == 'inline'
+
+
+def test_thread_mode_carries_the_request_context():
+    executor = AnalysisExecutor({'service': _Service()}, policy={'work': 'thread', 'quick': 'inline'}, thread_workers=2)
+
+    async def run():
+        await executor.start()
+        request_id.set('req-1')
+        try:
+            return (
+                await executor.run('work', 'service', 'describe', 1),
+                await executor.run('quick', 'service', 'describe', 2)
+            )
+        finally:
+            await executor.shutdown()
+
+    threaded, inline = asyncio.run(run())
+    assert threaded[:2] == (1, 'req-1') and threaded[2].startswith('analysis')
+    assert inline == (2, 'req-1', threading.current_thread().name)
+
+
+def test_broken_process_pool_is_recreated(monkeypatch):
+    executor = AnalysisExecutor({'problem_analyzer': object()})
+    replacement = _BrokenPool()
+    monkeypatch.setattr(executor, '_create_process_pool', lambda: replacement)
+    executor._process_pool = _BrokenPool()
+
+    async def run():
+        with pytest.raises(BrokenProcessPool):
+            await executor.run('problems.analyze', 'problem_analyzer', 'analyze_recurring_problems', [], 30)
+
+    asyncio.run(run())
+    assert executor._process_pool is replacement
+
+
+def test_warm_up_waits_for_every_worker_process():
+    executor = AnalysisExecutor(
+        {'problem_analyzer': ProblemAnalyzer()}, policy={'problems.analyze': 'process'}, process_workers=2
+    )
+
+    async def run():
+        executor._thread_pool = ThreadPoolExecutor(max_workers=1)
+        executor._process_pool = executor._create_process_pool()
+        try:
+            pids = await executor._warm_process_pool()
+            result = await executor.run('problems.analyze', 'problem_analyzer', 'analyze_recurring_problems', [], 30)
+            return pids, result
+        finally:
+            await executor.shutdown()
+
+    pids, result = asyncio.run(run())
+    assert len(pids) == 2 and os.getpid() not in pids
+    assert result['total_incidents'] == 0
@@ -0,0 +1,73 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from types import MappingProxyType
+
+import numpy as np
+import pytest
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from services import fast_json
+from services.fast_json import FastJSONResponse, resolve_encoder
+
+
+class Color(Enum):
+    RED = 'red'
+
+
+class Point(BaseModel):
+    x: int
+    y: int
+
+
+PAYLOAD = {
+    'frozen': MappingProxyType({'actions': ('reset', 'retry'), 'nested': MappingProxyType({'a': 1})}),
+    'tags': frozenset(['vpn']),
+    'created': datetime(2024, 1, 2, 3, 4, 5),
+    'day': date(2024, 1, 2),
+    'at': time(3, 4, 5),
+    'color': Color.RED,
+    'price': Decimal('1.5'),
+    'point': Point(x=1, y=2),
+    'text': 'café',
+}
+
+
+@pytest.mark.parametrize('name', ['stdlib', 'orjson'])
+def test_fallbacks_match_jsonable_encoder(name):
+    dumps = resolve_encoder(name)
+    assert json.loads(dumps(PAYLOAD)) == jsonable_encoder(
+        {**PAYLOAD, 'frozen': {'actions': ['reset', 'retry'], 'nested': {'a': 1}}}
+    )
+
+
+@pytest.mark.parametrize('name', ['stdlib', 'orjson'])
+def test_numpy_values_encode_as_plain_numbers(name):
+    dumps = resolve_encoder(name)
+    payload = {'count': np.int64(3), 'score': np.float64(0.5), 'flags': np.array([True, False]), 'row': np.arange(3)}
+    assert json.loads(dumps(payload)) == {'count': 3, 'score': 0.5, 'flags': [True, False], 'row': [0, 1, 2]}
+
+
+def test_encoders_produce_identical_bytes():
+    payload = {'message': 'café', 'items': [1, 2.5, None, True], 'frozen': MappingProxyType({'k': (1, 2)})}
+    assert resolve_encoder('stdlib')(payload) == resolve_encoder('orjson')(payload)
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        resolve_encoder('stdlib')({'value': object()})
+    with pytest.raises(ValueError):
+        resolve_encoder('ujson')
+
+
+def test_orjson_setting_falls_back_to_stdlib_when_missing(monkeypatch):
+    monkeypatch.setattr(fast_json, 'orjson', None)
+    assert resolve_encoder('orjson') is fast_json._stdlib_dumps
+    assert resolve_encoder('auto') is fast_json._stdlib_dumps
+
+
+def test_response_renders_with_the_configured_encoder():
+    response = FastJSONResponse({'frozen': MappingProxyType({'a': (1,)})})
+    assert json.loads(response.body) == {'frozen': {'a': [1]}}
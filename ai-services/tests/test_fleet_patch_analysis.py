@@ -0,0 +1,89 @@
+import asyncio
+import random
+
+import pytest
+
+from services.patch_catalog import PatchCatalog
+from services.patch_intelligence import PatchIntelligence
+
+
+SYSTEM_TYPES = ['windows', 'linux', 'database', 'web']
+SEVERITIES = ['critical', 'important', 'moderate', 'low']
+
+
+def random_catalog(rng, count):
+    """Patches with supersedence chains, system type targeting and CVEs"""
+    return [
+        {
+            'patch_id': f"KB{i:07d}",
+            'title': f"Update {i}",
+            'severity': severity,
+            'category': rng.choice(['security', 'update', 'feature', 'driver']),
+            'release_date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'size_mb': rng.randint(1, 500),
+            'reboot_required': rng.random() < 0.5,
+            'supersedes': [f"KB{j:07d}" for j in rng.sample(range(i), min(i, rng.randint(0, 2)))],
+            'system_types': rng.sample(SYSTEM_TYPES, rng.randint(0, 2)),
+            'cve_list': [f"CVE-2024-{i:05d}"] if severity in ('critical', 'important') else []
+        }
+        for i, severity in enumerate(rng.choice(SEVERITIES) for _ in range(count))
+    ]
+
+
+def random_fleet(rng, patches, count):
+    patch_ids = [patch['patch_id'] for patch in patches]
+    return [
+        {
+            'system_id': f"SYS{i:06d}",
+            'current_patches': rng.sample(patch_ids, rng.randint(0, min(len(patch_ids), 50))),
+            'system_type': rng.choice(SYSTEM_TYPES),
+            'criticality_level': rng.choice(['critical', 'high', 'medium', 'low'])
+        }
+        for i in range(count)
+    ]
+
+
+def per_host(intelligence, system):
+    return asyncio.run(intelligence.analyze_patch_requirements(
+        system['system_id'], system['current_patches'], system['system_type'], system['criticality_level']
+    ))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_fleet_matches_per_host_analysis(seed):
+    rng = random.Random(seed)
+    patches = random_catalog(rng, rng.randint(50, 300))
+    systems = random_fleet(rng, patches, 40)
+    for system in systems:
+        # Cover priority multipliers, unknown system types and patches missing from the catalog
+        if rng.random() < 0.3:
+            system['criticality_level'] = rng.choice(['production', 'staging', 'test'])
+        if rng.random() < 0.1:
+            system['system_type'] = 'mainframe'
+        if rng.random() < 0.2:
+            system['current_patches'] = system['current_patches'] + ['KB9999999']
+
+    intelligence = PatchIntelligence(PatchCatalog(patches=patches))
+    intelligence.fleet_analyzer.chunk_size = 16
+    fleet = [result for chunk in intelligence.fleet_analyzer.analyze(systems, include_patches=True) for result in chunk]
+
+    assert [result['system_id'] for result in fleet] == [system['system_id'] for system in systems]
+    for system, result in zip(systems, fleet):
+        expected = per_host(intelligence, system)
+        assessment = expected['patch_assessment']
+        assert result['missing_patches'] == [patch['patch_id'] for patch in expected['missing_patches']]
+        assert result['available_patch_count'] == expected['available_patch_count']
+        assert result['missing_patch_count'] == expected['missing_patch_count']
+        assert result['severity_counts'] == {
+            level: len(assessment[f"{level}_patches"]) for level in ('critical', 'important', 'moderate', 'low')
+        }
+        assert result['security_patch_count'] == len(assessment['security_patches'])
+        assert result['total_score'] == pytest.approx(assessment['total_score'], abs=0.01)
+        for name, value in expected['risk_analysis'].items():
+            if name == 'risk_level':
+                assert result['risk_analysis'][name] == value
+            else:
+                # Both sides round to one decimal after summing in a different order
+                assert result['risk_analysis'][name] == pytest.approx(value, abs=0.11)
+        compliance = {key: value for key, value in expected['compliance_status'].items() if key != 'next_review_date'}
+        assert result['compliance_status'] == compliance
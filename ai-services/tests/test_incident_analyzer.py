@@ -0,0 +1,37 @@
+import asyncio
+
+from services.incident_analyzer import IncidentAnalyzer
+
+
+def analyze(analyzer, title='VPN connection timeout', description='Users cannot reach the VPN gateway'):
+    return asyncio.run(analyzer.analyze_incident(title, description, 'high', ['vpn-gw-01'], ['timeout']))
+
+
+def test_analysis_does_not_grow_the_history(monkeypatch):
+    monkeypatch.delenv('INCIDENT_INDEX_PATH', raising=False)
+    analyzer = IncidentAnalyzer()
+    results = [analyze(analyzer) for _ in range(3)]
+    batch = asyncio.run(analyzer.analyze_incidents([
+        {'title': 'VPN connection timeout', 'description': 'gateway', 'severity': 'high'}
+    ] * 3))
+
+    assert len(analyzer.similarity_index) == 0
+    assert all(result['similar_incidents'] == [] for result in results)
+    ids = [result['incident_id'] for result in results] + [item['result']['incident_id'] for item in batch]
+    assert len(set(ids)) == len(ids)
+
+
+def test_resolved_history_is_returned_with_its_resolution(monkeypatch):
+    monkeypatch.delenv('INCIDENT_INDEX_PATH', raising=False)
+    analyzer = IncidentAnalyzer()
+    added = asyncio.run(analyzer.add_historical_incidents([{
+        'incident_id': 'INC-1',
+        'title': 'VPN connection timeout',
+        'description': 'Users cannot reach the VPN gateway',
+        'resolution': 'Restarted the VPN concentrator',
+        'resolution_time': 2
+    }]))
+
+    similar = analyze(analyzer)['similar_incidents']
+    assert added == 1 and len(analyzer.similarity_index) == 1
+    assert [(match['incident_id'], match['resolution']) for match in similar] == [('INC-1', 'Restarted the VPN concentrator')]
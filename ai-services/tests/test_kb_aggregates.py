@@ -0,0 +1,116 @@
+import asyncio
+import random
+
+import pytest
+
+from services.kb_aggregates import KnowledgeBaseAggregates, TopK
+from services.knowledge_base import KnowledgeBaseService
+
+
+def ids(articles):
+    return [article['id'] for article in articles]
+
+
+def brute_force_top(knowledge_base, field, limit):
+    # sorted() is stable, so equal values keep insertion order: ties go to the older article
+    return ids(sorted(knowledge_base.articles, key=lambda article: article[field], reverse=True)[:limit])
+
+
+def test_topk_rebuilds_only_when_a_kept_item_falls():
+    values = {'a': 5, 'b': 4, 'c': 3, 'd': 2}
+    order = {article_id: position for position, article_id in enumerate(values)}
+    topk = TopK(2, lambda: ((value, -order[key], key) for key, value in values.items()))
+    for key, value in values.items():
+        topk.add((value, -order[key], key))
+    assert topk.top(2) == ['a', 'b'] and topk.top(3) is None
+
+    values['d'] = 6
+    topk.update((6, -order['d'], 'd'))
+    assert topk.top(2) == ['d', 'a'] and topk.rebuilds == 0
+
+    values['a'] = 1
+    topk.update((1, -order['a'], 'a'))
+    assert topk.top(2) == ['d', 'b'] and topk.rebuilds == 1
+
+    del values['d']
+    topk.discard('d')
+    assert topk.top(2) == ['b', 'c'] and topk.rebuilds == 2
+
+
+def test_running_sums_follow_refresh_and_remove():
+    articles = {}
+    aggregates = KnowledgeBaseAggregates(articles, capacity=2)
+    for article_id, views, rating, category in (('A', 3, 4.0, 'Network'), ('B', 5, 2.0, 'Email'), ('C', 1, 5.0, 'Network')):
+        articles[article_id] = {'id': article_id, 'views': views, 'rating': rating, 'category': category}
+        aggregates.refresh(articles[article_id])
+
+    articles['A'].update(views=10, rating=3.0, category='Email')
+    aggregates.refresh(articles['A'])
+    del articles['B']
+    aggregates.remove('B')
+    aggregates.remove('B')
+
+    assert (len(aggregates), aggregates.total_views, aggregates.rating_sum) == (2, 11, 8.0)
+    assert aggregates.category_counts == {'Email': 1, 'Network': 1}
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_rankings_and_statistics_match_brute_force(seed, monkeypatch):
+    monkeypatch.delenv('KB_INDEX_PATH', raising=False)
+    monkeypatch.setenv('KB_TOPK_CAPACITY', '4')
+    monkeypatch.setenv('KB_VIEW_FLUSH_BATCH', '3')
+    rng = random.Random(seed)
+    knowledge_base = KnowledgeBaseService()
+    categories = ['Network', 'Email', 'Hardware']
+
+    async def step(i):
+        action = rng.random()
+        article_ids = list(knowledge_base.articles_by_id)
+        if action < 0.25 or not article_ids:
+            await knowledge_base.add_article({'title': f"article {i}", 'content': 'text', 'category': rng.choice(categories)})
+        elif action < 0.6:
+            await knowledge_base.get_article(rng.choice(article_ids))
+        elif action < 0.75:
+            article_id = rng.choice(article_ids)
+            # Same second updates tie on updated_at; pin a random time to exercise both orders
+            await knowledge_base.update_article(article_id, {'category': rng.choice(categories)})
+            knowledge_base.articles_by_id[article_id]['updated_at'] = f"2024-01-{rng.randint(10, 20)}"
+            knowledge_base.aggregates.refresh(knowledge_base.articles_by_id[article_id])
+        elif action < 0.9:
+            knowledge_base.flush_views()
+            # Rating weighs by views, so only articles that have been read can be rated
+            viewed = [article_id for article_id in article_ids if knowledge_base.articles_by_id[article_id]['views']]
+            if viewed:
+                await knowledge_base.rate_article(rng.choice(viewed), rng.randint(1, 5))
+        else:
+            await knowledge_base.delete_article(rng.choice(article_ids))
+
+    async def check():
+        for limit in (1, 3, 4, 6):
+            assert ids(await knowledge_base.get_popular_articles(limit)) == brute_force_top(knowledge_base, 'views', limit)
+            assert ids(await knowledge_base.get_recent_articles(limit)) == brute_force_top(knowledge_base, 'updated_at', limit)
+            aggregates = knowledge_base.aggregates
+            assert ids(aggregates.ranked(aggregates.highest_rated, 'rating', limit)) == brute_force_top(knowledge_base, 'rating', limit)
+
+        statistics = await knowledge_base.get_statistics()
+        articles = knowledge_base.articles
+        counts = {}
+        for article in articles:
+            counts[article['category']] = counts.get(article['category'], 0) + 1
+        assert statistics['total_articles'] == len(articles)
+        assert statistics['total_views'] == sum(article['views'] for article in articles)
+        assert statistics['average_rating'] == pytest.approx(
+            round(sum(article['rating'] for article in articles) / len(articles), 2) if articles else 0, abs=0.01
+        )
+        assert statistics['articles_by_category'] == counts
+        for key, field in (('most_viewed_article', 'views'), ('highest_rated_article', 'rating')):
+            assert ids([statistics[key]] if statistics[key] else []) == brute_force_top(knowledge_base, field, 1)
+
+    async def run():
+        for i in range(150):
+            await step(i)
+            if i % 10 == 9:
+                await check()
+
+    asyncio.run(run())
+    knowledge_base.search_index.close()
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from services.kb_import import KnowledgeBaseImport
+from services.knowledge_base import KnowledgeBaseService
+
+
+def ndjson(count, start=0):
+    return b''.join(
+        json.dumps({'id': f"IMP{i}", 'title': f"imported article {i}", 'content': 'vpn password reset'}).encode() + b'\n'
+        for i in range(start, start + count)
+    )
+
+
+def segment_entries(path):
+    return sorted(entry for entry in os.listdir(path) if entry.startswith('seg-'))
+
+
+@pytest.fixture
+def knowledge_base(tmp_path):
+    knowledge_base = KnowledgeBaseService(index_path=str(tmp_path))
+    yield knowledge_base
+    knowledge_base.search_index.close()
+
+
+def test_abort_cleans_up_an_unfinished_import(knowledge_base, tmp_path):
+    async def run():
+        importer = KnowledgeBaseImport(knowledge_base, workers=2, chunk_size=10)
+        await importer.feed(ndjson(45))
+        assert importer._pool is not None and knowledge_base.search_index._reserved
+        await importer.abort()
+        return importer
+
+    importer = asyncio.run(run())
+    assert importer._pool is None
+    assert not knowledge_base.search_index._reserved
+    assert segment_entries(tmp_path) == []
+    assert 'IMP0' not in knowledge_base.articles_by_id
+
+
+def test_failed_finish_removes_the_built_segments(knowledge_base, tmp_path, monkeypatch):
+    async def failing_apply(*args, **kwargs):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(knowledge_base, 'apply_import', failing_apply)
+    importer = KnowledgeBaseImport(knowledge_base, workers=1, chunk_size=10)
+
+    async def run():
+        await importer.feed(ndjson(25))
+        with pytest.raises(RuntimeError):
+            await importer.finish()
+
+    asyncio.run(run())
+    assert not knowledge_base.search_index._reserved
+    assert segment_entries(tmp_path) == []
+
+
+def test_abort_after_finish_keeps_the_import(knowledge_base, tmp_path):
+    async def run():
+        importer = KnowledgeBaseImport(knowledge_base, workers=1, chunk_size=10)
+        await importer.feed(ndjson(25))
+        stats = await importer.finish()
+        await importer.abort()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats['imported'] == 25 and stats['segments'] == 3
+    assert len([entry for entry in segment_entries(tmp_path) if not entry.endswith('.npy')]) == 3
+    assert 'IMP24' in knowledge_base.articles_by_id
+
+
+def test_replace_import_drops_views_queued_for_the_old_articles(knowledge_base):
+    line = json.dumps({'id': 'KB001', 'title': 'Replacement article', 'content': 'new content', 'views': 7})
+
+    async def run():
+        await knowledge_base.get_article('KB001')
+        await knowledge_base.get_article('KB001')
+        assert len(knowledge_base.view_counter) == 2
+        importer = KnowledgeBaseImport(knowledge_base, replace=True, workers=1)
+        await importer.feed(line.encode() + b'\n')
+        await importer.finish()
+        knowledge_base.flush_views()
+
+    asyncio.run(run())
+    assert list(knowledge_base.articles_by_id) == ['KB001']
+    assert knowledge_base.articles_by_id['KB001']['views'] == 7
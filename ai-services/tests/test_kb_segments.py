@@ -0,0 +1,54 @@
+import os
+import random
+
+import numpy as np
+
+from services.kb_segments import Segment, TermTable, build_segment, merge_segments
+
+FIELD_WEIGHTS = {'title': 2.0, 'content': 1.0}
+
+
+def table(terms):
+    arrays = TermTable.arrays(sorted(terms))
+    return TermTable(arrays['term_data'], arrays['term_offsets'])
+
+
+def articles(seed, count):
+    rng = random.Random(seed)
+    words = [''.join(rng.choices('abcdef', k=rng.randint(2, 7))) for _ in range(200)]
+    return [
+        {'id': f"KB{seed}-{i}", 'title': ' '.join(rng.sample(words, 3)), 'content': ' '.join(rng.sample(words, 6))}
+        for i in range(count)
+    ]
+
+
+def test_term_table_lookups():
+    terms = table(['network', 'net', 'é', 'password', 'pass', 'z' * 10000])
+    assert terms.tolist() == ['net', 'network', 'pass', 'password', 'z' * 10000, 'é']
+    assert [terms.find(term) for term in ('net', 'é', 'z' * 10000, 'ne', 'zz')] == [0, 5, 4, -1, -1]
+    assert terms.prefix_range('pass') == (2, 4)
+    assert terms.tolist(1, 3) == ['network', 'pass']
+    assert len(table([])) == 0 and table([]).find('a') == -1
+
+
+def test_long_term_does_not_widen_the_stored_terms(tmp_path):
+    batch = articles(0, 50)
+    batch[0]['content'] += ' ' + 'x' * 20000
+    directory = os.path.join(tmp_path, 'seg-1')
+    build_segment('seg-1', batch, FIELD_WEIGHTS).write(directory)
+    segment = Segment.load(directory)
+    total_length = sum(len(term) for term in segment.terms.tolist())
+    assert os.path.getsize(os.path.join(directory, 'term_data.npy')) < total_length + 1024
+    assert segment.postings('x' * 20000)[0].tolist() == [0]
+
+
+def test_merge_matches_a_fresh_build(tmp_path):
+    parts = [build_segment(f"seg-{seed}", articles(seed, 80), FIELD_WEIGHTS) for seed in range(3)]
+    masks = [np.random.default_rng(seed).random(80) < 0.6 for seed in range(3)]
+    merged, _, _ = merge_segments('seg-9', list(zip(parts, masks)), str(tmp_path))
+
+    live = [article for part, mask in zip(parts, masks) for article, keep in zip(part.read_articles(), mask) if keep]
+    expected = build_segment('seg-10', live, FIELD_WEIGHTS)
+    assert merged.terms.tolist() == expected.terms.tolist()
+    assert merged.offsets.tolist() == expected.offsets.tolist()
+    assert merged.docs.tolist() == expected.docs.tolist()
@@ -0,0 +1,20 @@
+from services.keyword_matcher import KeywordMatcher
+
+
+def make_matcher():
+    matcher = KeywordMatcher()
+    matcher.register('issues', {'network': ['network', 'outage'], 'disk': ['disk']})
+    return matcher
+
+
+def test_scan_many_when_lowercasing_changes_length():
+    matcher = make_matcher()
+    texts = ['İ' * 22, 'network outage', 'x']
+    hits = matcher.scan_many(texts)
+    assert [sorted(hit.keywords) for hit in hits] == [[], ['network', 'outage'], []]
+
+
+def test_scan_many_matches_scan():
+    matcher = make_matcher()
+    texts = ['Disk full', 'İstanbul NETWORK', 'no match', 'Disk full', 'outageİ disk', '']
+    assert [hit.keywords for hit in matcher.scan_many(texts)] == [matcher.scan(text).keywords for text in texts]
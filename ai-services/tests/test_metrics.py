@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+import main
+from services.registry import service_registry
+
+
+def samples(text):
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+
+
+def test_metrics_exposition_labels_requests_by_route_template():
+    client = TestClient(main.app)
+    for user_id in ('alice', 'bob'):
+        assert client.get(f"/api/chat/suggestions/{user_id}").status_code == 200
+    assert client.get('/health').status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    scraped = samples(response.text)
+    route = (('method', 'GET'), ('route', '/api/chat/suggestions/{user_id}'), ('status', '200'))
+    assert scraped[('ai_http_request_duration_seconds_count', route)] >= 2
+    assert not any('alice' in dict(labels).get('route', '') for _, labels in scraped)
+
+
+def test_scrapes_report_created_services_without_building_others():
+    client = TestClient(main.app)
+    client.get('/api/chat/suggestions/alice')
+    created = {name for name in ('chatbot', 'knowledge_base', 'automation_engine') if service_registry.is_created(name)}
+
+    scraped = samples(client.get('/metrics').text)
+    stores = {dict(labels)['store'] for name, labels in scraped if name == 'ai_store_entries'}
+    assert 'conversation_history' in stores
+    assert ('kb_articles' in stores) == ('knowledge_base' in created)
+    assert {name for name in ('chatbot', 'knowledge_base', 'automation_engine') if service_registry.is_created(name)} == created
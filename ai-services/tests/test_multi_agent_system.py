@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from services.multi_agent_system import BaseAgent, MultiAgentSystem
+from services.response_templates import encode_json
+
+MESSAGES = [
+    'hello',
+    'the email server is down, critical outage',
+    'urgent: my laptop is not working, please create ticket',
+    'create ticket for the printer when possible',
+    'new ticket: outlook keeps crashing after the update',
+    'I need to install software on my laptop',
+    'recurring pattern of login failures',
+    'provision a new virtual machine',
+    'apply the latest security patch',
+    'onboard a new user account',
+    'harden the operating system baseline',
+]
+
+
+def plain(response):
+    return json.loads(encode_json(response))
+
+
+def uncached_system(monkeypatch):
+    system = MultiAgentSystem()
+    for agent in system.agents.values():
+        monkeypatch.setattr(agent, 'response_features', lambda message, user_context: None)
+    return system
+
+
+def test_cached_and_uncached_routes_give_identical_responses(monkeypatch):
+    cached, uncached = MultiAgentSystem(), uncached_system(monkeypatch)
+
+    async def run(system, preferred_agent):
+        responses = []
+        # Twice over, so the second pass is served from the template cache
+        for message in MESSAGES * 2:
+            responses.append(plain(await system.route_message(message, {}, preferred_agent)))
+            responses.append(json.loads(await system.route_message_json(message, {}, preferred_agent)))
+        return responses
+
+    for preferred_agent in [None] + list(cached.agents):
+        assert asyncio.run(run(cached, preferred_agent)) == asyncio.run(run(uncached, preferred_agent))
+    assert cached.response_cache.hits > 0 and len(uncached.response_cache) == 0
+
+
+def test_service_desk_overlay_carries_each_requests_ticket_suggestion():
+    system = MultiAgentSystem()
+
+    async def run():
+        return [
+            await system.route_message(message, {}, 'servicedesk')
+            for message in ('create ticket for outlook email', 'create ticket for my mail client')
+        ]
+
+    first, second = asyncio.run(run())
+    assert len(system.response_cache) == 1
+    assert first['ticket_suggestion']['description'] == 'create ticket for outlook email'
+    assert second['ticket_suggestion']['description'] == 'create ticket for my mail client'
+    assert first['ticket_suggestion']['category'] == second['ticket_suggestion']['category'] == 'Email'
+
+
+def test_agents_are_uncacheable_unless_they_opt_in():
+    class DynamicAgent(BaseAgent):
+        pass
+
+    class StaticAgent(BaseAgent):
+        static_response = True
+
+    assert DynamicAgent('dynamic', []).response_features('hi', {}) is None
+    assert StaticAgent('static', []).response_features('hi', {}) == ((), None)
@@ -0,0 +1,68 @@
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services.online_problems import OnlineProblemDetector
+from services.similarity_join import UnionFind, jaccard
+
+NOW = 1_700_000_000.0
+
+
+def detector(threshold=0.7, window_days=1):
+    analyzer = SimpleNamespace(correlation_threshold=0.5, min_incident_count=3)
+    return OnlineProblemDetector(analyzer, window_days=window_days, correlation_threshold=threshold,
+                                 min_incident_count=1)
+
+
+def incident(words, created_at):
+    return {'title': ' '.join(words), 'created_date': datetime.fromtimestamp(created_at).isoformat()}
+
+
+def groups_of(online):
+    return sorted(sorted(group.members) for group in online._groups)
+
+
+def brute_force_groups(online):
+    seqs = sorted(online._records)
+    union_find = UnionFind(len(seqs))
+    for i in range(len(seqs)):
+        for j in range(i + 1, len(seqs)):
+            a = online._records[seqs[i]].tokens
+            b = online._records[seqs[j]].tokens
+            if a and b and jaccard(a, b) > online.correlation_threshold:
+                union_find.union(i, j)
+    return sorted(sorted(seqs[index] for index in component) for component in union_find.components())
+
+
+def test_zero_threshold_and_time_are_not_defaults():
+    online = detector(threshold=0.0)
+    assert online.correlation_threshold == 0.0
+    assert online.push([incident(['a'], 1.0)], now=0.0)['accepted'] == 1
+    assert online.expire(now=0.0) == 0
+
+
+def test_identical_incidents_share_one_node():
+    online = detector()
+    online.push([incident(['disk', 'full', 'db01'], NOW + i) for i in range(200)], now=NOW + 200)
+    assert len({id(node) for node in online._node_of.values()}) == 1
+    assert groups_of(online) == [list(range(200))]
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_matches_brute_force_through_expiry(seed):
+    rng = random.Random(seed)
+    online = detector(threshold=rng.choice([0.3, 0.5, 0.7, 1.0]))
+    cores = [rng.sample([f"t{i}" for i in range(15)], rng.randint(1, 6)) for _ in range(4)]
+    clock = NOW
+    for _ in range(rng.randint(1, 8)):
+        batch = []
+        for _ in range(rng.randint(0, 25)):
+            words = list(rng.choice(cores))
+            if rng.random() < 0.4:
+                words.append(f"u{rng.randint(0, 5)}")
+            batch.append(incident(words, clock + rng.uniform(0, 3600)))
+        clock += rng.uniform(0, 86400)
+        online.push(batch, now=clock)
+        assert groups_of(online) == brute_force_groups(online)
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from services.patch_catalog import PatchCatalog
+
+
+def patch(patch_id, supersedes=(), system_types=None):
+    return {
+        'patch_id': patch_id,
+        'severity': 'moderate',
+        'category': 'update',
+        'release_date': '2024-01-01',
+        'supersedes': list(supersedes),
+        'system_types': system_types
+    }
+
+
+def brute_force_superseded(patches, installed):
+    edges = {item['patch_id']: item['supersedes'] for item in patches}
+    seen = set()
+    pending = list(installed)
+    while pending:
+        for target in edges.get(pending.pop(), ()):
+            if target not in seen:
+                seen.add(target)
+                pending.append(target)
+    return seen
+
+
+def random_catalog(rng, size):
+    patches = []
+    for i in range(size):
+        # Mostly older targets, with some forward edges that close cycles and unknown IDs
+        targets = {f"P{rng.randrange(size)}" for _ in range(rng.randint(0, 3))}
+        if rng.random() < 0.1:
+            targets.add(f"GONE{rng.randrange(5)}")
+        patches.append(patch(f"P{i}", sorted(targets), rng.choice([None, ['windows'], ['linux', 'windows']])))
+    return patches
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_closure_matches_brute_force(seed):
+    rng = random.Random(seed)
+    patches = random_catalog(rng, 60)
+    catalog = PatchCatalog(patches=patches)
+    for _ in range(20):
+        installed = {f"P{rng.randrange(60)}" for _ in range(rng.randint(0, 4))}
+        superseded = brute_force_superseded(patches, installed)
+        assert catalog.superseded_by(installed) == superseded
+        system_type = rng.choice([None, 'windows', 'linux', 'solaris'])
+        assert catalog.missing(installed, system_type=system_type) == [
+            item for item in catalog.patches_for(system_type)
+            if item['patch_id'] not in installed and item['patch_id'] not in superseded
+        ]
+
+
+def test_cycle_members_supersede_each_other():
+    catalog = PatchCatalog(patches=[patch('A', ['B']), patch('B', ['C']), patch('C', ['A', 'OLD']), patch('D', ['A'])])
+    assert catalog.superseded_by(['A']) == {'A', 'B', 'C', 'OLD'}
+    assert catalog.superseded_by(['D']) == {'A', 'B', 'C', 'OLD'}
+    assert catalog.superseded_by(['OLD', 'UNKNOWN']) == frozenset()
+    assert catalog._snapshot.superseded['A'] is catalog._snapshot.superseded['C']
+
+
+def test_long_chain_only_keeps_newest_patch_missing():
+    patches = [patch(f"P{i}", [f"P{i - 1}"] if i else []) for i in range(3000)]
+    catalog = PatchCatalog(patches=patches)
+    assert len(catalog.superseded_by(['P2999'])) == 2999
+    assert catalog.missing(['P1500']) == patches[1501:]
+    assert catalog.missing([], available=[patch('EXTRA')]) == [patch('EXTRA')]
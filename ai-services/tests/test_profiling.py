@@ -0,0 +1,29 @@
+from services import executor
+from services.executor import AnalysisJob, _run_job
+from services.profiling import Profiler, merge_profile, span
+
+
+class _Service:
+    @span
+    async def work(self, value):
+        return self.helper(value)
+
+    @span
+    def helper(self, value):
+        return value * 2
+
+
+def test_worker_spans_merge_under_the_caller(monkeypatch):
+    monkeypatch.setitem(executor._worker_services, 'service', _Service())
+    assert _run_job(AnalysisJob('service', 'work', (2,))) == (4, None)
+
+    result, worker_profile = _run_job(AnalysisJob('service', 'work', (2,), profile=True))
+    assert result == 4
+    assert set(worker_profile) == {(), ('_Service.work',), ('_Service.work', '_Service.helper')}
+
+    profiler = Profiler(sample_rate=1.0)
+    frame, token = profiler.start()
+    merge_profile(worker_profile)
+    profiler.finish('POST /api/work', frame, token)
+    stacks = [line.rsplit(' ', 1)[0] for line in profiler.collapsed().splitlines()]
+    assert stacks == ['POST_/api/work', 'POST_/api/work;_Service.work', 'POST_/api/work;_Service.work;_Service.helper']
@@ -0,0 +1,52 @@
+import pytest
+
+from services.registry import LazyService, ServiceRegistry
+
+
+def make_registry():
+    registry = ServiceRegistry()
+    registry.register('counter', 'collections', 'Counter')
+    registry.register('ordered', 'collections', 'OrderedDict',
+                      factory=lambda cls, registry: cls(counter=registry.get('counter')))
+    return registry
+
+
+def test_proxy_builds_the_service_on_first_attribute_access():
+    registry = make_registry()
+    proxy = registry.proxy('counter')
+    assert isinstance(proxy, LazyService) and not registry.is_created('counter')
+    assert 'lazy' in repr(proxy)
+
+    proxy.update('aab')
+    assert registry.is_created('counter')
+    assert proxy.most_common(1) == [('a', 2)]
+    assert registry.get('counter') is registry.get('counter')
+    assert 'created' in repr(proxy)
+
+
+def test_factory_resolves_dependencies_through_the_registry():
+    registry = make_registry()
+    ordered = registry.get('ordered')
+    assert ordered['counter'] is registry.get('counter')
+    report = registry.report()
+    assert report['created'] == ['counter', 'ordered']
+    assert set(report['services']['counter']) == {'import_seconds', 'init_seconds', 'created_at'}
+
+
+def test_unknown_and_late_registrations_are_rejected():
+    registry = make_registry()
+    with pytest.raises(KeyError):
+        registry.get('missing')
+    with pytest.raises(KeyError):
+        registry.proxy('missing')
+    registry.get('counter')
+    with pytest.raises(ValueError):
+        registry.register('counter', 'collections', 'Counter')
+
+
+def test_preload_all_and_report_phases():
+    registry = make_registry()
+    assert registry.report()['services']['counter'] == {'state': 'lazy'}
+    assert registry.preload(['all']) == ['counter', 'ordered']
+    registry.record_phase('main_import', 0.123456)
+    assert registry.report()['phases'] == {'main_import': 0.1235}
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from services import result_cache
+from services.result_cache import AsyncResultCache
+
+
+def counting(value, delay=0.01):
+    calls = []
+
+    async def compute():
+        calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+
+    return compute, calls
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = AsyncResultCache()
+    compute, calls = counting('result')
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute('key', compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == ['result'] * 5
+    assert calls == ['result']
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 4, 0)
+    assert asyncio.run(cache.get_or_compute('key', compute)) == 'result'
+    assert cache.hits == 1 and calls == ['result']
+
+
+def test_cancelled_leader_does_not_fail_the_waiters():
+    cache = AsyncResultCache()
+    compute, calls = counting('result', delay=0.05)
+
+    async def run():
+        leader = asyncio.ensure_future(cache.get_or_compute('key', compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_compute('key', compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == 'result'
+    assert calls == ['result'] and len(cache) == 1
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = AsyncResultCache()
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError('backend down')
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute('key', failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+    assert len(attempts) == 1 and len(cache) == 0
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute('key', failing))
+    assert len(attempts) == 2
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: clock[0])
+    cache = AsyncResultCache(ttl_seconds=10)
+    compute, calls = counting('result', delay=0)
+
+    asyncio.run(cache.get_or_compute('key', compute))
+    clock[0] += 9
+    asyncio.run(cache.get_or_compute('key', compute))
+    assert len(calls) == 1
+    clock[0] += 2
+    asyncio.run(cache.get_or_compute('key', compute))
+    assert len(calls) == 2 and cache.hits == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AsyncResultCache(max_entries=2)
+
+    async def run():
+        for key in ('a', 'b', 'a', 'c'):
+            compute, _ = counting(key, delay=0)
+            await cache.get_or_compute(key, compute)
+
+    asyncio.run(run())
+    assert list(cache._entries) == ['a', 'c']
+
+
+def test_invalidated_computation_is_not_cached():
+    cache = AsyncResultCache()
+    compute, calls = counting('stale', delay=0.02)
+
+    async def run():
+        pending = asyncio.ensure_future(cache.get_or_compute('key', compute))
+        await asyncio.sleep(0)
+        assert cache.invalidate('key')
+        return await pending
+
+    assert asyncio.run(run()) == 'stale'
+    assert len(cache) == 0
+    assert not cache.invalidate('key')
@@ -0,0 +1,66 @@
+import asyncio
+import random
+
+import pytest
+
+from services.kb_segments import SegmentedIndex
+from services.search_index import TermIndex, TermLookup, edit_distance, max_edits
+
+
+def brute_force_similar(vocabulary, term, max_distance):
+    matches = []
+    for candidate in vocabulary:
+        distance = edit_distance(term, candidate, max_distance)
+        if candidate != term and distance <= max_distance:
+            matches.append((candidate, distance))
+    return sorted(matches, key=lambda match: (match[1], match[0]))
+
+
+def random_word(rng, length):
+    return ''.join(rng.choice('aeiostnrl1') for _ in range(length))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_similar_matches_brute_force(seed):
+    rng = random.Random(seed)
+    vocabulary = {random_word(rng, rng.randint(1, 11)) for _ in range(400)}
+    index = TermIndex()
+    index.add_many(list(vocabulary))
+    for _ in range(30):
+        term = random_word(rng, rng.randint(1, 11))
+        for max_distance in (1, 2, max_edits(term)):
+            assert index.similar(term, max_distance) == brute_force_similar(vocabulary, term, max_distance)
+
+
+def test_max_edits_allows_two_only_for_long_words():
+    assert [max_edits('x' * length) for length in (2, 3, 8, 9)] == [0, 1, 1, 2]
+
+
+def test_extended_leaves_the_original_untouched():
+    index = TermIndex()
+    index.add_many(['network', 'password'])
+    extended = index.extended(['passwords', 'reset'])
+    assert index.sorted_terms == ['network', 'password']
+    assert index.similar('passwordz', 1) == [('password', 1)]
+    assert extended.similar('passwordz', 1) == [('password', 1), ('passwords', 1)]
+    assert extended.with_prefix('pass', 10) == ['password', 'passwords']
+
+
+def test_segment_vocabulary_is_built_in_the_background():
+    index = SegmentedIndex({'title': 1.0}, memtable_limit=1000)
+    index.add('KB1', {'id': 'KB1', 'title': 'password reset'})
+    index.add('KB2', {'id': 'KB2', 'title': 'network configuration'})
+    asyncio.run(index.flush())
+    index.wait_for_vocabulary()
+    assert 'configuration' in index.terms
+    assert index.corrections('configuraton') == [('configuration', 1)]
+    index.close()
+
+
+def test_term_lookup_requires_terms_and_document_frequency():
+    class NoVocabulary(TermLookup):
+        def document_frequency(self, term):
+            return 0
+
+    with pytest.raises(TypeError):
+        NoVocabulary()
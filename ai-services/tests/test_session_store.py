@@ -0,0 +1,104 @@
+import asyncio
+
+from fakeredis import FakeAsyncRedis
+
+from services import session_store
+from services.chatbot import ChatbotService
+from services.session_store import InMemorySessionStore, RedisSessionStore, make_turn
+
+
+def turns(count, start=0):
+    return [make_turn('user', f"message {i}", 'u1') for i in range(start, start + count)]
+
+
+def texts(stored):
+    return [turn[2] for turn in stored]
+
+
+def test_memory_store_keeps_the_latest_turns():
+    store = InMemorySessionStore(max_turns=3)
+
+    async def run():
+        await store.append('s1', *turns(2))
+        await store.append('s1', *turns(3, start=2))
+        return await store.get('s1')
+
+    assert texts(asyncio.run(run())) == ['message 2', 'message 3', 'message 4']
+
+
+def test_memory_store_evicts_the_least_recently_used_session():
+    store = InMemorySessionStore(max_sessions=2)
+
+    async def run():
+        await store.append('s1', *turns(1))
+        await store.append('s2', *turns(1))
+        await store.get('s1')
+        await store.append('s3', *turns(1))
+        return [len(await store.get(session_id)) for session_id in ('s1', 's2', 's3')]
+
+    assert asyncio.run(run()) == [1, 0, 1]
+
+
+def test_memory_store_expires_idle_sessions(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(session_store.time, 'time', lambda: clock[0])
+    store = InMemorySessionStore(ttl_seconds=60)
+
+    async def run():
+        await store.append('s1', *turns(1))
+        clock[0] += 30
+        await store.append('s2', *turns(1))
+        clock[0] += 45
+        return len(store), await store.count(), await store.get('s1'), texts(await store.get('s2'))
+
+    assert asyncio.run(run()) == (1, 1, [], ['message 0'])
+
+
+def test_redis_store_round_trips_capped_sessions():
+    client = FakeAsyncRedis()
+    store = RedisSessionStore(client=client, max_turns=2, ttl_seconds=60)
+    user_turns = turns(2)
+    bot_turn = make_turn('bot', 'Try restarting', 'network_issue', {'intent': 'network_issue', 'actions': ['Restart']})
+
+    async def run():
+        await store.append('s1', *user_turns, bot_turn)
+        await store.append('s2', *turns(1))
+        stored = await store.get('s1')
+        ttl = await client.ttl('chat:session:s1')
+        counted = await store.count()
+        deleted = await store.delete('s1'), await store.delete('s1')
+        return stored, ttl, counted, deleted
+
+    stored, ttl, counted, deleted = asyncio.run(run())
+    assert stored == [user_turns[1], bot_turn]
+    assert 0 < ttl <= 60 and counted == 2 and deleted == (True, False)
+
+
+def test_chatbot_history_keeps_the_full_bot_response():
+    chatbot = ChatbotService(session_store=InMemorySessionStore())
+
+    async def run():
+        response = await chatbot.process_message('my wifi network is down', 'u1', 's1', {'site': 'HQ'})
+        return response, await chatbot.get_conversation_history('s1')
+
+    response, history = asyncio.run(run())
+    assert [entry.get('user_message') for entry in history] == ['my wifi network is down', None]
+    assert history[1]['bot_response'] == response
+    assert history[1]['intent'] == response['intent']
+
+
+def test_chatbot_records_the_user_turn_when_the_response_fails(monkeypatch):
+    chatbot = ChatbotService(session_store=InMemorySessionStore())
+
+    async def failing(*args, **kwargs):
+        raise RuntimeError('template missing')
+
+    monkeypatch.setattr(chatbot, '_generate_response', failing)
+
+    async def run():
+        response = await chatbot.process_message('reset my password', 'u1', 's1')
+        return response, await chatbot.get_conversation_history('s1')
+
+    response, history = asyncio.run(run())
+    assert response['intent'] == 'error'
+    assert [(entry['user_message'], entry['user_id']) for entry in history] == [('reset my password', 'u1')]
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from services.similarity_join import UnionFind, jaccard, jaccard_components
+
+
+def brute_force_components(token_sets, threshold):
+    union_find = UnionFind(len(token_sets))
+    for i in range(len(token_sets)):
+        for j in range(i + 1, len(token_sets)):
+            if jaccard(token_sets[i], token_sets[j]) > threshold:
+                union_find.union(i, j)
+    return sorted(union_find.components())
+
+
+def test_class_members_follow_their_representative():
+    core = {f"shared{i}" for i in range(10)}
+    token_sets = [
+        core | {'a1', 'a2', 'a3'},
+        core | {'b1', 'b2', 'b3'},
+        set(core),
+    ]
+    assert sorted(jaccard_components(token_sets, 0.7).components()) == [[0, 1, 2]]
+    assert sorted(jaccard_components(token_sets, 0.7).components()) == brute_force_components(token_sets, 0.7)
+
+
+@pytest.mark.parametrize('seed', range(500))
+def test_matches_brute_force(seed):
+    rng = random.Random(seed)
+    vocabulary = [f"t{i}" for i in range(rng.randint(5, 40))]
+    base_sets = [set(rng.sample(vocabulary, rng.randint(1, min(12, len(vocabulary))))) for _ in range(rng.randint(1, 6))]
+    token_sets = []
+    for _ in range(rng.randint(2, 30)):
+        # Variations of a few shared cores, so classes of identical-looking sets are common
+        tokens = set(rng.choice(base_sets))
+        tokens |= {f"u{rng.random()}" for _ in range(rng.randint(0, 4))}
+        if rng.random() < 0.3:
+            tokens -= set(rng.sample(sorted(tokens), min(len(tokens), rng.randint(0, 2))))
+        token_sets.append(tokens)
+    threshold = rng.choice([0.3, 0.5, 0.6, 0.7, 0.8, 0.9])
+
+    assert sorted(jaccard_components(token_sets, threshold).components()) == brute_force_components(token_sets, threshold)
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from services.automation_engine import AutomationEngine
+from services.task_queue import QueueFullError, TaskQueue, TaskStore
+
+
+def store_task(store, task_id, task_type='generic', priority=2, status='queued'):
+    record = {
+        'id': task_id,
+        'type': task_type,
+        'status': status,
+        'priority': priority,
+        'created_at': datetime.now().isoformat()
+    }
+    store.insert(record, {'name': task_id})
+
+
+class Recorder:
+    """Handler that records start order and holds each task until released"""
+
+    def __init__(self):
+        self.started = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, task_id, task_type, payload):
+        self.started.append(task_id)
+        await self.release.wait()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiting_tasks_start_in_priority_order():
+    store = TaskStore()
+
+    async def run():
+        recorder = Recorder()
+        queue = TaskQueue(store, recorder, max_workers=1)
+        await queue.start()
+        for task_id, priority in (('blocker', 0), ('low', 3), ('critical', 0), ('medium', 2), ('medium-2', 2)):
+            store_task(store, task_id, priority=priority)
+            queue.submit(task_id, 'generic', priority)
+            await settle()
+        order = []
+        while len(recorder.started) < 5:
+            recorder.release.set()
+            await settle()
+            order = list(recorder.started)
+        await queue.stop()
+        return order
+
+    assert asyncio.run(run()) == ['blocker', 'critical', 'medium', 'medium-2', 'low']
+
+
+def test_type_limit_parks_tasks_without_blocking_other_types():
+    store = TaskStore()
+
+    async def run():
+        recorder = Recorder()
+        queue = TaskQueue(store, recorder, max_workers=4, type_limits={'vm_provisioning': 1})
+        await queue.start()
+        for task_id, task_type, priority in (('vm-1', 'vm_provisioning', 1), ('vm-2', 'vm_provisioning', 0),
+                                             ('patch-1', 'patch_deployment', 3)):
+            store_task(store, task_id, task_type, priority)
+            queue.submit(task_id, task_type, priority)
+            await settle()
+        during = (list(recorder.started), queue.depth, queue.running)
+        recorder.release.set()
+        await settle()
+        after = list(recorder.started)
+        await queue.stop()
+        return during, after
+
+    during, after = asyncio.run(run())
+    assert during == (['vm-1', 'patch-1'], 1, 2)
+    assert after == ['vm-1', 'patch-1', 'vm-2']
+
+
+def test_check_capacity_rejects_before_the_task_is_stored():
+    store = TaskStore()
+
+    async def run():
+        queue = TaskQueue(store, Recorder(), max_workers=1, max_queued=2)
+        for task_id in ('a', 'b'):
+            queue.submit(task_id, 'generic', 2)
+        with pytest.raises(QueueFullError):
+            queue.check_capacity()
+        with pytest.raises(QueueFullError):
+            queue.submit('c', 'generic', 2)
+        return queue.depth
+
+    assert asyncio.run(run()) == 2
+
+
+def test_active_tasks_are_recovered_on_restart(tmp_path):
+    path = str(tmp_path / 'tasks.db')
+    store = TaskStore(path)
+    store_task(store, 'was-running', priority=2, status='running')
+    store_task(store, 'was-queued', priority=1)
+    store_task(store, 'finished', priority=0)
+    store.update('finished', 'completed', 'done', datetime.now().isoformat())
+    store.close()
+
+    async def run():
+        handled = []
+
+        async def handler(task_id, task_type, payload):
+            handled.append((task_id, payload))
+
+        queue = TaskQueue(TaskStore(path), handler, max_workers=1)
+        recovered = await queue.start()
+        await settle()
+        await queue.stop()
+        return sorted(record['id'] for record in recovered), handled
+
+    recovered, handled = asyncio.run(run())
+    assert recovered == ['was-queued', 'was-running']
+    assert handled == [('was-queued', {'name': 'was-queued'}), ('was-running', {'name': 'was-running'})]
+
+
+def test_retention_sweep_purges_only_expired_finished_tasks(monkeypatch):
+    store = TaskStore()
+    for task_id in ('old', 'recent', 'active'):
+        store_task(store, task_id)
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+    store.update('old', 'completed', 'done', 'now')
+    clock[0] += 50
+    store.update('recent', 'failed', 'broken', 'now')
+    clock[0] += 20
+
+    real_sleep = asyncio.sleep
+
+    async def fast_sleep(seconds):
+        await real_sleep(0)
+
+    async def run():
+        queue = TaskQueue(store, Recorder(), retention_seconds=60)
+        monkeypatch.setattr('services.task_queue.asyncio.sleep', fast_sleep)
+        sweeper = asyncio.ensure_future(queue._retention_loop())
+        await real_sleep(0.01)
+        sweeper.cancel()
+
+    asyncio.run(run())
+    assert [store.get(task_id) is not None for task_id in ('old', 'recent', 'active')] == [False, True, True]
+
+
+def test_engine_defaults_to_an_in_memory_store(monkeypatch):
+    monkeypatch.delenv('AUTOMATION_DB_PATH', raising=False)
+    engine = AutomationEngine()
+
+    async def run():
+        await engine.task_queue.start()
+        engine.task_store.insert({'id': 't1', 'type': 'generic', 'status': 'queued', 'priority': 2,
+                                  'created_at': datetime.now().isoformat()}, {})
+        await engine._update_task_status('t1', 'completed', 'done', {'ok': True})
+        status = await engine.get_task_status('t1')
+        await engine.stop()
+        return status
+
+    status = asyncio.run(run())
+    assert engine.task_store.path == ':memory:'
+    assert (status['status'], status['result']) == ('completed', {'ok': True})
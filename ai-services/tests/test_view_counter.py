@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from services import view_counter
+from services.knowledge_base import KnowledgeBaseService
+from services.view_counter import ViewCounter
+
+
+@pytest.fixture
+def knowledge_base(monkeypatch):
+    monkeypatch.delenv('KB_INDEX_PATH', raising=False)
+    monkeypatch.setenv('KB_VIEW_FLUSH_BATCH', '4')
+    monkeypatch.setenv('KB_VIEW_FLUSH_SECONDS', '3600')
+    knowledge_base = KnowledgeBaseService()
+    yield knowledge_base
+    knowledge_base.search_index.close()
+
+
+def test_drain_counts_views_per_key():
+    counter = ViewCounter(batch_size=100)
+    for key in ('a', 'b', 'a', 'c', 'a'):
+        counter.record(key)
+    assert counter.drain() == {'a': 3, 'b': 1, 'c': 1}
+    assert counter.drain() == {}
+    assert (len(counter), counter.recorded, counter.flushed, counter.flushes) == (0, 5, 5, 1)
+
+
+def test_flush_is_due_at_the_batch_size_or_interval(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(view_counter.time, 'monotonic', lambda: clock[0])
+    counter = ViewCounter(batch_size=3, flush_interval=10)
+    assert [counter.record('a') for _ in range(3)] == [False, False, True]
+    counter.drain()
+    assert not counter.record('a')
+    clock[0] += 10
+    assert counter.record('a')
+
+
+def test_views_reach_the_article_at_the_flush_threshold(knowledge_base):
+    async def run():
+        views = []
+        for _ in range(4):
+            article = await knowledge_base.get_article('KB001')
+            views.append(article['views'])
+        return views, len(knowledge_base.view_counter)
+
+    before = knowledge_base.articles_by_id['KB001']['views']
+    views, pending = asyncio.run(run())
+    # The fourth read fills the batch and applies all four views
+    assert views == [before, before, before, before + 4]
+    assert pending == 0
+
+
+def test_reads_before_a_ranking_are_applied_first(knowledge_base):
+    async def run():
+        await knowledge_base.get_article('KB002')
+        await knowledge_base.get_article('KB002')
+        return await knowledge_base.get_statistics()
+
+    before = sum(article['views'] for article in knowledge_base.articles)
+    assert asyncio.run(run())['total_views'] == before + 2
+